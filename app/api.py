@@ -4,15 +4,340 @@ API REST con FastAPI para consulta de RUC en SUNAT
 """
 
 from fastapi import FastAPI, HTTPException, Query, Path
-from pydantic import BaseModel
-from typing import Optional, List, Union, Any
+from fastapi.responses import StreamingResponse, PlainTextResponse, JSONResponse
+from pydantic import BaseModel, Field
+from typing import Optional, List, Any
+from contextlib import asynccontextmanager
+from datetime import datetime
+import asyncio
+import functools
+import json
+import os
 import time
-from scraper import SUNATScraper
+from scraper import SECCIONES
+from driver_pool import DriverPool, DriverPoolAgotadoError
+from cliente_http import SUNATClienteHTTP, ClienteHTTPError
+from navegador_pestanas import MotorPestanas
+from cache import CacheResultados
+from recursos import metricas_red
+from limitador import limitador_sunat
+from padron import IndicePadron, ActualizadorPadron
+from jobs import GestorTrabajos
+from lotes import parsear_shard, en_shard
+from metricas import registro, traza, tramo, medir_seccion, registrar_cache
+from depuracion import artefactos, con_depuracion
+from bitacora import obtener_logger, ContextoConsulta, con_contexto, contexto_activo
+from planificador import EjecutorPrioridad, INTERACTIVA, LOTE
+
+
+log = obtener_logger('api')
+
+
+# Motor de consulta: "http" (sin navegador, con Selenium como respaldo), "selenium"
+# (un navegador por consulta) o "pestanas" (consultas como pestañas de pocos navegadores)
+MOTOR = os.getenv("SUNAT_MOTOR", "http").lower()
+
+# Con el motor HTTP el navegador es solo un respaldo: se inicia la primera vez que se usa
+driver_pool = DriverPool(
+    min_size=int(os.getenv("POOL_MIN_DRIVERS") or ("0" if MOTOR == "http" else "1")),
+    max_size=int(os.getenv("POOL_MAX_DRIVERS", "3")),
+    max_usos=int(os.getenv("POOL_MAX_USOS", "50")),
+    timeout_adquirir=int(os.getenv("POOL_TIMEOUT", "60"))
+)
+
+
+def consultar_con_navegador(numero_ruc, **incluir):
+    """Consulta un RUC con un navegador del pool"""
+    with driver_pool.scraper() as scraper:
+        return scraper.consultar_ruc_completo(numero_ruc, **incluir)
+
+
+motor_pestanas = MotorPestanas(
+    navegadores=int(os.getenv("PESTANAS_NAVEGADORES", "1")),
+    pestanas=int(os.getenv("PESTANAS_POR_NAVEGADOR", "8"))
+)
+
+cliente_http = SUNATClienteHTTP(
+    base_url=os.getenv("SUNAT_BASE_URL") or None,
+    timeout=int(os.getenv("HTTP_TIMEOUT", "15")),
+    respaldo=consultar_con_navegador
+)
+
+
+def consultar_ruc_completo(numero_ruc, **incluir):
+    """Consulta un RUC con el motor configurado"""
+    if MOTOR == "http":
+        return cliente_http.consultar_ruc_completo(numero_ruc, **incluir)
+    if MOTOR == "pestanas":
+        return motor_pestanas.consultar_ruc_completo(numero_ruc, **incluir)
+    return consultar_con_navegador(numero_ruc, **incluir)
+
+
+cache = CacheResultados(
+    ruta_db=os.getenv("CACHE_DB", "cache_sunat.db"),
+    max_items=int(os.getenv("CACHE_MAX_ITEMS", "5000"))
+)
+
+
+def procesar_ruc_con_cache(ruc, max_age=None, **incluir):
+    """Consulta un RUC usando el cache y retorna el resultado en formato de lote (success/error)"""
+    contexto = ContextoConsulta(ruc)
+    try:
+        if not ruc.isdigit() or len(ruc) != 11:
+            raise ValueError('El RUC debe tener exactamente 11 dígitos numéricos')
+
+        with contexto_activo(contexto):
+            resultado = cache.consultar(ruc, consultar_ruc_completo, max_age=max_age, **incluir)
+        if not resultado:
+            raise ValueError('No se encontraron datos para este RUC')
+
+        resultado['success'] = True
+        return resultado
+    except Exception as e:
+        return {
+            'ruc': ruc,
+            'success': False,
+            'error': str(e),
+            'fecha_consulta': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            'id_consulta': contexto.id,
+            'eventos': contexto.recientes()
+        }
+
+
+# Índice local del padrón reducido (ver padron.py). Si PADRON_ORIGEN está definido,
+# el índice se reconstruye cuando ese archivo cambia.
+indice_padron = IndicePadron(os.getenv("PADRON_INDICE", "padron.idx"))
+actualizador_padron = ActualizadorPadron(
+    os.getenv("PADRON_ORIGEN", ""),
+    indice_padron,
+    intervalo=float(os.getenv("PADRON_ACTUALIZAR_HORAS", "24")) * 3600
+) if os.getenv("PADRON_ORIGEN") else None
+
+
+def buscar_en_padron(numero_ruc):
+    with tramo('padron'):
+        return indice_padron.buscar(numero_ruc)
+
+
+def consultar_con_padron(numero_ruc, max_age=None, **incluir):
+    """
+    Datos básicos desde el índice del padrón; solo las secciones adicionales
+    se consultan en SUNAT (por HTTP, sin navegador). Si el RUC no está en el
+    padrón se hace la consulta normal.
+    """
+    datos = buscar_en_padron(numero_ruc)
+    if datos is None:
+        return cache.consultar(numero_ruc, consultar_ruc_completo, max_age=max_age, **incluir)
+
+    secciones = [s for s, parametro in SECCIONES.items() if incluir.get(parametro)]
+    hits, misses = [], []
+    for seccion in secciones:
+        encontrado, valor = cache.obtener(numero_ruc, seccion, max_age)
+        if encontrado:
+            hits.append(seccion)
+            if valor:
+                datos[seccion] = valor
+        else:
+            misses.append(seccion)
+
+    if misses and datos['razon_social']:
+        try:
+            with limitador_sunat.consulta():
+                for seccion in misses:
+                    valor = medir_seccion(seccion, cliente_http.extraer_seccion, seccion, numero_ruc, datos['razon_social'])
+                    cache.guardar(numero_ruc, seccion, valor)
+                    if valor:
+                        datos[seccion] = valor
+        except ClienteHTTPError as e:
+            log.warning("%s. Consultando el RUC %s con el motor configurado...", e, numero_ruc)
+            return cache.consultar(numero_ruc, consultar_ruc_completo, max_age=max_age, **incluir)
+
+    datos['cache'] = {'hits': hits, 'misses': misses, 'compartidas': []}
+    registrar_cache(datos['cache'])
+    return datos
+
+
+# Executor dedicado al trabajo bloqueante (Selenium, HTTP, SQLite).
+# Su tamaño es el límite de consultas simultáneas de todos los requests (cada
+# RUC de un lote es una tarea); el resto espera en cola sin bloquear el event loop. Las consultas individuales (clase interactiva)
+# pasan antes que el trabajo en lote y tienen threads reservados.
+executor_scraper = EjecutorPrioridad(
+    max_workers=int(os.getenv("SCRAPER_WORKERS", "4")),
+    thread_name_prefix="scraper"
+)
+ejecutor_interactivo = executor_scraper.clase(INTERACTIVA)
+ejecutor_lote = executor_scraper.clase(LOTE)
+
+
+async def ejecutar(fn, *args, **kwargs):
+    """Ejecuta una función bloqueante en el executor del scraper, con prioridad interactiva"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(ejecutor_interactivo, functools.partial(fn, *args, **kwargs))
+
+
+async def consultar_en_flujo(rucs, procesar, max_workers):
+    """
+    Genera los resultados a medida que terminan, con a lo sumo max_workers
+    consultas en vuelo. Solo se mantienen en memoria las consultas en curso.
+    """
+    loop = asyncio.get_running_loop()
+    en_vuelo = set()
+    try:
+        for ruc in rucs:
+            if len(en_vuelo) >= max_workers:
+                listos, en_vuelo = await asyncio.wait(en_vuelo, return_when=asyncio.FIRST_COMPLETED)
+                for future in listos:
+                    yield future.result()
+            en_vuelo.add(loop.run_in_executor(ejecutor_lote, procesar, ruc))
+
+        while en_vuelo:
+            listos, en_vuelo = await asyncio.wait(en_vuelo, return_when=asyncio.FIRST_COMPLETED)
+            for future in listos:
+                yield future.result()
+    finally:
+        # El cliente se desconectó: no iniciar las consultas que siguen en cola
+        for future in en_vuelo:
+            future.cancel()
+
+
+async def consultar_lote_con_cache(rucs, max_workers=3, max_age=None, **incluir):
+    """
+    Consulta una lista de RUCs en el executor del scraper (clase lote), con a lo
+    sumo max_workers consultas en vuelo, y retorna los resultados en el orden de
+    rucs. Cada RUC pasa por el cache (procesar_ruc_con_cache); los repetidos se
+    consultan una sola vez.
+    """
+    loop = asyncio.get_running_loop()
+    procesar = functools.partial(procesar_ruc_con_cache, max_age=max_age, **incluir)
+    en_vuelo = asyncio.Semaphore(max_workers)
+
+    async def consultar(ruc):
+        async with en_vuelo:
+            return await loop.run_in_executor(ejecutor_lote, procesar, ruc)
+
+    unicos = list(dict.fromkeys(rucs))
+    por_ruc = dict(zip(unicos, await asyncio.gather(*(consultar(ruc) for ruc in unicos))))
+    return [dict(por_ruc[ruc]) for ruc in rucs]
+
+
+def con_tiempos(fn, *args, **kwargs):
+    """Ejecuta fn con una traza activa y agrega sus tramos al resultado en 'tiempos'"""
+    with traza() as tramos:
+        resultado = fn(*args, **kwargs)
+    if resultado:
+        resultado['tiempos'] = tramos
+    return resultado
+
+
+def respuesta_error(status_code, detalle, contexto):
+    """Respuesta de error con el ID de la consulta y sus eventos recientes"""
+    return JSONResponse(status_code=status_code, content={
+        "detail": detalle,
+        "id_consulta": contexto.id,
+        "eventos": contexto.recientes()
+    })
+
+
+# Trabajos en segundo plano: cada RUC se consulta en el executor del scraper como lote
+gestor_trabajos = GestorTrabajos(
+    ejecutor_lote,
+    retencion=int(os.getenv("JOBS_RETENCION", str(24 * 3600)))
+)
+
+
+# Métricas de /metrics leídas del estado actual de cada componente
+duracion_api = registro.histograma(
+    "sunat_api_duracion_segundos",
+    "Duración de las respuestas de la API por endpoint",
+    etiquetas=("endpoint",)
+)
+registro.medidor(
+    "sunat_pool_drivers",
+    "Drivers del pool por estado",
+    lambda: {(estado,): valor for estado, valor in driver_pool.estadisticas().items()
+             if estado in ('total', 'libres', 'en_uso', 'max_size')},
+    etiquetas=("estado",)
+)
+registro.medidor(
+    "sunat_pestanas",
+    "Pestañas del motor de pestañas por estado y consultas en cola",
+    lambda: {(estado,): valor for estado, valor in motor_pestanas.estadisticas().items()
+             if estado in ('pestanas', 'ocupadas', 'en_cola', 'esperando_turno')},
+    etiquetas=("estado",)
+)
+registro.medidor(
+    "sunat_executor_en_cola",
+    "Tareas esperando un thread libre del executor del scraper por clase de prioridad",
+    lambda: {(clase,): executor_scraper.en_cola(clase) for clase in (INTERACTIVA, LOTE)},
+    etiquetas=("clase",)
+)
+registro.medidor(
+    "sunat_red_paginas_total",
+    "Páginas medidas en el navegador según si la pestaña tenía el bloqueo de recursos",
+    lambda: {(str(activo).lower(),): t['paginas'] for activo, t in metricas_red.totales().items()},
+    etiquetas=("bloqueo",),
+    tipo="counter"
+)
+registro.medidor(
+    "sunat_red_bytes_total",
+    "Bytes transferidos por las páginas medidas según el bloqueo de recursos",
+    lambda: {(str(activo).lower(),): t['bytes'] for activo, t in metricas_red.totales().items()},
+    etiquetas=("bloqueo",),
+    tipo="counter"
+)
+registro.medidor(
+    "sunat_red_carga_segundos_total",
+    "Tiempo de carga de las páginas medidas según el bloqueo de recursos",
+    lambda: {(str(activo).lower(),): t['carga_ms'] / 1000 for activo, t in metricas_red.totales().items()},
+    etiquetas=("bloqueo",),
+    tipo="counter"
+)
+registro.medidor(
+    "sunat_red_ahorro_por_pagina",
+    "Ahorro promedio por página del bloqueo de recursos (bytes y ms de carga)",
+    lambda: {(medida,): valor for medida, valor in metricas_red.resumen().get('ahorro_por_pagina', {}).items()},
+    etiquetas=("medida",)
+)
+registro.medidor(
+    "sunat_limitador_concurrencia",
+    "Límite adaptativo de consultas simultáneas a SUNAT y consultas en curso",
+    lambda: {('limite',): limitador_sunat.concurrencia.limite,
+             ('en_curso',): limitador_sunat.concurrencia.en_curso},
+    etiquetas=("valor",)
+)
+registro.medidor(
+    "sunat_limitador_recortes_total",
+    "Veces que se redujo la concurrencia por congestión en SUNAT",
+    lambda: limitador_sunat.concurrencia.recortes,
+    tipo="counter"
+)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Inicia el pool de drivers (o el motor de pestañas) al arrancar y lo cierra al apagar"""
+    if MOTOR == "pestanas":
+        await ejecutar(motor_pestanas.iniciar)
+    else:
+        await ejecutar(driver_pool.iniciar)
+    if actualizador_padron is not None:
+        actualizador_padron.iniciar()
+    yield
+    if actualizador_padron is not None:
+        actualizador_padron.detener()
+    executor_scraper.shutdown(wait=True, cancel_futures=True)
+    motor_pestanas.cerrar()
+    driver_pool.cerrar()
+    cliente_http.close()
+    cache.close()
+    artefactos.cerrar()
+
 
 app = FastAPI(
     title="API Consulta RUC SUNAT",
     description="API REST para consultar información de RUC en la página de SUNAT",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 
@@ -45,11 +370,18 @@ class RUCResponse(BaseModel):
     reactiva_peru: Optional[dict] = None
     programa_covid19: Optional[dict] = None
     establecimientos_anexos: Optional[List[dict]] = None
+    cache: Optional[dict] = None
+    ubigeo: Optional[str] = None
+    fuente: Optional[str] = None
+    fecha_padron: Optional[str] = None
+    tiempos: Optional[List[dict]] = None
 
 
 class ErrorResponse(BaseModel):
     """Modelo de respuesta de error"""
     detail: str
+    id_consulta: Optional[str] = None
+    eventos: Optional[List[dict]] = None
 
 
 class ConsultaLoteRequest(BaseModel):
@@ -64,6 +396,7 @@ class ConsultaLoteRequest(BaseModel):
     establecimientos: bool = False
     use_threading: bool = True
     max_workers: int = 3
+    max_age: Optional[int] = Field(None, ge=0)
 
 
 class ConsultaLoteResponse(BaseModel):
@@ -75,6 +408,47 @@ class ConsultaLoteResponse(BaseModel):
     resultados: List[dict]
 
 
+class TrabajoRequest(BaseModel):
+    """Modelo de request para crear un trabajo en segundo plano"""
+    rucs: List[str]
+    trabajadores: bool = False
+    representantes: bool = False
+    historico: bool = False
+    deuda_coactiva: bool = False
+    reactiva_peru: bool = False
+    programa_covid19: bool = False
+    establecimientos: bool = False
+    max_workers: int = 3
+    max_age: Optional[int] = Field(None, ge=0)
+    shard: Optional[str] = None
+
+
+class TrabajoResponse(BaseModel):
+    """Modelo de respuesta con el progreso de un trabajo"""
+    job_id: str
+    estado: str
+    total: int
+    procesados: int
+    pendientes: int
+    exitosos: int
+    fallidos: int
+    creado: str
+    finalizado: Optional[str] = None
+    error: Optional[str] = None
+    shard: Optional[str] = None
+    descartados_shard: int = 0
+
+
+class ResultadosTrabajoResponse(BaseModel):
+    """Modelo de respuesta con una página de resultados de un trabajo"""
+    job_id: str
+    estado: str
+    total_resultados: int
+    offset: int
+    limit: int
+    resultados: List[dict]
+
+
 @app.get("/", tags=["General"])
 async def root():
     """Endpoint raíz de la API"""
@@ -84,6 +458,9 @@ async def root():
         "endpoints": {
             "consultar_ruc": "/consultar/{ruc}",
             "consultar_lote": "/consultar-lote",
+            "consultar_lote_stream": "/consultar-lote/stream",
+            "trabajos": "/jobs",
+            "metricas": "/metrics",
             "documentacion": "/docs",
             "openapi": "/openapi.json"
         }
@@ -96,7 +473,8 @@ async def root():
     responses={
         400: {"model": ErrorResponse, "description": "RUC inválido"},
         404: {"model": ErrorResponse, "description": "RUC no encontrado"},
-        500: {"model": ErrorResponse, "description": "Error interno del servidor"}
+        500: {"model": ErrorResponse, "description": "Error interno del servidor"},
+        503: {"model": ErrorResponse, "description": "No hay navegadores disponibles"}
     },
     tags=["Consultas"]
 )
@@ -109,6 +487,10 @@ async def consultar_ruc(
     reactiva_peru: bool = Query(False, description="Incluir información de Reactiva Perú"),
     programa_covid19: bool = Query(False, description="Incluir información del Programa de Garantías COVID-19"),
     establecimientos: bool = Query(False, description="Incluir establecimientos anexos"),
+    max_age: Optional[int] = Query(None, ge=0, description="Antigüedad máxima en segundos aceptada desde el cache (0 = consultar SUNAT)"),
+    fuente: str = Query("sunat", pattern="^(sunat|padron)$", description="padron: datos básicos desde el índice local del padrón reducido"),
+    tiempos: bool = Query(False, description="Incluir la duración de cada etapa de la consulta"),
+    depuracion: Optional[str] = Query(None, pattern="^(no|fallo|siempre)$", description="Guardar captura y HTML del navegador: fallo (solo si falla) o siempre"),
 ):
     """
     Consulta información de un RUC en SUNAT
@@ -118,7 +500,20 @@ async def consultar_ruc(
     - **trabajadores**: Si es True, incluye información de cantidad de trabajadores
     - **representantes**: Si es True, incluye información de representantes legales
     - **historico**: Si es True, incluye información histórica (nombres anteriores, condiciones, direcciones)
+    - **max_age**: Antigüedad máxima aceptada de los datos en cache (segundos)
+    - **fuente**: "padron" responde los datos básicos (razón social, estado, condición,
+      ubigeo, dirección) desde el índice local; solo las secciones se consultan en SUNAT
+    - **tiempos**: Si es True, incluye el campo 'tiempos' con la duración en ms de cada
+      etapa (driver_adquirir, driver_inicio, navegacion, busqueda, extraccion_base,
+      seccion.<nombre>, ...). Las etapas de una consulta compartida con otro request
+      no se incluyen.
+    - **depuracion**: "fallo" o "siempre" guarda captura de pantalla y HTML del navegador
+      para esta consulta (ignora DEPURACION). Solo aplica a consultas con navegador que
+      no se resuelvan desde el cache.
 
+    La respuesta incluye el campo 'cache' con las secciones servidas desde el cache (hits)
+    y las consultadas en SUNAT (misses). Las respuestas 404 y 500 incluyen 'id_consulta'
+    y 'eventos' (los últimos eventos registrados durante la consulta).
     """
     
     # Validar formato del RUC
@@ -128,73 +523,59 @@ async def consultar_ruc(
             detail="El RUC debe tener exactamente 11 dígitos numéricos"
         )
     
-    scraper = SUNATScraper()
-    
+    contexto = ContextoConsulta(ruc)
     try:
         inicio = time.time()
-        scraper.setup_driver()
-        
-        resultado = scraper.consultar_ruc(ruc)
-        
-        if not resultado:
-            raise HTTPException(
-                status_code=404, 
-                detail=f"No se encontraron datos para el RUC {ruc}"
-            )
-        
-        razon_social = resultado.get('razon_social', '')
         
-        if trabajadores and razon_social:
-            datos_trab = scraper.extraer_cantidad_trabajadores(ruc, razon_social)
-            if datos_trab:
-                resultado['cantidad_trabajadores'] = datos_trab
-        
-        if representantes and razon_social:
-            datos_repr = scraper.extraer_representantes_legales(ruc, razon_social)
-            if datos_repr:
-                resultado['representantes_legales'] = datos_repr
-        
-        if historico and razon_social:
-            datos_hist = scraper.extraer_informacion_historica(ruc, razon_social)
-            if datos_hist:
-                resultado['informacion_historica'] = datos_hist
-        
-        if deuda_coactiva and razon_social:
-            datos_deuda = scraper.extraer_deuda_coactiva(ruc, razon_social)
-            if datos_deuda:
-                resultado['deuda_coactiva'] = datos_deuda
-        
-        if reactiva_peru and razon_social:
-            datos_reactiva = scraper.extraer_reactiva_peru(ruc, razon_social)
-            if datos_reactiva:
-                resultado['reactiva_peru'] = datos_reactiva
+        incluir = dict(
+            incluir_trabajadores=trabajadores,
+            incluir_representantes=representantes,
+            incluir_historico=historico,
+            incluir_deuda_coactiva=deuda_coactiva,
+            incluir_reactiva_peru=reactiva_peru,
+            incluir_programa_covid19=programa_covid19,
+            incluir_establecimientos=establecimientos
+        )
         
-        if programa_covid19 and razon_social:
-            datos_covid = scraper.extraer_programa_covid19(ruc, razon_social)
-            if datos_covid:
-                resultado['programa_covid19'] = datos_covid
+        resultado = None
+        if fuente == "padron":
+            # Sin secciones adicionales se responde desde el índice (microsegundos), sin usar el executor
+            if not any(incluir.values()):
+                resultado = con_tiempos(buscar_en_padron, ruc) if tiempos else buscar_en_padron(ruc)
+            if resultado is None:
+                consultar = functools.partial(consultar_con_padron, ruc, max_age=max_age, **incluir)
+        else:
+            consultar = functools.partial(cache.consultar, ruc, consultar_ruc_completo, max_age=max_age, **incluir)
+
+        if resultado is None:
+            if depuracion:
+                consultar = functools.partial(con_depuracion, depuracion, consultar)
+            # Los eventos de la consulta (en el executor) quedan en el contexto para las respuestas de error
+            consultar = functools.partial(con_contexto, contexto, consultar)
+            resultado = await ejecutar(con_tiempos, consultar) if tiempos else await ejecutar(consultar)
         
-        if establecimientos and razon_social:
-            datos_est = scraper.extraer_establecimientos_anexos(ruc, razon_social)
-            if datos_est:
-                resultado['establecimientos_anexos'] = datos_est
+        if not resultado:
+            return respuesta_error(404, f"No se encontraron datos para el RUC {ruc}", contexto)
         
         # Calcular tiempo de procesamiento
         fin = time.time()
         tiempo_total = fin - inicio
         resultado['tiempo_procesamiento'] = f"{tiempo_total:.2f} segundos"
+        duracion_api.observar(tiempo_total, endpoint="consultar")
         
         return resultado
         
     except HTTPException:
         raise
-    except Exception as e:
+    except DriverPoolAgotadoError as e:
         raise HTTPException(
-            status_code=500, 
-            detail=f"Error interno al consultar el RUC: {str(e)}"
+            status_code=503,
+            detail=f"Servicio ocupado: {str(e)}"
         )
-    finally:
-        scraper.close()
+    except Exception as e:
+        with contexto_activo(contexto):
+            log.error("Error interno al consultar el RUC %s: %s", ruc, e, exc_info=True)
+        return respuesta_error(500, f"Error interno al consultar el RUC: {str(e)}", contexto)
 
 
 @app.post(
@@ -202,7 +583,8 @@ async def consultar_ruc(
     response_model=ConsultaLoteResponse,
     responses={
         400: {"model": ErrorResponse, "description": "Solicitud inválida"},
-        500: {"model": ErrorResponse, "description": "Error interno del servidor"}
+        500: {"model": ErrorResponse, "description": "Error interno del servidor"},
+        503: {"model": ErrorResponse, "description": "No hay navegadores disponibles"}
     },
     tags=["Consultas"]
 )
@@ -221,6 +603,7 @@ async def consultar_lote(request: ConsultaLoteRequest):
     - **establecimientos**: Si es True, incluye establecimientos anexos para todos los RUCs
     - **use_threading**: Si es True, procesa RUCs en paralelo (default: True)
     - **max_workers**: Número de threads concurrentes (default: 3, max: 5)
+    - **max_age**: Antigüedad máxima aceptada de los datos en cache (segundos)
     
     **Respuesta:**
     - Retorna un objeto con estadísticas y lista de resultados
@@ -243,32 +626,32 @@ async def consultar_lote(request: ConsultaLoteRequest):
             detail="Máximo 50 RUCs por consulta"
         )
     
-    scraper = SUNATScraper()
-    
     try:
         inicio = time.time()
         
-        scraper.setup_driver()
-        
         # Validar max_workers
         max_workers = min(max(1, request.max_workers), 5)  # Entre 1 y 5
         
-        # Consultar múltiples RUCs
-        resultados = scraper.consultar_multiples_rucs(
-            lista_rucs=request.rucs,
+        incluir = dict(
             incluir_trabajadores=request.trabajadores,
             incluir_representantes=request.representantes,
             incluir_historico=request.historico,
             incluir_deuda_coactiva=request.deuda_coactiva,
             incluir_reactiva_peru=request.reactiva_peru,
             incluir_programa_covid19=request.programa_covid19,
-            incluir_establecimientos=request.establecimientos,
-            use_threading=request.use_threading,
-            max_workers=max_workers
+            incluir_establecimientos=request.establecimientos
+        )
+        
+        resultados = await consultar_lote_con_cache(
+            request.rucs,
+            max_workers=max_workers if request.use_threading else 1,
+            max_age=request.max_age,
+            **incluir
         )
         
         fin = time.time()
         tiempo_total = fin - inicio
+        duracion_api.observar(tiempo_total, endpoint="consultar_lote")
         
         # Contar exitosos y fallidos
         exitosos = sum(1 for r in resultados if r.get('success', False))
@@ -282,13 +665,200 @@ async def consultar_lote(request: ConsultaLoteRequest):
             "resultados": resultados
         }
         
+    except DriverPoolAgotadoError as e:
+        raise HTTPException(
+            status_code=503,
+            detail=f"Servicio ocupado: {str(e)}"
+        )
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=f"Error interno al procesar el lote: {str(e)}"
         )
-    finally:
-        scraper.close()
+
+
+@app.post(
+    "/consultar-lote/stream",
+    responses={
+        200: {
+            "content": {"application/x-ndjson": {}, "text/event-stream": {}},
+            "description": "Un resultado por RUC a medida que terminan y un resumen final"
+        },
+        400: {"model": ErrorResponse, "description": "Solicitud inválida"}
+    },
+    tags=["Consultas"]
+)
+async def consultar_lote_stream(
+    request: ConsultaLoteRequest,
+    formato: str = Query("ndjson", pattern="^(ndjson|sse)$", description="ndjson o sse (Server-Sent Events)"),
+):
+    """
+    Consulta múltiples RUCs y envía cada resultado apenas termina
+    
+    Acepta el mismo body que /consultar-lote (sin límite de RUCs; use_threading se ignora).
+    
+    **Formatos:**
+    - **ndjson**: una línea JSON por RUC y al final `{"resumen": {...}}`
+    - **sse**: eventos `resultado` por RUC y un evento `resumen` al final
+    
+    El resumen contiene total, exitosos, fallidos y tiempo_procesamiento.
+    """
+    
+    if not request.rucs:
+        raise HTTPException(
+            status_code=400,
+            detail="Debe proporcionar al menos un RUC"
+        )
+    
+    procesar = functools.partial(
+        procesar_ruc_con_cache,
+        max_age=request.max_age,
+        incluir_trabajadores=request.trabajadores,
+        incluir_representantes=request.representantes,
+        incluir_historico=request.historico,
+        incluir_deuda_coactiva=request.deuda_coactiva,
+        incluir_reactiva_peru=request.reactiva_peru,
+        incluir_programa_covid19=request.programa_covid19,
+        incluir_establecimientos=request.establecimientos
+    )
+    max_workers = min(max(1, request.max_workers), 5)
+    
+    def serializar(evento, datos):
+        contenido = json.dumps(datos, ensure_ascii=False)
+        if formato == "sse":
+            return f"event: {evento}\ndata: {contenido}\n\n"
+        if evento == "resumen":
+            return json.dumps({"resumen": datos}, ensure_ascii=False) + "\n"
+        return contenido + "\n"
+    
+    async def generar():
+        inicio = time.time()
+        total = exitosos = 0
+        
+        async for resultado in consultar_en_flujo(request.rucs, procesar, max_workers):
+            total += 1
+            if resultado.get('success', False):
+                exitosos += 1
+            yield serializar("resultado", resultado)
+        
+        yield serializar("resumen", {
+            "total": total,
+            "exitosos": exitosos,
+            "fallidos": total - exitosos,
+            "tiempo_procesamiento": f"{time.time() - inicio:.2f} segundos"
+        })
+    
+    media_type = "text/event-stream" if formato == "sse" else "application/x-ndjson"
+    return StreamingResponse(generar(), media_type=media_type)
+
+
+@app.post(
+    "/jobs",
+    response_model=TrabajoResponse,
+    status_code=202,
+    responses={
+        400: {"model": ErrorResponse, "description": "Solicitud inválida"}
+    },
+    tags=["Trabajos"]
+)
+async def crear_trabajo(request: TrabajoRequest):
+    """
+    Crea un trabajo que consulta una lista de RUCs en segundo plano
+    
+    A diferencia de /consultar-lote no hay límite de RUCs: la respuesta es
+    inmediata y contiene el **job_id** para consultar el progreso en
+    /jobs/{job_id} y los resultados parciales en /jobs/{job_id}/results.
+    
+    **Parámetros:**
+    - **rucs**: Lista de números de RUC de 11 dígitos
+    - **trabajadores**, **representantes**, **historico**, **deuda_coactiva**,
+      **reactiva_peru**, **programa_covid19**, **establecimientos**: Secciones a incluir
+    - **max_workers**: Consultas simultáneas del trabajo (default: 3, max: 5)
+    - **max_age**: Antigüedad máxima aceptada de los datos en cache (segundos)
+    - **shard**: "i/N" para consultar solo los RUCs del shard i de N (hash estable
+      del RUC, el mismo que `cli.py --shard`). Permite enviar el mismo portafolio
+      a N instancias sin que se repitan consultas
+    """
+    
+    if not request.rucs:
+        raise HTTPException(
+            status_code=400,
+            detail="Debe proporcionar al menos un RUC"
+        )
+    
+    rucs = request.rucs
+    if request.shard:
+        try:
+            shard = parsear_shard(request.shard)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        rucs = [ruc for ruc in request.rucs if en_shard(ruc, shard)]
+    
+    procesar = functools.partial(
+        procesar_ruc_con_cache,
+        max_age=request.max_age,
+        incluir_trabajadores=request.trabajadores,
+        incluir_representantes=request.representantes,
+        incluir_historico=request.historico,
+        incluir_deuda_coactiva=request.deuda_coactiva,
+        incluir_reactiva_peru=request.reactiva_peru,
+        incluir_programa_covid19=request.programa_covid19,
+        incluir_establecimientos=request.establecimientos
+    )
+    
+    trabajo = gestor_trabajos.crear(
+        rucs,
+        procesar,
+        max_workers=min(max(1, request.max_workers), 5),
+        shard=request.shard,
+        descartados_shard=len(request.rucs) - len(rucs)
+    )
+    return trabajo.progreso()
+
+
+def obtener_trabajo(job_id):
+    trabajo = gestor_trabajos.obtener(job_id)
+    if trabajo is None:
+        raise HTTPException(
+            status_code=404,
+            detail=f"No existe el trabajo {job_id}"
+        )
+    return trabajo
+
+
+@app.get(
+    "/jobs/{job_id}",
+    response_model=TrabajoResponse,
+    responses={
+        404: {"model": ErrorResponse, "description": "Trabajo no encontrado"}
+    },
+    tags=["Trabajos"]
+)
+async def progreso_trabajo(job_id: str = Path(..., description="ID retornado por POST /jobs")):
+    """Retorna el estado y el avance de un trabajo"""
+    return obtener_trabajo(job_id).progreso()
+
+
+@app.get(
+    "/jobs/{job_id}/results",
+    response_model=ResultadosTrabajoResponse,
+    responses={
+        404: {"model": ErrorResponse, "description": "Trabajo no encontrado"}
+    },
+    tags=["Trabajos"]
+)
+async def resultados_trabajo(
+    job_id: str = Path(..., description="ID retornado por POST /jobs"),
+    offset: int = Query(0, ge=0, description="Posición del primer resultado"),
+    limit: int = Query(100, ge=1, le=1000, description="Cantidad máxima de resultados"),
+):
+    """
+    Retorna los resultados disponibles de un trabajo, en orden de finalización
+    
+    Puede llamarse mientras el trabajo está en proceso: los resultados ya
+    obtenidos no cambian de posición, por lo que basta con avanzar el offset.
+    """
+    return obtener_trabajo(job_id).pagina(offset, limit)
 
 
 @app.get("/health", tags=["General"])
@@ -296,9 +866,34 @@ async def health_check():
     """Verifica el estado de la API"""
     return {
         "status": "healthy",
-        "service": "SUNAT RUC Scraper API"
+        "service": "SUNAT RUC Scraper API",
+        "pool_drivers": driver_pool.estadisticas(),
+        "motor": MOTOR,
+        "pestanas": motor_pestanas.estadisticas() if MOTOR == "pestanas" else None,
+        "red_navegador": metricas_red.resumen(),
+        "limitador": limitador_sunat.estadisticas(),
+        "planificador": executor_scraper.estadisticas(),
+        "padron": indice_padron.estadisticas(),
+        "depuracion": artefactos.estadisticas()
     }
 
 
+@app.get("/metrics", response_class=PlainTextResponse, tags=["General"])
+async def metrics():
+    """
+    Métricas en formato de texto de Prometheus
+    
+    - **sunat_etapa_duracion_segundos**: histograma por etapa de la consulta
+    - **sunat_consulta_duracion_segundos** / **sunat_consultas_total**: por motor y resultado
+    - **sunat_secciones_total**: secciones con datos, vacías o con error
+    - **sunat_cache_secciones_total**: hits, misses y secciones compartidas del cache
+    - **sunat_pool_drivers**, **sunat_pestanas**, **sunat_executor_en_cola**: utilización
+    - **sunat_limitador_concurrencia**, **sunat_limitador_recortes_total**: limitador de SUNAT
+    - **sunat_red_paginas_total**, **sunat_red_bytes_total**, **sunat_red_carga_segundos_total**,
+      **sunat_red_ahorro_por_pagina**: efecto del bloqueo de recursos del navegador
+    """
+    return PlainTextResponse(registro.exponer(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
 # Para ejecutar: uvicorn api:app --reload
 # Documentación: http://localhost:8000/docs
@@ -0,0 +1,397 @@
+#!/usr/bin/env python3
+"""
+Benchmark de los motores de consulta contra el servidor simulado de SUNAT
+
+Cada configuración se ejecuta en un proceso propio (para medir su memoria
+pico por separado) contra un ServidorSimulado con la latencia y la tasa de
+errores indicadas. Reporta RUCs por segundo, latencia p50/p95/p99 por RUC y
+RSS pico del proceso y del navegador más grande.
+
+Configuraciones:
+    http               SUNATClienteHTTP.consultar_ruc_completo con --workers threads
+    http_secciones     SUNATClienteHTTP.consultar_ruc y cada extraer_* (latencia por método)
+    selenium_secciones SUNATScraper.consultar_ruc y cada extraer_* (latencia por método)
+    lote_secuencial    SUNATScraper.consultar_multiples_rucs
+    lote_paralelo      SUNATScraper.consultar_multiples_rucs_paralelo con --workers navegadores
+    pestanas           MotorPestanas con --workers pestañas en un navegador
+
+Uso:
+    python benchmark.py --rucs 50 --latencia 0.2 --secciones representantes_legales,cantidad_trabajadores
+    python benchmark.py --configuraciones http,lote_paralelo --workers 4 --json resultados.json
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from servidor_simulado import ServidorSimulado
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+CONFIGURACIONES = ['http', 'http_secciones', 'selenium_secciones', 'lote_secuencial', 'lote_paralelo', 'pestanas']
+
+# Sección -> parámetro incluir_* (igual que scraper.SECCIONES, sin importar Selenium en el proceso principal)
+INCLUIR = {
+    'cantidad_trabajadores': 'incluir_trabajadores',
+    'representantes_legales': 'incluir_representantes',
+    'informacion_historica': 'incluir_historico',
+    'deuda_coactiva': 'incluir_deuda_coactiva',
+    'reactiva_peru': 'incluir_reactiva_peru',
+    'programa_covid19': 'incluir_programa_covid19',
+    'establecimientos_anexos': 'incluir_establecimientos',
+}
+
+
+def percentil(valores, p):
+    """Percentil p (0-100) con interpolación lineal"""
+    if not valores:
+        return None
+    ordenados = sorted(valores)
+    posicion = (len(ordenados) - 1) * p / 100
+    inferior = int(posicion)
+    superior = min(inferior + 1, len(ordenados) - 1)
+    return ordenados[inferior] + (ordenados[superior] - ordenados[inferior]) * (posicion - inferior)
+
+
+def resumir_latencias(latencias):
+    return {
+        'p50_ms': round(percentil(latencias, 50) * 1000, 1) if latencias else None,
+        'p95_ms': round(percentil(latencias, 95) * 1000, 1) if latencias else None,
+        'p99_ms': round(percentil(latencias, 99) * 1000, 1) if latencias else None,
+    }
+
+
+def rss_pico_mb():
+    """RSS pico de este proceso y del proceso hijo más grande ya terminado (ej: Chrome)"""
+    if resource is None:
+        return None, None
+    propio = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    hijos = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    return round(propio, 1), round(hijos, 1) if hijos else None
+
+
+def generar_rucs(cantidad):
+    return [f"20{100000000 + i:09d}" for i in range(cantidad)]
+
+
+# --- Ejecución de una configuración (proceso hijo) ---
+
+class _Latencias:
+    """Latencias por RUC y por método, registradas desde varios threads"""
+
+    def __init__(self):
+        self.por_ruc = []
+        self.por_metodo = {}
+        self._lock = threading.Lock()
+
+    def registrar(self, segundos, metodo=None):
+        with self._lock:
+            if metodo is None:
+                self.por_ruc.append(segundos)
+            else:
+                self.por_metodo.setdefault(metodo, []).append(segundos)
+
+
+def _medir_metodos(motor, rucs, secciones, latencias):
+    """consultar_ruc y cada extraer_* por separado, un RUC a la vez"""
+    exitosos = 0
+    for ruc in rucs:
+        inicio_ruc = time.perf_counter()
+        inicio = time.perf_counter()
+        try:
+            datos = motor.consultar_ruc(ruc)
+        except Exception:
+            datos = None
+        latencias.registrar(time.perf_counter() - inicio, 'consultar_ruc')
+        if not datos:
+            continue
+        for seccion in secciones:
+            metodo = f"extraer_{seccion}"
+            inicio = time.perf_counter()
+            try:
+                getattr(motor, metodo)(ruc, datos.get('razon_social', ''))
+            except Exception:
+                pass
+            latencias.registrar(time.perf_counter() - inicio, metodo)
+        latencias.registrar(time.perf_counter() - inicio_ruc)
+        exitosos += 1
+    return exitosos
+
+
+def ejecutar_configuracion(nombre, rucs, secciones, workers):
+    """
+    Ejecuta una configuración en este proceso.
+
+    Returns:
+        Diccionario con exitosos, segundos y latencias por RUC y por método
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    from cliente_http import SUNATClienteHTTP
+    from scraper import SUNATScraper
+
+    base_url = os.environ["SUNAT_BASE_URL"]
+    incluir = {parametro: seccion in secciones for seccion, parametro in INCLUIR.items()}
+    latencias = _Latencias()
+
+    class ScraperMedido(SUNATScraper):
+        """Registra la latencia de cada consulta, también en los workers de los lotes"""
+
+        def consultar_ruc_completo(self, numero_ruc, **kwargs):
+            inicio = time.perf_counter()
+            try:
+                return super().consultar_ruc_completo(numero_ruc, **kwargs)
+            finally:
+                latencias.registrar(time.perf_counter() - inicio)
+
+    inicio = time.perf_counter()
+
+    if nombre == 'http':
+        cliente = SUNATClienteHTTP(base_url=base_url, pool_maxsize=max(10, workers))
+
+        def consultar(ruc):
+            inicio_ruc = time.perf_counter()
+            try:
+                return cliente.consultar_ruc_completo(ruc, **incluir)
+            except Exception:
+                return None
+            finally:
+                latencias.registrar(time.perf_counter() - inicio_ruc)
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            exitosos = sum(1 for resultado in executor.map(consultar, rucs) if resultado)
+        cliente.close()
+
+    elif nombre == 'http_secciones':
+        cliente = SUNATClienteHTTP(base_url=base_url)
+        exitosos = _medir_metodos(cliente, rucs, secciones, latencias)
+        cliente.close()
+
+    elif nombre == 'selenium_secciones':
+        scraper = SUNATScraper(secciones_en_pestanas=False)
+        inicio_driver = time.perf_counter()
+        scraper.setup_driver()
+        latencias.registrar(time.perf_counter() - inicio_driver, 'setup_driver')
+        try:
+            exitosos = _medir_metodos(scraper, rucs, secciones, latencias)
+        finally:
+            scraper.close()
+
+    elif nombre == 'lote_secuencial':
+        scraper = ScraperMedido()
+        scraper.setup_driver()
+        try:
+            resultados = scraper.consultar_multiples_rucs(rucs, **incluir)
+        finally:
+            scraper.close()
+        exitosos = sum(1 for r in resultados if r.get('success'))
+
+    elif nombre == 'lote_paralelo':
+        resultados = ScraperMedido().consultar_multiples_rucs_paralelo(rucs, max_workers=workers, **incluir)
+        exitosos = sum(1 for r in resultados if r.get('success'))
+
+    elif nombre == 'pestanas':
+        from navegador_pestanas import MotorPestanas
+        motor = MotorPestanas(navegadores=1, pestanas=workers)
+        motor.iniciar()
+        inicio = time.perf_counter()
+        try:
+            def consultar(ruc):
+                inicio_ruc = time.perf_counter()
+                try:
+                    return motor.consultar_ruc_completo(ruc, **incluir)
+                except Exception:
+                    return None
+                finally:
+                    latencias.registrar(time.perf_counter() - inicio_ruc)
+
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                exitosos = sum(1 for resultado in executor.map(consultar, rucs) if resultado)
+        finally:
+            motor.cerrar()
+
+    else:
+        raise ValueError(f"Configuración desconocida: {nombre}")
+
+    medicion = {
+        'exitosos': exitosos,
+        'segundos': time.perf_counter() - inicio,
+        'latencias': latencias.por_ruc,
+        'metodos': latencias.por_metodo,
+        'error': None,
+    }
+    if nombre.startswith('lote_') and not exitosos and resultados:
+        # Los lotes capturan los errores por RUC (ej: Chrome no disponible en los workers)
+        medicion['error'] = resultados[0].get('error')
+    return medicion
+
+
+def _proceso_hijo(args):
+    # Contra el servidor local no se limita la tasa; la concurrencia la fijan los workers
+    os.environ.setdefault("SUNAT_TASA", "0")
+    os.environ.setdefault("SUNAT_CONCURRENCIA_MAX", str(max(8, args.workers)))
+    os.environ.setdefault("SUNAT_CONCURRENCIA_INICIAL", str(max(8, args.workers)))
+    os.environ["SUNAT_BASE_URL"] = args.base_url
+
+    rucs = generar_rucs(args.rucs)
+    secciones = [s for s in args.secciones.split(',') if s]
+
+    try:
+        medicion = ejecutar_configuracion(args.ejecutar, rucs, secciones, args.workers)
+    except Exception as e:
+        medicion = {'exitosos': 0, 'segundos': 0, 'latencias': [], 'metodos': {}, 'error': str(e)}
+
+    medicion['rss_pico_mb'], medicion['rss_navegador_pico_mb'] = rss_pico_mb()
+    with open(args.salida_hijo, 'w') as f:
+        json.dump(medicion, f)
+
+
+# --- Coordinación (proceso principal) ---
+
+def medir(nombre, servidor, args):
+    """Ejecuta una configuración en un proceso nuevo y resume su medición"""
+    with tempfile.NamedTemporaryFile(suffix='.json', delete=False) as temporal:
+        salida = temporal.name
+
+    comando = [
+        sys.executable, os.path.abspath(__file__),
+        '--ejecutar', nombre,
+        '--base-url', servidor.base_url,
+        '--rucs', str(args.rucs),
+        '--secciones', args.secciones,
+        '--workers', str(args.workers),
+        '--salida-hijo', salida,
+    ]
+    salida_consola = None if args.verbose else subprocess.DEVNULL
+    try:
+        subprocess.run(comando, stdout=salida_consola, stderr=salida_consola, timeout=args.timeout)
+        with open(salida) as f:
+            medicion = json.load(f)
+    except (subprocess.TimeoutExpired, OSError, ValueError) as e:
+        medicion = {'exitosos': 0, 'segundos': 0, 'latencias': [], 'metodos': {}, 'error': str(e) or type(e).__name__,
+                    'rss_pico_mb': None, 'rss_navegador_pico_mb': None}
+    finally:
+        if os.path.exists(salida):
+            os.remove(salida)
+
+    segundos = medicion['segundos']
+    return {
+        'configuracion': nombre,
+        'rucs': args.rucs,
+        'exitosos': medicion['exitosos'],
+        'segundos': round(segundos, 2),
+        'rucs_por_segundo': round(medicion['exitosos'] / segundos, 2) if segundos else None,
+        **resumir_latencias(medicion['latencias']),
+        'rss_pico_mb': medicion['rss_pico_mb'],
+        'rss_navegador_pico_mb': medicion['rss_navegador_pico_mb'],
+        'metodos': {metodo: resumir_latencias(valores) for metodo, valores in medicion['metodos'].items()},
+        'error': medicion['error'],
+    }
+
+
+def _celda(valor):
+    return "-" if valor is None else str(valor)
+
+
+def imprimir_tabla(resultados):
+    columnas = [
+        ('configuracion', 'Configuración', 20), ('exitosos', 'OK', 5), ('rucs_por_segundo', 'RUCs/s', 8),
+        ('p50_ms', 'p50 ms', 9), ('p95_ms', 'p95 ms', 9), ('p99_ms', 'p99 ms', 9),
+        ('rss_pico_mb', 'RSS MB', 8), ('rss_navegador_pico_mb', 'Navegador MB', 13),
+    ]
+    print("\n" + "".join(titulo.ljust(ancho) for _, titulo, ancho in columnas))
+    print("-" * sum(ancho for _, _, ancho in columnas))
+    for resultado in resultados:
+        print("".join(_celda(resultado[clave]).ljust(ancho) for clave, _, ancho in columnas))
+        if resultado['error']:
+            print(f"  ⚠ {resultado['error']}")
+
+    for resultado in resultados:
+        if not resultado['metodos']:
+            continue
+        print(f"\n{resultado['configuracion']} (latencia por método)")
+        for metodo, resumen in resultado['metodos'].items():
+            print(f"  {metodo:<36}p50 {_celda(resumen['p50_ms']):>8} ms   "
+                  f"p95 {_celda(resumen['p95_ms']):>8} ms   p99 {_celda(resumen['p99_ms']):>8} ms")
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Benchmark de los motores de consulta contra el servidor simulado de SUNAT'
+    )
+    parser.add_argument('--configuraciones', default=','.join(CONFIGURACIONES),
+                        help=f'Lista separada por comas (default: todas): {", ".join(CONFIGURACIONES)}')
+    parser.add_argument('--rucs', type=int, default=20, help='RUCs por configuración (default: 20)')
+    parser.add_argument('--secciones', default='representantes_legales',
+                        help='Secciones adicionales separadas por comas (default: representantes_legales)')
+    parser.add_argument('--workers', type=int, default=4, help='Threads, navegadores o pestañas (default: 4)')
+    parser.add_argument('--latencia', type=float, default=0.1, help='Latencia promedio del servidor en segundos')
+    parser.add_argument('--variacion', type=float, default=0.5, help='Variación de la latencia (0.5 = ±50%%)')
+    parser.add_argument('--tasa-errores', type=float, default=0.0, help='Fracción de respuestas 503 del servidor')
+    parser.add_argument('--semilla', type=int, default=1)
+    parser.add_argument('--timeout', type=int, default=900, help='Segundos máximos por configuración')
+    parser.add_argument('--json', help='Guarda los resultados en este archivo')
+    parser.add_argument('--verbose', action='store_true', help='Muestra la salida de cada configuración')
+    # Uso interno: ejecución de una configuración en el proceso hijo
+    parser.add_argument('--ejecutar', help=argparse.SUPPRESS)
+    parser.add_argument('--base-url', help=argparse.SUPPRESS)
+    parser.add_argument('--salida-hijo', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    desconocidas = [s for s in args.secciones.split(',') if s and s not in INCLUIR]
+    if desconocidas:
+        parser.error(f"Secciones desconocidas: {', '.join(desconocidas)}")
+
+    if args.ejecutar:
+        _proceso_hijo(args)
+        return
+
+    configuraciones = [c.strip() for c in args.configuraciones.split(',') if c.strip()]
+    for nombre in configuraciones:
+        if nombre not in CONFIGURACIONES:
+            parser.error(f"Configuración desconocida: {nombre}")
+
+    servidor = ServidorSimulado(
+        latencia=args.latencia,
+        variacion=args.variacion,
+        tasa_errores=args.tasa_errores,
+        semilla=args.semilla
+    ).iniciar()
+    print(f"Servidor simulado en {servidor.base_url} "
+          f"(latencia {args.latencia}s ±{int(args.variacion * 100)}%, errores {args.tasa_errores:.0%})")
+    print(f"{args.rucs} RUCs por configuración, secciones: {args.secciones or 'ninguna'}, workers: {args.workers}")
+
+    resultados = []
+    try:
+        for nombre in configuraciones:
+            print(f"→ {nombre}...", flush=True)
+            resultados.append(medir(nombre, servidor, args))
+    finally:
+        servidor.detener()
+
+    imprimir_tabla(resultados)
+    print(f"\nSolicitudes al servidor: {servidor.estadisticas()}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({
+                'parametros': {
+                    'rucs': args.rucs, 'secciones': args.secciones, 'workers': args.workers,
+                    'latencia': args.latencia, 'variacion': args.variacion, 'tasa_errores': args.tasa_errores,
+                },
+                'resultados': resultados,
+            }, f, ensure_ascii=False, indent=2)
+        print(f"✓ Resultados guardados en {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Bitácora de eventos del scraper: logging con niveles, ID de correlación por
+consulta y salida en texto o JSON
+
+Cada consulta de RUC abre un contexto (contexto_consulta) con un ID propio
+que se agrega a todos sus eventos, aunque pasen por varios threads (ej: el
+despachador del motor de pestañas). El contexto guarda además los últimos
+eventos en un buffer circular en memoria, que la API adjunta a las
+respuestas de error en lugar de imprimirlos.
+
+Variables de entorno:
+    LOG_NIVEL         Nivel de la salida (DEBUG, INFO, WARNING, ERROR). Default: INFO
+    LOG_FORMATO       texto o json. Default: texto
+    LOG_NIVEL_BUFFER  Nivel mínimo de los eventos guardados por consulta. Default: INFO
+    LOG_BUFFER        Eventos guardados por consulta. Default: 50
+
+El detalle por fila de tabla se registra en DEBUG; con el nivel por defecto
+no se arma ni se formatea.
+"""
+
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+
+
+RAIZ = "sunat"
+
+_local = threading.local()
+_configurado = False
+_lock_configuracion = threading.Lock()
+
+
+class ContextoConsulta:
+    """ID de correlación y eventos recientes de una consulta de RUC"""
+
+    def __init__(self, numero_ruc, capacidad=None):
+        self.id = uuid.uuid4().hex[:12]
+        self.ruc = numero_ruc
+        self._eventos = deque(maxlen=capacidad or int(os.getenv("LOG_BUFFER", "50")))
+
+    def registrar(self, registro):
+        # deque.append es atómico; no hace falta lock entre threads
+        self._eventos.append({
+            'ts': round(registro.created, 3),
+            'nivel': registro.levelname,
+            'mensaje': registro.getMessage(),
+        })
+
+    def recientes(self):
+        """Copia de los eventos guardados, del más antiguo al más reciente"""
+        return list(self._eventos)
+
+
+def contexto_actual():
+    """Contexto de la consulta en curso en este thread (o None)"""
+    return getattr(_local, 'contexto', None)
+
+
+@contextmanager
+def contexto_activo(contexto):
+    """Asocia un contexto existente a los eventos de este thread"""
+    anterior = getattr(_local, 'contexto', None)
+    _local.contexto = contexto
+    try:
+        yield contexto
+    finally:
+        _local.contexto = anterior
+
+
+@contextmanager
+def contexto_consulta(numero_ruc):
+    """
+    Abre el contexto de la consulta de un RUC. Si el thread ya tiene uno
+    para el mismo RUC (ej: abierto por la API), se reutiliza.
+    """
+    actual = contexto_actual()
+    if actual is not None and actual.ruc == numero_ruc:
+        yield actual
+        return
+    with contexto_activo(ContextoConsulta(numero_ruc)) as contexto:
+        yield contexto
+
+
+def con_contexto(contexto, fn, *args, **kwargs):
+    """Ejecuta fn con el contexto indicado en este thread (ej: dentro del executor)"""
+    with contexto_activo(contexto):
+        return fn(*args, **kwargs)
+
+
+class _FiltroContexto(logging.Filter):
+    """Agrega ruc e id_consulta a cada evento"""
+
+    def filter(self, registro):
+        contexto = contexto_actual()
+        registro.ruc = contexto.ruc if contexto else None
+        registro.id_consulta = contexto.id if contexto else None
+        return True
+
+
+class _ManejadorBuffer(logging.Handler):
+    """Guarda los eventos en el buffer del contexto de la consulta en curso"""
+
+    def handle(self, registro):
+        # Sin formateo ni lock del handler: solo se agrega al buffer del contexto
+        contexto = contexto_actual()
+        if contexto is not None and registro.levelno >= self.level:
+            contexto.registrar(registro)
+        return True
+
+    def emit(self, registro):
+        pass
+
+
+class FormateadorTexto(logging.Formatter):
+    def format(self, registro):
+        mensaje = registro.getMessage()
+        if getattr(registro, 'id_consulta', None):
+            mensaje = f"[{registro.ruc} {registro.id_consulta}] {mensaje}"
+        linea = f"{self.formatTime(registro, '%Y-%m-%d %H:%M:%S')} {registro.levelname:<7} {mensaje}"
+        if registro.exc_info:
+            linea = f"{linea}\n{self.formatException(registro.exc_info)}"
+        return linea
+
+
+class FormateadorJSON(logging.Formatter):
+    """Un objeto JSON por línea"""
+
+    def format(self, registro):
+        evento = {
+            'ts': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(registro.created))
+                  + f".{int(registro.msecs):03d}",
+            'nivel': registro.levelname,
+            'logger': registro.name,
+            'mensaje': registro.getMessage(),
+            'thread': registro.threadName,
+        }
+        if getattr(registro, 'id_consulta', None):
+            evento['ruc'] = registro.ruc
+            evento['id_consulta'] = registro.id_consulta
+        if registro.exc_info:
+            evento['excepcion'] = self.formatException(registro.exc_info)
+        return json.dumps(evento, ensure_ascii=False)
+
+
+def _nivel(nombre, default):
+    nivel = logging.getLevelName((nombre or default).upper())
+    if not isinstance(nivel, int):
+        raise ValueError(f"Nivel de log inválido: {nombre}")
+    return nivel
+
+
+def configurar(nivel=None, formato=None, nivel_buffer=None, salida=None):
+    """
+    Configura la salida de la bitácora (se llama sola al primer obtener_logger).
+
+    Args:
+        nivel: Nivel de la salida (default: LOG_NIVEL o INFO)
+        formato: "texto" o "json" (default: LOG_FORMATO o texto)
+        nivel_buffer: Nivel mínimo de los eventos guardados por consulta (default: LOG_NIVEL_BUFFER o INFO)
+        salida: Stream de salida (default: sys.stderr)
+    """
+    global _configurado
+
+    nivel = _nivel(nivel or os.getenv("LOG_NIVEL"), "INFO")
+    nivel_buffer = _nivel(nivel_buffer or os.getenv("LOG_NIVEL_BUFFER"), "INFO")
+    formato = (formato or os.getenv("LOG_FORMATO") or "texto").lower()
+    if formato not in ("texto", "json"):
+        raise ValueError(f"Formato de log inválido: {formato} (opciones: texto, json)")
+
+    with _lock_configuracion:
+        raiz = logging.getLogger(RAIZ)
+        for manejador in list(raiz.handlers):
+            raiz.removeHandler(manejador)
+
+        salida_estandar = logging.StreamHandler(salida or sys.stderr)
+        salida_estandar.setLevel(nivel)
+        salida_estandar.setFormatter(FormateadorJSON() if formato == "json" else FormateadorTexto())
+        # Los filtros del logger no se aplican a los eventos de los loggers hijos; van en el handler
+        salida_estandar.addFilter(_FiltroContexto())
+
+        buffer = _ManejadorBuffer()
+        buffer.setLevel(nivel_buffer)
+
+        # El logger deja pasar lo que necesite cualquiera de los dos destinos
+        raiz.setLevel(min(nivel, nivel_buffer))
+        raiz.addHandler(buffer)
+        raiz.addHandler(salida_estandar)
+        raiz.propagate = False
+        _configurado = True
+
+
+def obtener_logger(nombre):
+    """Logger hijo de 'sunat' para un módulo (ej: obtener_logger('scraper'))"""
+    if not _configurado:
+        configurar()
+    return logging.getLogger(f"{RAIZ}.{nombre}")
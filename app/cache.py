@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+"""
+Cache de resultados por (RUC, sección): LRU en memoria respaldado por SQLite
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from scraper import SECCIONES
+from metricas import tramo, registrar_cache
+
+
+HORA = 3600
+DIA = 24 * HORA
+SEMANA = 7 * DIA
+
+# Resultado compartido de una consulta en curso cuyo RUC no se encontró
+_NO_ENCONTRADO = object()
+
+
+class CacheResultados:
+    """
+    Cache de dos niveles para los resultados del scraper.
+
+    Cada RUC se guarda por sección: 'datos_basicos' (ficha principal,
+    incluye estado y condición) y una entrada por cada sección adicional.
+    Las lecturas consultan primero el LRU en memoria y luego SQLite.
+
+    consultar() además comparte las consultas en curso: si otro thread ya
+    está obteniendo una sección del mismo RUC, se espera ese resultado en
+    lugar de consultar SUNAT de nuevo.
+    """
+
+    # Tiempo de vida por sección en segundos
+    TTLS = {
+        'datos_basicos': 6 * HORA,
+        'cantidad_trabajadores': 7 * DIA,
+        'representantes_legales': 7 * DIA,
+        'informacion_historica': 4 * SEMANA,
+        'deuda_coactiva': DIA,
+        'reactiva_peru': SEMANA,
+        'programa_covid19': SEMANA,
+        'establecimientos_anexos': SEMANA,
+    }
+
+    def __init__(self, ruta_db="cache_sunat.db", max_items=5000, ttls=None, ttl_vacio=HORA):
+        """
+        Args:
+            ruta_db: Ruta del archivo SQLite (":memory:" para no persistir)
+            max_items: Entradas (RUC, sección) que se mantienen en memoria
+            ttls: Diccionario sección -> segundos que sobrescribe TTLS
+            ttl_vacio: Tiempo de vida de una sección que no retornó datos
+        """
+        self.ttls = dict(self.TTLS, **(ttls or {}))
+        self.ttl_vacio = ttl_vacio
+        self.max_items = max_items
+
+        self._memoria = OrderedDict()
+        self._lock = threading.Lock()
+
+        # (ruc, sección) -> Future de la consulta en curso
+        self._en_vuelo = {}
+        self._lock_vuelo = threading.Lock()
+
+        self._db = sqlite3.connect(ruta_db, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS resultados (
+                ruc TEXT NOT NULL,
+                seccion TEXT NOT NULL,
+                valor TEXT,
+                guardado REAL NOT NULL,
+                PRIMARY KEY (ruc, seccion)
+            )
+            """
+        )
+        self._db.commit()
+
+    def _leer(self, ruc, seccion):
+        clave = (ruc, seccion)
+        with self._lock:
+            entrada = self._memoria.get(clave)
+            if entrada is not None:
+                self._memoria.move_to_end(clave)
+                return entrada
+
+            fila = self._db.execute(
+                "SELECT valor, guardado FROM resultados WHERE ruc = ? AND seccion = ?",
+                (ruc, seccion)
+            ).fetchone()
+            if fila is None:
+                return None
+
+            self._recordar(clave, fila)
+            return fila
+
+    def _recordar(self, clave, entrada):
+        self._memoria[clave] = entrada
+        self._memoria.move_to_end(clave)
+        while len(self._memoria) > self.max_items:
+            self._memoria.popitem(last=False)
+
+    def obtener(self, ruc, seccion, max_age=None):
+        """
+        Retorna el valor guardado si sigue vigente.
+
+        Args:
+            ruc: Número de RUC
+            seccion: 'datos_basicos' o una clave de SECCIONES
+            max_age: Antigüedad máxima aceptada en segundos (además del TTL)
+
+        Returns:
+            Tupla (encontrado, valor). El valor puede ser None si la sección no tenía datos.
+        """
+        entrada = self._leer(ruc, seccion)
+        if entrada is None:
+            return False, None
+
+        valor_json, guardado = entrada
+        ttl = self.ttls.get(seccion, HORA) if valor_json != 'null' else self.ttl_vacio
+        if max_age is not None:
+            ttl = min(ttl, max_age)
+
+        if time.time() - guardado > ttl:
+            return False, None
+        return True, json.loads(valor_json)
+
+    def guardar(self, ruc, seccion, valor):
+        """Guarda el valor de una sección en memoria y en SQLite"""
+        entrada = (json.dumps(valor, ensure_ascii=False), time.time())
+        with self._lock:
+            self._recordar((ruc, seccion), entrada)
+            self._db.execute(
+                "INSERT OR REPLACE INTO resultados (ruc, seccion, valor, guardado) VALUES (?, ?, ?, ?)",
+                (ruc, seccion, entrada[0], entrada[1])
+            )
+            self._db.commit()
+
+    def obtener_resultado(self, numero_ruc, secciones, max_age=None):
+        """
+        Arma un resultado completo desde el cache.
+
+        Args:
+            numero_ruc: Número de RUC
+            secciones: Claves de SECCIONES solicitadas
+            max_age: Antigüedad máxima aceptada en segundos
+
+        Returns:
+            Tupla (resultado, hits, misses). resultado es None si falta alguna sección.
+        """
+        partes, hits, misses = self._leer_partes(numero_ruc, secciones, max_age)
+        if misses:
+            return None, hits, misses
+
+        return self._armar(partes, secciones), hits, misses
+
+    def _leer_partes(self, numero_ruc, secciones, max_age=None):
+        """Valores vigentes de los datos básicos y las secciones: (partes, hits, misses)"""
+        hits, misses = [], []
+        partes = {}
+
+        for seccion in ['datos_basicos'] + list(secciones):
+            encontrado, valor = self.obtener(numero_ruc, seccion, max_age)
+            if encontrado:
+                hits.append(seccion)
+                partes[seccion] = valor
+            else:
+                misses.append(seccion)
+
+        return partes, hits, misses
+
+    @staticmethod
+    def _armar(partes, secciones):
+        resultado = dict(partes['datos_basicos'])
+        for seccion in secciones:
+            if partes.get(seccion):
+                resultado[seccion] = partes[seccion]
+        return resultado
+
+    @staticmethod
+    def _basicos(resultado):
+        return {
+            clave: valor for clave, valor in resultado.items()
+            if clave not in SECCIONES and clave not in ('success', 'cache', 'tiempo_procesamiento')
+        }
+
+    def guardar_resultado(self, numero_ruc, resultado, secciones):
+        """
+        Guarda un resultado del scraper separado por sección.
+
+        Args:
+            numero_ruc: Número de RUC
+            resultado: Diccionario retornado por consultar_ruc_completo
+            secciones: Secciones que se solicitaron al scraper
+        """
+        basicos = self._basicos(resultado)
+        self.guardar(numero_ruc, 'datos_basicos', basicos)
+
+        # Solo se guardan secciones de RUCs con razón social: sin ella no se consultan
+        if basicos.get('razon_social'):
+            for seccion in secciones:
+                self.guardar(numero_ruc, seccion, resultado.get(seccion))
+
+    def _reclamar(self, numero_ruc, secciones):
+        """
+        Separa las secciones en propias (este thread las consultará) y
+        ajenas (ya hay una consulta en curso de otro thread).
+
+        Returns:
+            Tupla (propias, ajenas): diccionarios sección -> Future
+        """
+        propias, ajenas = {}, {}
+        with self._lock_vuelo:
+            for seccion in secciones:
+                clave = (numero_ruc, seccion)
+                if clave in self._en_vuelo:
+                    ajenas[seccion] = self._en_vuelo[clave]
+                else:
+                    propias[seccion] = self._en_vuelo[clave] = Future()
+        return propias, ajenas
+
+    def _liberar(self, numero_ruc, propias):
+        with self._lock_vuelo:
+            for seccion in propias:
+                self._en_vuelo.pop((numero_ruc, seccion), None)
+
+    def consultar(self, numero_ruc, consultar_fn, max_age=None, **incluir):
+        """
+        Consulta un RUC usando el cache y solo pide al scraper las secciones faltantes.
+
+        Las secciones que otro thread ya está consultando para el mismo RUC no
+        se vuelven a pedir: se espera su resultado (incluso si esa consulta
+        pidió menos secciones, solo se consultan las que faltan).
+
+        Args:
+            numero_ruc: Número de RUC
+            consultar_fn: Callable con la firma de consultar_ruc_completo
+            max_age: Antigüedad máxima aceptada en segundos (0 = ignorar el cache)
+            **incluir: Parámetros incluir_* de consultar_ruc_completo
+
+        Returns:
+            Diccionario del RUC con el campo 'cache' (hits/misses/compartidas)
+            o None si no se encontró
+        """
+        secciones = [s for s, parametro in SECCIONES.items() if incluir.get(parametro)]
+
+        with tramo('cache'):
+            # Los hits se conservan: releerlos más adelante podría encontrarlos vencidos
+            en_cache, hits, misses = self._leer_partes(numero_ruc, secciones, max_age)
+        if not misses:
+            resultado = self._armar(en_cache, secciones)
+            resultado['cache'] = {'hits': hits, 'misses': [], 'compartidas': []}
+            registrar_cache(resultado['cache'])
+            return resultado
+
+        propias, ajenas = self._reclamar(numero_ruc, misses)
+        partes = {}
+        consultadas = []
+
+        try:
+            faltantes = [s for s in secciones if s in propias]
+            # Los datos básicos siempre se consultan (establecen la sesión en SUNAT)
+            if faltantes or 'datos_basicos' in propias:
+                nuevo = consultar_fn(
+                    numero_ruc,
+                    **{parametro: seccion in faltantes for seccion, parametro in SECCIONES.items()}
+                )
+                if nuevo:
+                    self.guardar_resultado(numero_ruc, nuevo, faltantes)
+                    partes['datos_basicos'] = self._basicos(nuevo)
+                    partes.update({seccion: nuevo.get(seccion) for seccion in faltantes})
+                    consultadas = ['datos_basicos'] + faltantes
+                for seccion, future in propias.items():
+                    future.set_result(partes.get(seccion) if nuevo else _NO_ENCONTRADO)
+        except BaseException as e:
+            for future in propias.values():
+                future.set_exception(e)
+            raise
+        finally:
+            self._liberar(numero_ruc, propias)
+
+        if propias and not partes:
+            return None
+
+        # Esperar las secciones que consulta otro thread
+        compartidas = []
+        for seccion, future in ajenas.items():
+            if seccion in partes:
+                continue
+            with tramo('espera_compartida'):
+                valor = future.result()
+            if valor is _NO_ENCONTRADO:
+                return None
+            partes[seccion] = valor
+            compartidas.append(seccion)
+
+        for seccion in hits:
+            partes.setdefault(seccion, en_cache[seccion])
+
+        resultado = self._armar(partes, secciones)
+        resultado['cache'] = {
+            'hits': [s for s in hits if s not in consultadas],
+            'misses': consultadas,
+            'compartidas': compartidas
+        }
+        registrar_cache(resultado['cache'])
+        return resultado
+
+    def close(self):
+        with self._lock:
+            self._db.close()
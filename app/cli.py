@@ -6,7 +6,23 @@ Script CLI para consultar RUC en SUNAT
 import json
 import argparse
 import os
+import subprocess
+import sys
+import threading
 from scraper import SUNATScraper
+from limitador import limitador_sunat
+from planificador import INTERACTIVA, LOTE
+from lotes import (
+    EjecucionLote, CheckpointInvalidoError, Checkpoint, nombre_parte, combinar_resultados,
+    parsear_shard, en_shard
+)
+
+
+def _tipo_shard(texto):
+    try:
+        return parsear_shard(texto)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
 
 
 def main():
@@ -36,6 +52,13 @@ def main():
         help='Ruta a archivo de texto con RUCs (uno por línea)'
     )
     
+    ruc_group.add_argument(
+        '--cola',
+        type=str,
+        help='Trabaja como worker de una cola persistente (ruta SQLite o URL, ver cola.py): '
+             'toma RUCs hasta vaciarla y guarda los resultados en la cola'
+    )
+    
     parser.add_argument(
         '--trabajadores',
         action='store_true',
@@ -85,8 +108,85 @@ def main():
         help='Archivo de salida para guardar resultados en JSON'
     )
     
+    parser.add_argument(
+        '--jsonl',
+        type=str,
+        metavar='SALIDA',
+        help='Con --archivo: lee los RUCs en streaming y agrega cada resultado a este archivo JSONL '
+             '(una línea por RUC), con checkpoint para reanudar si se interrumpe'
+    )
+    
+    parser.add_argument(
+        '--checkpoint',
+        type=str,
+        help='Archivo de checkpoint del lote (default: <SALIDA>.checkpoint)'
+    )
+    
+    parser.add_argument(
+        '--checkpoint-cada',
+        type=int,
+        default=50,
+        help='RUCs procesados entre checkpoints (default: 50)'
+    )
+    
+    parser.add_argument(
+        '--reiniciar',
+        action='store_true',
+        help='Descarta el checkpoint y la salida JSONL anteriores y procesa el archivo desde el inicio'
+    )
+    
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=1,
+        help='RUCs consultados en paralelo, cada uno con su propio navegador (default: 1, secuencial)'
+    )
+    
+    parser.add_argument(
+        '--procesos',
+        type=int,
+        default=1,
+        help='Con --jsonl: reparte la entrada entre N procesos, cada uno con sus propios --workers (default: 1)'
+    )
+    
+    parser.add_argument(
+        '--shard',
+        type=_tipo_shard,
+        metavar='i/N',
+        help='Procesa solo los RUCs del shard i de N (hash estable del RUC), para repartir '
+             'un portafolio entre N máquinas. Ej: --shard 2/4'
+    )
+    
+    parser.add_argument(
+        '--lote',
+        type=str,
+        help='Con --cola: procesar solo este lote (default: cualquiera)'
+    )
+    
+    # Uso interno: partición "i/N" que procesa cada proceso hijo de --procesos
+    parser.add_argument('--particion', type=_tipo_shard, help=argparse.SUPPRESS)
+    
     args = parser.parse_args()
     
+    # El CLI solo ejecuta lotes: un lugar reservado a consultas interactivas quedaría sin uso
+    if not os.getenv("PRIORIDAD_RESERVA_INTERACTIVA"):
+        limitador_sunat.reservar({INTERACTIVA: 0, LOTE: 0})
+    
+    if args.workers < 1 or args.procesos < 1:
+        parser.error('--workers y --procesos deben ser mayores que 0')
+    if args.procesos > 1 and not args.jsonl:
+        parser.error('--procesos requiere --jsonl')
+    
+    if args.cola:
+        sys.exit(trabajar_cola(args))
+    
+    if args.jsonl:
+        if not args.archivo:
+            parser.error('--jsonl requiere --archivo')
+        if args.procesos > 1 and not args.particion:
+            sys.exit(ejecutar_lote_procesos(args))
+        sys.exit(ejecutar_lote_jsonl(args))
+    
     rucs = []
     
     if args.ruc:
@@ -105,6 +205,12 @@ def main():
         print("Error: Debe proporcionar al menos un RUC")
         return
     
+    if args.shard:
+        rucs = [ruc for ruc in rucs if en_shard(ruc, args.shard)]
+        if not rucs:
+            print(f"ℹ Ningún RUC corresponde al shard {_texto_shard(args.shard)}")
+            return
+    
     rucs_invalidos = [ruc for ruc in rucs if not ruc.isdigit() or len(ruc) != 11]
     if rucs_invalidos:
         print(f"Error: Los siguientes RUCs son inválidos (deben tener 11 dígitos):")
@@ -175,7 +281,9 @@ def main():
                 incluir_deuda_coactiva=args.deuda_coactiva,
                 incluir_reactiva_peru=args.reactiva_peru,
                 incluir_programa_covid19=args.programa_covid19,
-                incluir_establecimientos=args.establecimientos_anexos
+                incluir_establecimientos=args.establecimientos_anexos,
+                use_threading=args.workers > 1,
+                max_workers=args.workers
             )
             resultados_finales = resultados
         
@@ -198,5 +306,265 @@ def main():
         scraper.close()
 
 
+def _incluir(args):
+    return {
+        'incluir_trabajadores': args.trabajadores,
+        'incluir_representantes': args.representantes,
+        'incluir_historico': args.historico,
+        'incluir_deuda_coactiva': args.deuda_coactiva,
+        'incluir_reactiva_peru': args.reactiva_peru,
+        'incluir_programa_covid19': args.programa_covid19,
+        'incluir_establecimientos': args.establecimientos_anexos,
+    }
+
+
+def _consultor():
+    """
+    Crea la función que consulta un RUC con un scraper (y navegador) por thread,
+    reutilizado en todo el lote.
+    
+    Returns:
+        Tupla (consultar(ruc, **incluir) -> resultado de lote, cerrar())
+    """
+    local = threading.local()
+    scrapers = []
+    lock_scrapers = threading.Lock()
+    
+    def consultar(ruc, **incluir):
+        scraper = getattr(local, 'scraper', None)
+        if scraper is None:
+            scraper = SUNATScraper()
+            local.scraper = scraper
+            with lock_scrapers:
+                scrapers.append(scraper)
+        # Un driver caído no debe detener el lote: se reinicia antes del siguiente RUC
+        if not scraper.driver_activo():
+            if scraper.driver:
+                try:
+                    scraper.close()
+                except Exception:
+                    pass
+            scraper.setup_driver()
+        return SUNATScraper._worker_procesar_ruc(scraper, ruc, **incluir)
+    
+    def cerrar():
+        for scraper in scrapers:
+            try:
+                scraper.close()
+            except Exception:
+                pass
+    
+    return consultar, cerrar
+
+
+def _texto_shard(shard):
+    return f"{shard[0] + 1}/{shard[1]}"
+
+
+def ejecutar_lote_jsonl(args):
+    """
+    Procesa --archivo en streaming escribiendo los resultados en --jsonl.
+    Si existe un checkpoint de una ejecución anterior, continúa desde él.
+    
+    Returns:
+        Código de salida del proceso
+    """
+    if not os.path.exists(args.archivo):
+        print(f"Error: El archivo '{args.archivo}' no existe")
+        return 1
+    
+    incluir = _incluir(args)
+    particion = args.particion
+    etiqueta = f"[parte {_texto_shard(particion)}] " if particion else ""
+    
+    lote = EjecucionLote(
+        args.archivo,
+        args.jsonl,
+        checkpoint=args.checkpoint,
+        cada=args.checkpoint_cada,
+        reiniciar=args.reiniciar,
+        workers=args.workers,
+        particion=particion,
+        shard=args.shard
+    )
+    
+    consultar_con, cerrar_scrapers = _consultor()
+    
+    def consultar(ruc):
+        return consultar_con(ruc, **incluir)
+    
+    def mostrar_avance(resumen):
+        velocidad = resumen['rucs_por_segundo']
+        print(f"  {etiqueta}{resumen['procesados']} procesados "
+              f"({resumen['exitosos']} exitosos, {resumen['fallidos']} fallidos)"
+              + (f" - {velocidad} RUCs/s" if velocidad else ""), flush=True)
+    
+    if not particion:
+        print("="*60)
+        print("        WEB SCRAPER - CONSULTA RUC SUNAT (LOTE JSONL)")
+        print("="*60)
+        if args.shard:
+            print(f"ℹ Shard {_texto_shard(args.shard)}")
+    
+    try:
+        resumen = lote.ejecutar(consultar, al_avanzar=mostrar_avance)
+    except CheckpointInvalidoError as e:
+        print(f"Error: {etiqueta}{e}")
+        return 1
+    except KeyboardInterrupt:
+        print(f"\n⚠ {etiqueta}Lote interrumpido: {lote.procesados} RUCs guardados en {args.jsonl}")
+        if not particion:
+            print("  Ejecute el mismo comando para continuar desde el checkpoint")
+        return 130
+    except Exception as e:
+        # Ej: no se pudo iniciar el navegador; el checkpoint ya quedó guardado
+        print(f"Error: {etiqueta}{e}")
+        return 1
+    finally:
+        cerrar_scrapers()
+    
+    if resumen['reanudado'] and not resumen['en_esta_ejecucion']:
+        print(f"ℹ {etiqueta}El lote ya estaba completo (use --reiniciar para procesarlo de nuevo)")
+    elif resumen['reanudado']:
+        print(f"ℹ {etiqueta}Lote reanudado desde el checkpoint ({resumen['en_esta_ejecucion']} RUCs en esta ejecución)")
+    print(f"✓ {etiqueta}Lote completo: {resumen['procesados']} RUCs "
+          f"({resumen['exitosos']} exitosos, {resumen['fallidos']} fallidos)")
+    if not particion:
+        print(f"  Resultados en: {args.jsonl}")
+    return 0
+
+
+def trabajar_cola(args):
+    """
+    Procesa RUCs de una cola persistente hasta que no queden pendientes.
+    Las secciones a incluir son las del lote, indicadas al encolar.
+    
+    Returns:
+        Código de salida del proceso
+    """
+    from cola import abrir_cola, trabajar
+    
+    cola = abrir_cola(args.cola)
+    consultar, cerrar_scrapers = _consultor()
+    
+    print("="*60)
+    print("        WEB SCRAPER - CONSULTA RUC SUNAT (WORKER DE COLA)")
+    print("="*60)
+    print(f"ℹ Cola: {args.cola}" + (f" (lote {args.lote})" if args.lote else ""))
+    
+    try:
+        conteo = trabajar(cola, consultar, lote=args.lote, workers=args.workers)
+        estado = cola.estadisticas(args.lote)
+    except KeyboardInterrupt:
+        print("\n⚠ Worker detenido. Los RUCs pendientes siguen en la cola")
+        return 130
+    finally:
+        cerrar_scrapers()
+        cola.cerrar()
+    
+    print(f"✓ Cola vacía: {conteo['exitosos']} exitosos, {conteo['fallidos']} fallidos en este worker")
+    if conteo['perdidos']:
+        print(f"⚠ {conteo['perdidos']} resultados descartados: la reserva venció y otro worker tomó el RUC")
+    print(f"  Estado: {json.dumps(estado, ensure_ascii=False)}")
+    return 0
+
+
+def ejecutar_lote_procesos(args):
+    """
+    Reparte --archivo entre --procesos procesos hijos (cli.py --particion i/N).
+    
+    Cada hijo tiene sus propios navegadores, limitador, salida y checkpoint, y
+    se reanuda por separado. La tasa de SUNAT_TASA se reparte entre los hijos
+    para que el total hacia SUNAT no cambie. Al terminar todos, sus salidas se
+    combinan en --jsonl, ordenadas por RUC.
+    
+    Returns:
+        Código de salida del proceso
+    """
+    if not os.path.exists(args.archivo):
+        print(f"Error: El archivo '{args.archivo}' no existe")
+        return 1
+    
+    total = args.procesos
+    checkpoint = Checkpoint(args.checkpoint or f"{args.jsonl}.checkpoint")
+    estado = None if args.reiniciar else checkpoint.cargar()
+    shard = list(args.shard) if args.shard else None
+    if (estado and estado.get('completo') and estado.get('archivo') == os.path.abspath(args.archivo)
+            and estado.get('shard') == shard):
+        print(f"ℹ El lote ya estaba completo en {args.jsonl} (use --reiniciar para procesarlo de nuevo)")
+        return 0
+    
+    entorno = dict(os.environ)
+    entorno['SUNAT_TASA'] = str(float(os.getenv("SUNAT_TASA", "4")) / total)
+    entorno['SUNAT_RAFAGA'] = str(max(1, int(os.getenv("SUNAT_RAFAGA", "8")) // total))
+    
+    opciones = [
+        flag for flag, activo in (
+            ('--trabajadores', args.trabajadores),
+            ('--representantes', args.representantes),
+            ('--historico', args.historico),
+            ('--deuda-coactiva', args.deuda_coactiva),
+            ('--reactiva-peru', args.reactiva_peru),
+            ('--programa-covid19', args.programa_covid19),
+            ('--establecimientos-anexos', args.establecimientos_anexos),
+            ('--reiniciar', args.reiniciar),
+        ) if activo
+    ]
+    if args.shard:
+        opciones += ['--shard', _texto_shard(args.shard)]
+    
+    print("="*60)
+    print(f"        WEB SCRAPER - CONSULTA RUC SUNAT (LOTE JSONL, {total} PROCESOS)")
+    print("="*60)
+    if args.shard:
+        print(f"ℹ Shard {_texto_shard(args.shard)}")
+    
+    partes = [nombre_parte(args.jsonl, indice, total) for indice in range(total)]
+    hijos = []
+    for indice, parte in enumerate(partes):
+        comando = [
+            sys.executable, os.path.abspath(__file__),
+            '--archivo', args.archivo,
+            '--jsonl', parte,
+            '--checkpoint', f"{parte}.checkpoint",
+            '--checkpoint-cada', str(args.checkpoint_cada),
+            '--workers', str(args.workers),
+            '--particion', f"{indice + 1}/{total}",
+        ] + opciones
+        hijos.append(subprocess.Popen(comando, env=entorno))
+    
+    try:
+        codigos = [hijo.wait() for hijo in hijos]
+    except KeyboardInterrupt:
+        # Ctrl+C llega también a los hijos; cada uno guarda su checkpoint
+        for hijo in hijos:
+            hijo.wait()
+        print("\n⚠ Lote interrumpido. Ejecute el mismo comando para continuar desde los checkpoints")
+        return 130
+    
+    fallidos = [indice for indice, codigo in enumerate(codigos) if codigo != 0]
+    if fallidos:
+        print(f"Error: {len(fallidos)} proceso(s) no terminaron: "
+              f"{', '.join(f'parte {indice + 1}' for indice in fallidos)}")
+        print("  Ejecute el mismo comando para continuar desde los checkpoints")
+        return 1
+    
+    combinar_resultados(partes, args.jsonl)
+    checkpoint.guardar({
+        'archivo': os.path.abspath(args.archivo),
+        'salida': os.path.abspath(args.jsonl),
+        'procesos': total,
+        'shard': shard,
+        'completo': True,
+    })
+    for parte in partes:
+        for ruta in (parte, f"{parte}.checkpoint"):
+            if os.path.exists(ruta):
+                os.remove(ruta)
+    
+    print(f"✓ Lote completo. Resultados en: {args.jsonl}")
+    return 0
+
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+"""
+Cliente HTTP (sin navegador) para la consulta RUC de SUNAT
+
+Envía directamente los POST a jcrS00Alias que los botones de la ficha RUC
+generan en el navegador y parsea el HTML retornado con parsers.py.
+"""
+
+import random
+import string
+import threading
+from datetime import datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import parsers
+from limitador import limitador_sunat
+from metricas import tramo, medir_seccion, medir_consulta
+from bitacora import obtener_logger, contexto_consulta
+
+
+log = obtener_logger('cliente_http')
+
+
+class ClienteHTTPError(Exception):
+    """Error de red o respuesta inesperada de SUNAT en el cliente HTTP"""
+
+
+class SUNATClienteHTTP:
+    """
+    Cliente HTTP con sesiones reutilizables para consultar RUC en SUNAT.
+
+    Expone los mismos métodos públicos que SUNATScraper (consultar_ruc,
+    extraer_*, consultar_ruc_completo) para poder usarse en su lugar.
+    Las conexiones se comparten entre threads a través de un único
+    HTTPAdapter; cada thread mantiene su propia sesión (cookies).
+
+    Si se indica un respaldo, consultar_ruc_completo lo usa cuando la
+    consulta HTTP falla o no retorna la ficha del RUC.
+    """
+
+    BASE_URL = "https://e-consultaruc.sunat.gob.pe/cl-ti-itmrconsruc"
+
+    # Sección -> valor del parámetro 'accion' y parser correspondiente
+    SECCIONES = {
+        'cantidad_trabajadores': ('getCantTrab', parsers.parsear_cantidad_trabajadores),
+        'representantes_legales': ('getRepLeg', parsers.parsear_representantes_legales),
+        'informacion_historica': ('getinfHis', parsers.parsear_informacion_historica),
+        'deuda_coactiva': ('getInfoDC', parsers.parsear_deuda_coactiva),
+        'reactiva_peru': ('getReactivaPeru', parsers.parsear_reactiva_peru),
+        'programa_covid19': ('getPGarantiaCOVID19', parsers.parsear_programa_covid19),
+        'establecimientos_anexos': ('getLocAnex', parsers.parsear_establecimientos_anexos),
+    }
+
+    HEADERS = {
+        'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/143.0.0.0 Safari/537.36',
+        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+        'Accept-Language': 'es-PE,es;q=0.9',
+    }
+
+    def __init__(self, base_url=None, timeout=15, pool_maxsize=10, reintentos=2, respaldo=None):
+        """
+        Args:
+            base_url: URL base de cl-ti-itmrconsruc (permite apuntar a un servidor local)
+            timeout: Timeout en segundos de cada request
+            pool_maxsize: Conexiones HTTP reutilizables por host
+            reintentos: Reintentos ante errores de conexión o 5xx
+            respaldo: Callable con la firma de consultar_ruc_completo (ej: Selenium)
+        """
+        self.base_url = (base_url or self.BASE_URL).rstrip('/')
+        self.url = f"{self.base_url}/FrameCriterioBusquedaWeb.jsp"
+        self.url_alias = f"{self.base_url}/jcrS00Alias"
+        self.timeout = timeout
+        self.respaldo = respaldo
+
+        self._adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=pool_maxsize,
+            max_retries=Retry(
+                total=reintentos,
+                backoff_factor=0.5,
+                status_forcelist=(500, 502, 503, 504),
+                allowed_methods=None
+            )
+        )
+        self._local = threading.local()
+        self._sesiones = []
+        self._lock = threading.Lock()
+
+    def _sesion(self):
+        """Sesión del thread actual, creada e inicializada al primer uso"""
+        sesion = getattr(self._local, 'sesion', None)
+        if sesion is None:
+            sesion = requests.Session()
+            sesion.headers.update(self.HEADERS)
+            sesion.mount('http://', self._adapter)
+            sesion.mount('https://', self._adapter)
+
+            # Obtener las cookies de sesión del formulario de búsqueda
+            # Si falla, la sesión se descarta sin cerrarla (close() cerraría el adapter compartido)
+            self._get(sesion, self.url)
+
+            self._local.sesion = sesion
+            with self._lock:
+                self._sesiones.append(sesion)
+        return sesion
+
+    def _descartar_sesion(self):
+        """
+        Olvida la sesión del thread actual para que la próxima consulta abra una nueva.
+        No se cierra: comparte el adapter (y sus conexiones) con las sesiones de los demás threads.
+        """
+        sesion = getattr(self._local, 'sesion', None)
+        if sesion is None:
+            return
+        self._local.sesion = None
+        with self._lock:
+            if sesion in self._sesiones:
+                self._sesiones.remove(sesion)
+
+    def _get(self, sesion, url):
+        limitador_sunat.esperar_turno()
+        try:
+            respuesta = sesion.get(url, timeout=self.timeout)
+            respuesta.raise_for_status()
+            return respuesta
+        except requests.RequestException as e:
+            raise ClienteHTTPError(f"Error de conexión con SUNAT: {str(e)}") from e
+
+    def _post(self, datos):
+        sesion = self._sesion()
+        limitador_sunat.esperar_turno()
+        try:
+            respuesta = sesion.post(
+                self.url_alias,
+                data=datos,
+                headers={'Referer': self.url},
+                timeout=self.timeout
+            )
+            respuesta.raise_for_status()
+        except requests.RequestException as e:
+            self._descartar_sesion()
+            raise ClienteHTTPError(f"Error de conexión con SUNAT: {str(e)}") from e
+        return respuesta.content
+
+    @staticmethod
+    def _token():
+        """Token aleatorio que el formulario de búsqueda genera por JavaScript"""
+        return ''.join(random.choices(string.ascii_lowercase + string.digits, k=52))
+
+    @classmethod
+    def _formulario_busqueda(cls, numero_ruc):
+        """Campos del POST que envía el botón Buscar del formulario (accion=consPorRuc)"""
+        return {
+            'accion': 'consPorRuc',
+            'razSoc': '',
+            'nroRuc': numero_ruc,
+            'nrodoc': '',
+            'contexto': 'ti-it',
+            'modo': '1',
+            'rbtnTipo': '1',
+            'search1': numero_ruc,
+            'tipdoc': '1',
+            'search2': '',
+            'search3': '',
+            'codigo': '',
+            'token': cls._token(),
+        }
+
+    @staticmethod
+    def _formulario_seccion(accion, numero_ruc, razon_social):
+        """Campos del POST que envían los botones de sección de la ficha RUC"""
+        return {
+            'accion': accion,
+            'contexto': 'ti-it',
+            'modo': '1',
+            'nroRuc': numero_ruc,
+            'desRuc': razon_social,
+        }
+
+    def consultar_ruc(self, numero_ruc):
+        """
+        Consulta los datos básicos de un RUC (accion=consPorRuc)
+
+        Returns:
+            Diccionario con los datos del RUC o None si SUNAT indica que el RUC no existe
+
+        Raises:
+            ClienteHTTPError: Si SUNAT no responde, retorna un error HTTP o una página sin ficha reconocible
+        """
+        if getattr(self._local, 'sesion', None) is None:
+            # Primera consulta del thread: obtener la sesión desde el formulario
+            with tramo('navegacion'):
+                self._sesion()
+
+        with tramo('busqueda'):
+            html = self._post(self._formulario_busqueda(numero_ruc))
+
+        with tramo('extraccion_base'):
+            datos = parsers.parsear_datos_basicos(html)
+        if not datos:
+            if parsers.es_ruc_no_encontrado(html):
+                return None
+            # Puede ser una sesión vencida en SUNAT: la próxima consulta empieza con otra
+            self._descartar_sesion()
+            raise ClienteHTTPError(f"Ficha del RUC {numero_ruc} no reconocida en la respuesta de SUNAT")
+
+        datos['ruc'] = numero_ruc
+        datos['fecha_consulta'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        return datos
+
+    def extraer_seccion(self, seccion, numero_ruc, razon_social):
+        """
+        Consulta una sección adicional de la ficha RUC
+
+        Args:
+            seccion: Clave de SECCIONES (ej: 'representantes_legales')
+            numero_ruc: Número de RUC
+            razon_social: Razón social de la empresa
+
+        Returns:
+            Datos de la sección (mismo formato que SUNATScraper.extraer_*) o None
+        """
+        accion, parser = self.SECCIONES[seccion]
+        html = self._post(self._formulario_seccion(accion, numero_ruc, razon_social))
+        return parser(html)
+
+    def extraer_cantidad_trabajadores(self, numero_ruc, razon_social):
+        return self.extraer_seccion('cantidad_trabajadores', numero_ruc, razon_social)
+
+    def extraer_representantes_legales(self, numero_ruc, razon_social):
+        return self.extraer_seccion('representantes_legales', numero_ruc, razon_social)
+
+    def extraer_informacion_historica(self, numero_ruc, razon_social):
+        return self.extraer_seccion('informacion_historica', numero_ruc, razon_social)
+
+    def extraer_deuda_coactiva(self, numero_ruc, razon_social):
+        return self.extraer_seccion('deuda_coactiva', numero_ruc, razon_social)
+
+    def extraer_reactiva_peru(self, numero_ruc, razon_social):
+        return self.extraer_seccion('reactiva_peru', numero_ruc, razon_social)
+
+    def extraer_programa_covid19(self, numero_ruc, razon_social):
+        return self.extraer_seccion('programa_covid19', numero_ruc, razon_social)
+
+    def extraer_establecimientos_anexos(self, numero_ruc, razon_social):
+        return self.extraer_seccion('establecimientos_anexos', numero_ruc, razon_social)
+
+    def consultar_ruc_completo(self, numero_ruc, incluir_trabajadores=False, incluir_representantes=False,
+                               incluir_historico=False, incluir_deuda_coactiva=False,
+                               incluir_reactiva_peru=False, incluir_programa_covid19=False,
+                               incluir_establecimientos=False):
+        """
+        Consulta los datos básicos y las secciones solicitadas de un RUC.
+        Mismo contrato que SUNATScraper.consultar_ruc_completo.
+
+        Raises:
+            ClienteHTTPError: Si alguna request a SUNAT falla y no hay respaldo
+        """
+        incluir = dict(
+            incluir_trabajadores=incluir_trabajadores,
+            incluir_representantes=incluir_representantes,
+            incluir_historico=incluir_historico,
+            incluir_deuda_coactiva=incluir_deuda_coactiva,
+            incluir_reactiva_peru=incluir_reactiva_peru,
+            incluir_programa_covid19=incluir_programa_covid19,
+            incluir_establecimientos=incluir_establecimientos
+        )
+
+        with contexto_consulta(numero_ruc):
+            try:
+                # El lugar de concurrencia se libera antes de usar el respaldo
+                # None es un RUC que SUNAT informa como inexistente: el navegador no lo encontraría
+                with limitador_sunat.consulta():
+                    return medir_consulta('http', self._consultar_ruc_completo_http, numero_ruc, **incluir)
+            except ClienteHTTPError as e:
+                if self.respaldo is None:
+                    raise
+                log.warning("%s. Usando navegador para el RUC %s...", e, numero_ruc)
+
+            return self.respaldo(numero_ruc, **incluir)
+
+    def _consultar_ruc_completo_http(self, numero_ruc, incluir_trabajadores=False, incluir_representantes=False,
+                                     incluir_historico=False, incluir_deuda_coactiva=False,
+                                     incluir_reactiva_peru=False, incluir_programa_covid19=False,
+                                     incluir_establecimientos=False):
+        resultado = self.consultar_ruc(numero_ruc)
+
+        if not resultado:
+            return None
+
+        razon_social = resultado.get('razon_social', '')
+        if not razon_social:
+            return resultado
+
+        solicitadas = [
+            ('cantidad_trabajadores', incluir_trabajadores),
+            ('representantes_legales', incluir_representantes),
+            ('informacion_historica', incluir_historico),
+            ('deuda_coactiva', incluir_deuda_coactiva),
+            ('reactiva_peru', incluir_reactiva_peru),
+            ('programa_covid19', incluir_programa_covid19),
+            ('establecimientos_anexos', incluir_establecimientos),
+        ]
+        for seccion, incluir in solicitadas:
+            if incluir:
+                datos = medir_seccion(seccion, self.extraer_seccion, seccion, numero_ruc, razon_social)
+                if datos:
+                    resultado[seccion] = datos
+
+        return resultado
+
+    def close(self):
+        """Cierra las sesiones y las conexiones abiertas"""
+        with self._lock:
+            sesiones = self._sesiones
+            self._sesiones = []
+        for sesion in sesiones:
+            sesion.close()
+        self._adapter.close()
+        self._local = threading.local()
@@ -0,0 +1,579 @@
+#!/usr/bin/env python3
+"""
+Cola persistente de RUCs para workers distribuidos
+
+Los lotes se encolan una vez y cualquier cantidad de workers (threads,
+procesos o máquinas) toma RUCs de la cola hasta vaciarla. Cada RUC tomado
+queda reservado para ese worker durante un tiempo de visibilidad: si el
+worker no confirma el resultado a tiempo (se cayó, se reinició la máquina),
+el RUC vuelve a estar disponible para otro. Un RUC que falla se reintenta
+con espera creciente y, al agotar los intentos, pasa a la cola de muertos
+con su último error, donde se puede revisar y reencolar.
+
+ColaTrabajo define la interfaz; ColaSQLite la implementa sobre un archivo
+SQLite (workers de una misma máquina, o de varias si comparten el archivo
+en un disco local, no en NFS). Para un broker externo (Redis, SQS, una base
+de datos compartida) basta con implementar ColaTrabajo y registrarlo con
+registrar_backend:
+
+    python cola.py encolar --cola cola.db --lote enero rucs.txt --representantes
+    python cli.py --cola cola.db --workers 3          # en cada worker
+    python cola.py estado --cola cola.db
+    python cola.py exportar --cola cola.db --lote enero -o enero.jsonl
+"""
+
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from bitacora import obtener_logger
+
+
+log = obtener_logger('cola')
+
+
+# Estados de una tarea
+PENDIENTE = "pendiente"
+EN_PROCESO = "en_proceso"
+COMPLETADA = "completada"
+MUERTA = "muerta"
+
+
+class Tarea:
+    """RUC tomado de la cola por un worker"""
+
+    def __init__(self, id, lote, ruc, intentos, reserva, opciones=None):
+        self.id = id
+        self.lote = lote
+        self.ruc = ruc
+        self.intentos = intentos
+        self.reserva = reserva
+        self.opciones = opciones or {}
+
+    def __repr__(self):
+        return f"Tarea({self.lote}/{self.ruc}, intento {self.intentos})"
+
+
+class ColaTrabajo(ABC):
+    """
+    Interfaz de una cola de RUCs con visibilidad, reintentos y cola de muertos.
+
+    Las operaciones sobre una tarea (confirmar, fallar, extender) solo tienen
+    efecto si la reserva del worker sigue vigente; si venció y otro worker
+    tomó el RUC, retornan False. Un backend que no implementa todas las
+    operaciones falla al crearse (TypeError), no en medio de un lote.
+    """
+
+    @abstractmethod
+    def encolar(self, rucs, lote, opciones=None):
+        """
+        Agrega RUCs a un lote (los que ya estaban en el lote se ignoran).
+
+        Args:
+            rucs: Iterable de RUCs
+            lote: Nombre del lote
+            opciones: Secciones a incluir (incluir_trabajadores, ...), comunes a todo el lote
+
+        Returns:
+            Cantidad de RUCs agregados
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def tomar(self, trabajador, lote=None):
+        """Reserva el siguiente RUC disponible (de un lote o de cualquiera). Retorna Tarea o None"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def confirmar(self, tarea, resultado):
+        """Guarda el resultado de la tarea y la marca como completada"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def fallar(self, tarea, error, resultado=None):
+        """Libera la tarea para reintentarla o, si agotó los intentos, la pasa a la cola de muertos"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def extender(self, tarea, segundos=None):
+        """Extiende la reserva de una tarea que sigue en proceso"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def reencolar_muertas(self, lote=None):
+        """Devuelve las tareas muertas a pendientes con los intentos en cero. Retorna la cantidad"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def resultados(self, lote, incluir_muertas=True):
+        """Itera los resultados guardados del lote (los de tareas muertas incluyen el último error)"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def estadisticas(self, lote=None):
+        """Tareas por estado, en total o de un lote"""
+        raise NotImplementedError
+
+    def cerrar(self):
+        pass
+
+
+class ColaSQLite(ColaTrabajo):
+    """Cola sobre un archivo SQLite; segura entre threads y procesos que abren el mismo archivo"""
+
+    def __init__(self, ruta="cola_sunat.db", visibilidad=300, max_intentos=3, espera_reintento=30):
+        """
+        Args:
+            ruta: Archivo SQLite de la cola
+            visibilidad: Segundos que un RUC tomado queda reservado para su worker
+            max_intentos: Intentos antes de pasar un RUC a la cola de muertos
+            espera_reintento: Segundos antes del primer reintento (se duplica en cada intento)
+        """
+        self.ruta = ruta
+        self.visibilidad = visibilidad
+        self.max_intentos = max_intentos
+        self.espera_reintento = espera_reintento
+
+        self._lock = threading.Lock()
+        # Transacciones explícitas (BEGIN IMMEDIATE) para que dos procesos no tomen el mismo RUC
+        self._db = sqlite3.connect(ruta, timeout=30, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS lotes (
+                lote TEXT PRIMARY KEY,
+                opciones TEXT NOT NULL,
+                creado REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS tareas (
+                id INTEGER PRIMARY KEY,
+                lote TEXT NOT NULL,
+                ruc TEXT NOT NULL,
+                estado TEXT NOT NULL,
+                intentos INTEGER NOT NULL DEFAULT 0,
+                disponible REAL NOT NULL,
+                reserva TEXT,
+                trabajador TEXT,
+                error TEXT,
+                resultado TEXT,
+                actualizada REAL NOT NULL,
+                UNIQUE (lote, ruc)
+            );
+            CREATE INDEX IF NOT EXISTS tareas_disponibles ON tareas (estado, disponible);
+            """
+        )
+
+    def _transaccion(self, fn):
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                valor = fn(self._db)
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+            return valor
+
+    def encolar(self, rucs, lote, opciones=None, tamano_bloque=1000):
+        # Solo las opciones activas: {'incluir_historico': False} equivale a no indicarla
+        opciones_json = json.dumps({k: v for k, v in (opciones or {}).items() if v}, sort_keys=True)
+        ahora = time.time()
+
+        def registrar_lote(db):
+            fila = db.execute("SELECT opciones FROM lotes WHERE lote = ?", (lote,)).fetchone()
+            if fila is None:
+                db.execute("INSERT INTO lotes (lote, opciones, creado) VALUES (?, ?, ?)",
+                           (lote, opciones_json, ahora))
+            elif fila[0] != opciones_json:
+                raise ValueError(f"El lote {lote} ya existe con otras opciones: {fila[0]}")
+
+        self._transaccion(registrar_lote)
+
+        agregados = 0
+
+        def insertar(bloque):
+            def fn(db):
+                antes = db.total_changes
+                db.executemany(
+                    "INSERT OR IGNORE INTO tareas (lote, ruc, estado, disponible, actualizada) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    [(lote, ruc, PENDIENTE, ahora, ahora) for ruc in bloque]
+                )
+                return db.total_changes - antes
+            return self._transaccion(fn)
+
+        # Por bloques: la memoria no depende del tamaño del lote y los workers no esperan a todo el encolado
+        bloque = []
+        for ruc in rucs:
+            bloque.append(ruc)
+            if len(bloque) >= tamano_bloque:
+                agregados += insertar(bloque)
+                bloque = []
+        if bloque:
+            agregados += insertar(bloque)
+        return agregados
+
+    def tomar(self, trabajador, lote=None):
+        def fn(db):
+            while True:
+                ahora = time.time()
+                # Pendientes listas para (re)intentarse y reservas vencidas de workers caídos
+                consulta = (
+                    "SELECT t.id, t.lote, t.ruc, t.estado, t.intentos, l.opciones FROM tareas t "
+                    "JOIN lotes l ON l.lote = t.lote "
+                    "WHERE t.estado IN (?, ?) AND t.disponible <= ?"
+                )
+                parametros = [PENDIENTE, EN_PROCESO, ahora]
+                if lote is not None:
+                    consulta += " AND t.lote = ?"
+                    parametros.append(lote)
+                fila = db.execute(consulta + " ORDER BY t.disponible, t.id LIMIT 1", parametros).fetchone()
+                if fila is None:
+                    return None
+
+                id_tarea, lote_tarea, ruc, estado, intentos, opciones = fila
+                if estado == EN_PROCESO and intentos >= self.max_intentos:
+                    db.execute(
+                        "UPDATE tareas SET estado = ?, reserva = NULL, error = ?, actualizada = ? WHERE id = ?",
+                        (MUERTA, f"Reserva vencida sin respuesta del worker en {intentos} intento(s)",
+                         ahora, id_tarea)
+                    )
+                    log.warning("RUC %s (lote %s) pasa a la cola de muertos: reserva vencida", ruc, lote_tarea)
+                    continue
+                if estado == EN_PROCESO:
+                    log.warning("Reserva vencida del RUC %s (lote %s), se reintenta", ruc, lote_tarea)
+
+                reserva = uuid.uuid4().hex
+                db.execute(
+                    "UPDATE tareas SET estado = ?, intentos = intentos + 1, disponible = ?, reserva = ?, "
+                    "trabajador = ?, actualizada = ? WHERE id = ?",
+                    (EN_PROCESO, ahora + self.visibilidad, reserva, trabajador, ahora, id_tarea)
+                )
+                return Tarea(id_tarea, lote_tarea, ruc, intentos + 1, reserva, json.loads(opciones))
+
+        return self._transaccion(fn)
+
+    def _actualizar_reservada(self, tarea, campos, valores):
+        def fn(db):
+            cursor = db.execute(
+                f"UPDATE tareas SET {campos}, actualizada = ? WHERE id = ? AND reserva = ?",
+                (*valores, time.time(), tarea.id, tarea.reserva)
+            )
+            return cursor.rowcount == 1
+        vigente = self._transaccion(fn)
+        if not vigente:
+            log.warning("La reserva del RUC %s (lote %s) ya no es de este worker", tarea.ruc, tarea.lote)
+        return vigente
+
+    def confirmar(self, tarea, resultado):
+        return self._actualizar_reservada(
+            tarea,
+            "estado = ?, reserva = NULL, error = NULL, resultado = ?",
+            (COMPLETADA, json.dumps(resultado, ensure_ascii=False))
+        )
+
+    def fallar(self, tarea, error, resultado=None):
+        resultado_json = json.dumps(resultado, ensure_ascii=False) if resultado is not None else None
+        if tarea.intentos >= self.max_intentos:
+            log.warning("RUC %s (lote %s) pasa a la cola de muertos tras %s intento(s): %s",
+                        tarea.ruc, tarea.lote, tarea.intentos, error)
+            return self._actualizar_reservada(
+                tarea,
+                "estado = ?, reserva = NULL, error = ?, resultado = ?",
+                (MUERTA, error, resultado_json)
+            )
+
+        espera = self.espera_reintento * 2 ** (tarea.intentos - 1)
+        return self._actualizar_reservada(
+            tarea,
+            "estado = ?, reserva = NULL, error = ?, resultado = ?, disponible = ?",
+            (PENDIENTE, error, resultado_json, time.time() + espera)
+        )
+
+    def extender(self, tarea, segundos=None):
+        return self._actualizar_reservada(
+            tarea, "disponible = ?", (time.time() + (segundos or self.visibilidad),)
+        )
+
+    def reencolar_muertas(self, lote=None):
+        def fn(db):
+            consulta = ("UPDATE tareas SET estado = ?, intentos = 0, disponible = ?, actualizada = ? "
+                        "WHERE estado = ?")
+            parametros = [PENDIENTE, time.time(), time.time(), MUERTA]
+            if lote is not None:
+                consulta += " AND lote = ?"
+                parametros.append(lote)
+            return db.execute(consulta, parametros).rowcount
+        return self._transaccion(fn)
+
+    def resultados(self, lote, incluir_muertas=True, tamano_pagina=1000):
+        estados = (COMPLETADA, MUERTA) if incluir_muertas else (COMPLETADA,)
+        ultimo = 0
+        while True:
+            with self._lock:
+                filas = self._db.execute(
+                    f"SELECT id, ruc, estado, error, resultado, intentos FROM tareas "
+                    f"WHERE lote = ? AND id > ? AND estado IN ({','.join('?' * len(estados))}) "
+                    f"ORDER BY id LIMIT ?",
+                    (lote, ultimo, *estados, tamano_pagina)
+                ).fetchall()
+            if not filas:
+                return
+            for ultimo, ruc, estado, error, resultado, intentos in filas:
+                if resultado is not None:
+                    valor = json.loads(resultado)
+                else:
+                    valor = {'ruc': ruc, 'success': False, 'error': error}
+                if estado == MUERTA:
+                    valor['error'] = error
+                    valor['intentos'] = intentos
+                yield valor
+
+    def estadisticas(self, lote=None):
+        consulta = "SELECT estado, COUNT(*) FROM tareas"
+        parametros = []
+        if lote is not None:
+            consulta += " WHERE lote = ?"
+            parametros.append(lote)
+        with self._lock:
+            filas = self._db.execute(consulta + " GROUP BY estado", parametros).fetchall()
+        conteo = {estado: 0 for estado in (PENDIENTE, EN_PROCESO, COMPLETADA, MUERTA)}
+        conteo.update(dict(filas))
+        conteo['total'] = sum(conteo.values())
+        return conteo
+
+    def lotes(self):
+        with self._lock:
+            return [fila[0] for fila in self._db.execute("SELECT lote FROM lotes ORDER BY creado")]
+
+    def cerrar(self):
+        with self._lock:
+            self._db.close()
+
+
+BACKENDS = {
+    'sqlite': ColaSQLite,
+}
+
+
+def registrar_backend(esquema, clase):
+    """Registra una implementación de ColaTrabajo para URLs esquema://..."""
+    BACKENDS[esquema] = clase
+
+
+def abrir_cola(url, **opciones):
+    """
+    Abre una cola a partir de una URL o ruta.
+
+    "cola.db" y "sqlite:///ruta/cola.db" abren una ColaSQLite; otros esquemas
+    usan el backend registrado con registrar_backend, que recibe la URL completa.
+    Las opciones no indicadas se toman de COLA_VISIBILIDAD, COLA_MAX_INTENTOS y
+    COLA_ESPERA_REINTENTO.
+    """
+    entorno = {
+        'visibilidad': ("COLA_VISIBILIDAD", float),
+        'max_intentos': ("COLA_MAX_INTENTOS", int),
+        'espera_reintento': ("COLA_ESPERA_REINTENTO", float),
+    }
+    for opcion, (variable, tipo) in entorno.items():
+        if opcion not in opciones and os.getenv(variable):
+            opciones[opcion] = tipo(os.getenv(variable))
+
+    esquema, separador, resto = url.partition('://')
+    if not separador:
+        return ColaSQLite(url, **opciones)
+    if esquema not in BACKENDS:
+        raise ValueError(f"Backend de cola desconocido: {esquema} (disponibles: {', '.join(BACKENDS)})")
+    if esquema == 'sqlite':
+        return ColaSQLite(resto[1:] if resto.startswith('/') else resto, **opciones)
+    return BACKENDS[esquema](url, **opciones)
+
+
+def nombre_trabajador():
+    return f"{socket.gethostname()}:{os.getpid()}:{threading.current_thread().name}"
+
+
+def trabajar(cola, consultar, lote=None, workers=1, detener=None, esperar_vacia=5, salir_si_vacia=True):
+    """
+    Toma RUCs de la cola y los procesa hasta que se vacía (o hasta `detener`).
+
+    Args:
+        cola: ColaTrabajo
+        consultar: Callable(ruc, **opciones) -> resultado en formato de lote (dict con 'success').
+            Se llama desde varios threads a la vez si workers > 1
+        lote: Procesar solo este lote (default: cualquiera)
+        workers: Threads que toman RUCs a la vez
+        detener: threading.Event para terminar después de la tarea en curso
+        esperar_vacia: Segundos entre consultas a la cola cuando no hay RUCs disponibles
+        salir_si_vacia: Si True, termina cuando no quedan RUCs pendientes ni en proceso
+
+    Returns:
+        Dict con exitosos, fallidos y perdidos (resultados descartados porque la
+        reserva venció) procesados por este proceso
+    """
+    detener = detener or threading.Event()
+    conteo = {'exitosos': 0, 'fallidos': 0, 'perdidos': 0}
+    lock_conteo = threading.Lock()
+
+    # Tareas en curso: sus reservas se extienden mientras el proceso siga vivo, así
+    # la visibilidad solo vence si el worker se cae, no si una consulta tarda
+    en_curso = {}
+    terminado = threading.Event()
+    visibilidad = getattr(cola, 'visibilidad', 300)
+
+    def extender_reservas():
+        while not terminado.wait(visibilidad / 3):
+            with lock_conteo:
+                tareas = list(en_curso.values())
+            for tarea in tareas:
+                try:
+                    cola.extender(tarea)
+                except Exception as e:
+                    log.warning("No se pudo extender la reserva del RUC %s: %s", tarea.ruc, e)
+
+    def bucle():
+        trabajador = nombre_trabajador()
+        while not detener.is_set():
+            tarea = cola.tomar(trabajador, lote)
+            if tarea is None:
+                estado = cola.estadisticas(lote)
+                if salir_si_vacia and not estado[PENDIENTE] and not estado[EN_PROCESO]:
+                    return
+                # Quedan reintentos con espera o reservas de otros workers que pueden vencer
+                detener.wait(esperar_vacia)
+                continue
+
+            with lock_conteo:
+                en_curso[tarea.id] = tarea
+            try:
+                resultado = consultar(tarea.ruc, **tarea.opciones)
+            except Exception as e:
+                log.warning("Error al procesar RUC %s: %s", tarea.ruc, e)
+                cola.fallar(tarea, str(e))
+                with lock_conteo:
+                    conteo['fallidos'] += 1
+                continue
+            finally:
+                with lock_conteo:
+                    en_curso.pop(tarea.id, None)
+
+            if resultado.get('success'):
+                if cola.confirmar(tarea, resultado):
+                    with lock_conteo:
+                        conteo['exitosos'] += 1
+                else:
+                    # La reserva venció y el RUC lo tiene otro worker: su resultado es el que cuenta
+                    log.warning("Reserva del RUC %s perdida, el resultado se descarta", tarea.ruc)
+                    with lock_conteo:
+                        conteo['perdidos'] += 1
+            else:
+                cola.fallar(tarea, resultado.get('error') or 'Error desconocido', resultado)
+                with lock_conteo:
+                    conteo['fallidos'] += 1
+
+    threads = [threading.Thread(target=bucle, name=f"cola-{i + 1}") for i in range(max(1, workers))]
+    for thread in threads:
+        thread.start()
+    threading.Thread(target=extender_reservas, name="cola-reservas", daemon=True).start()
+    try:
+        for thread in threads:
+            while thread.is_alive():
+                thread.join(timeout=1)
+    except KeyboardInterrupt:
+        # Las tareas en curso terminan y se confirman antes de salir
+        detener.set()
+        for thread in threads:
+            thread.join()
+        raise
+    finally:
+        terminado.set()
+    return conteo
+
+
+if __name__ == "__main__":
+    import argparse
+    from lotes import leer_rucs
+
+    parser_args = argparse.ArgumentParser(description='Cola persistente de RUCs para workers distribuidos')
+    subcomandos = parser_args.add_subparsers(dest='comando', required=True)
+
+    def agregar_cola(subparser):
+        subparser.add_argument('--cola', default=os.getenv("COLA_SUNAT", "cola_sunat.db"),
+                               help='Ruta o URL de la cola (default: COLA_SUNAT o cola_sunat.db)')
+
+    p_encolar = subcomandos.add_parser('encolar', help='Agrega los RUCs de un archivo a un lote')
+    agregar_cola(p_encolar)
+    p_encolar.add_argument('archivo', help='Archivo con RUCs (uno por línea)')
+    p_encolar.add_argument('--lote', required=True)
+    for flag, ayuda in (
+        ('--trabajadores', 'cantidad de trabajadores'),
+        ('--representantes', 'representantes legales'),
+        ('--historico', 'información histórica'),
+        ('--deuda-coactiva', 'deuda coactiva'),
+        ('--reactiva-peru', 'Reactiva Perú'),
+        ('--programa-covid19', 'Programa COVID-19'),
+        ('--establecimientos-anexos', 'establecimientos anexos'),
+    ):
+        p_encolar.add_argument(flag, action='store_true', help=f'Incluir {ayuda}')
+
+    p_estado = subcomandos.add_parser('estado', help='Tareas por estado de cada lote')
+    agregar_cola(p_estado)
+    p_estado.add_argument('--lote')
+
+    p_exportar = subcomandos.add_parser('exportar', help='Escribe los resultados de un lote en JSONL')
+    agregar_cola(p_exportar)
+    p_exportar.add_argument('--lote', required=True)
+    p_exportar.add_argument('--salida', '-o', required=True)
+    p_exportar.add_argument('--sin-muertas', action='store_true', help='Omitir los RUCs de la cola de muertos')
+
+    p_reencolar = subcomandos.add_parser('reencolar-muertas', help='Devuelve a la cola los RUCs muertos')
+    agregar_cola(p_reencolar)
+    p_reencolar.add_argument('--lote')
+
+    args = parser_args.parse_args()
+    cola = abrir_cola(args.cola)
+
+    if args.comando == 'encolar':
+        opciones = {
+            'incluir_trabajadores': args.trabajadores,
+            'incluir_representantes': args.representantes,
+            'incluir_historico': args.historico,
+            'incluir_deuda_coactiva': args.deuda_coactiva,
+            'incluir_reactiva_peru': args.reactiva_peru,
+            'incluir_programa_covid19': args.programa_covid19,
+            'incluir_establecimientos': args.establecimientos_anexos,
+        }
+        invalidos = []
+
+        def validos():
+            for ruc, _ in leer_rucs(args.archivo):
+                if ruc.isdigit() and len(ruc) == 11:
+                    yield ruc
+                elif len(invalidos) < 10:
+                    invalidos.append(ruc)
+
+        agregados = cola.encolar(validos(), args.lote, opciones)
+        print(f"✓ {agregados} RUCs agregados al lote {args.lote}")
+        if invalidos:
+            print(f"⚠ RUCs inválidos ignorados (primeros): {', '.join(invalidos)}")
+
+    elif args.comando == 'estado':
+        for nombre in ([args.lote] if args.lote else cola.lotes()):
+            print(f"{nombre}: {json.dumps(cola.estadisticas(nombre), ensure_ascii=False)}")
+
+    elif args.comando == 'exportar':
+        cantidad = 0
+        with open(args.salida, 'w', encoding='utf-8') as f:
+            for resultado in cola.resultados(args.lote, incluir_muertas=not args.sin_muertas):
+                f.write(json.dumps(resultado, ensure_ascii=False) + "\n")
+                cantidad += 1
+        print(f"✓ {cantidad} resultados del lote {args.lote} en {args.salida}")
+
+    elif args.comando == 'reencolar-muertas':
+        print(f"✓ {cola.reencolar_muertas(args.lote)} RUCs devueltos a la cola")
+
+    cola.cerrar()
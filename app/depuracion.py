@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Artefactos de depuración (capturas de pantalla y HTML) del navegador
+
+Desactivados por defecto. Con DEPURACION=fallo se capturan solo cuando una
+consulta o sección falla; con DEPURACION=siempre, después de cada sección.
+Un request puede activarlos para sí mismo con depuracion_activa().
+
+En el thread de la consulta solo se piden la captura (en base64) y el HTML
+al navegador; la decodificación, la escritura en disco y la limpieza por
+tamaño y antigüedad las hace un thread en segundo plano. Si la cola del
+escritor está llena, la captura se descarta en lugar de esperar.
+"""
+
+import base64
+import os
+import queue
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from bitacora import obtener_logger
+
+
+log = obtener_logger('depuracion')
+
+
+MODOS = ("no", "fallo", "siempre")
+
+_local = threading.local()
+
+
+class ArtefactosDepuracion:
+    """Captura artefactos del navegador y los escribe en disco en segundo plano"""
+
+    def __init__(self, modo="no", directorio=None, max_mb=200, max_archivos=500,
+                 retencion_horas=24, capacidad_cola=16):
+        """
+        Args:
+            modo: "no", "fallo" o "siempre" (modo por defecto de las consultas)
+            directorio: Dónde se guardan los artefactos (default: <tmp>/sunat_depuracion)
+            max_mb: Tamaño máximo total del directorio
+            max_archivos: Número máximo de archivos en el directorio
+            retencion_horas: Antigüedad máxima de un artefacto
+            capacidad_cola: Capturas pendientes de escribir antes de empezar a descartar
+        """
+        if modo not in MODOS:
+            raise ValueError(f"Modo de depuración inválido: {modo} (opciones: {', '.join(MODOS)})")
+
+        self.modo = modo
+        self.directorio = directorio or os.path.join(tempfile.gettempdir(), "sunat_depuracion")
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.max_archivos = max_archivos
+        self.retencion = retencion_horas * 3600
+
+        self._cola = queue.Queue(maxsize=capacidad_cola)
+        self._thread = None
+        self._lock = threading.Lock()
+        self.capturas = 0
+        self.descartadas = 0
+        self.eliminados = 0
+
+    @classmethod
+    def desde_entorno(cls):
+        """Configuración desde variables de entorno (DEPURACION, DEPURACION_*)"""
+        return cls(
+            modo=os.getenv("DEPURACION", "no").lower() or "no",
+            directorio=os.getenv("DEPURACION_DIRECTORIO") or None,
+            max_mb=float(os.getenv("DEPURACION_MAX_MB", "200")),
+            max_archivos=int(os.getenv("DEPURACION_MAX_ARCHIVOS", "500")),
+            retencion_horas=float(os.getenv("DEPURACION_RETENCION_HORAS", "24"))
+        )
+
+    def modo_actual(self):
+        """Modo del request en curso en este thread o, si no hay, el modo por defecto"""
+        return getattr(_local, 'modo', None) or self.modo
+
+    def capturar(self, driver, etiqueta, numero_ruc, fallo=False, modo=None):
+        """
+        Encola la captura de pantalla y el HTML de la pestaña actual del driver.
+
+        Args:
+            driver: WebDriver de Selenium
+            etiqueta: Sección o etapa (ej: 'representantes_legales', 'busqueda')
+            numero_ruc: RUC consultado
+            fallo: True si la captura se debe a un error (se guarda también en modo "fallo")
+            modo: Modo a usar en lugar del de este thread (ej: el del request que encoló la consulta)
+
+        Returns:
+            True si la captura quedó encolada
+        """
+        modo = modo or self.modo_actual()
+        if modo == "no" or (modo == "fallo" and not fallo):
+            return False
+
+        try:
+            # El PNG llega en base64; se decodifica en el escritor
+            captura = driver.get_screenshot_as_base64()
+            html = driver.page_source
+        except Exception as e:
+            log.warning("No se pudo capturar la página para depuración: %s", e)
+            return False
+
+        ahora = time.time()
+        marca = f"{time.strftime('%Y%m%d_%H%M%S', time.localtime(ahora))}_{int(ahora * 1000) % 1000:03d}"
+        nombre = f"{marca}_{numero_ruc}_{etiqueta}{'_fallo' if fallo else ''}"
+        try:
+            self._cola.put_nowait((nombre, captura, html))
+        except queue.Full:
+            with self._lock:
+                self.descartadas += 1
+            return False
+
+        self._asegurar_escritor()
+        return True
+
+    def _asegurar_escritor(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._escribir, name="depuracion", daemon=True)
+                self._thread.start()
+
+    def _escribir(self):
+        while True:
+            tarea = self._cola.get()
+            if tarea is None:
+                return
+            nombre, captura, html = tarea
+            try:
+                os.makedirs(self.directorio, exist_ok=True)
+                with open(os.path.join(self.directorio, f"{nombre}.png"), 'wb') as f:
+                    f.write(base64.b64decode(captura))
+                with open(os.path.join(self.directorio, f"{nombre}.html"), 'w', encoding='utf-8') as f:
+                    f.write(html)
+                with self._lock:
+                    self.capturas += 1
+                log.info("Artefactos de depuración guardados: %s.*", os.path.join(self.directorio, nombre))
+                self._limpiar()
+            except Exception as e:
+                log.warning("Error al guardar artefactos de depuración: %s", e)
+
+    def _limpiar(self):
+        """Elimina artefactos vencidos y, después, los más antiguos hasta respetar los límites"""
+        archivos = []
+        for entrada in os.scandir(self.directorio):
+            if entrada.is_file():
+                estado = entrada.stat()
+                archivos.append((estado.st_mtime, estado.st_size, entrada.path))
+        archivos.sort()
+
+        limite = time.time() - self.retencion
+        total = sum(tamano for _, tamano, _ in archivos)
+        restantes = len(archivos)
+        eliminados = 0
+        for modificado, tamano, ruta in archivos:
+            if modificado >= limite and total <= self.max_bytes and restantes <= self.max_archivos:
+                break
+            try:
+                os.remove(ruta)
+            except OSError:
+                continue
+            total -= tamano
+            restantes -= 1
+            eliminados += 1
+
+        if eliminados:
+            with self._lock:
+                self.eliminados += eliminados
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                'modo': self.modo,
+                'directorio': self.directorio,
+                'pendientes': self._cola.qsize(),
+                'capturas': self.capturas,
+                'descartadas': self.descartadas,
+                'eliminados': self.eliminados,
+            }
+
+    def cerrar(self, timeout=5):
+        """Escribe las capturas pendientes y detiene el escritor"""
+        with self._lock:
+            thread = self._thread
+        if thread is None or not thread.is_alive():
+            return
+        try:
+            self._cola.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        thread.join(timeout=timeout)
+
+
+@contextmanager
+def depuracion_activa(modo):
+    """Usa este modo de depuración para las consultas del thread actual"""
+    if modo not in MODOS:
+        raise ValueError(f"Modo de depuración inválido: {modo} (opciones: {', '.join(MODOS)})")
+    anterior = getattr(_local, 'modo', None)
+    _local.modo = modo
+    try:
+        yield
+    finally:
+        _local.modo = anterior
+
+
+def con_depuracion(modo, fn, *args, **kwargs):
+    """Ejecuta fn con el modo de depuración indicado en este thread"""
+    with depuracion_activa(modo):
+        return fn(*args, **kwargs)
+
+
+# Instancia compartida por todos los scrapers del proceso
+artefactos = ArtefactosDepuracion.desde_entorno()
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+Pool de WebDrivers reutilizables para el scraper de SUNAT
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from scraper import SUNATScraper
+from metricas import tramo
+from bitacora import obtener_logger
+from planificador import Admision, prioridad_actual
+
+
+log = obtener_logger('driver_pool')
+
+
+class DriverPoolAgotadoError(Exception):
+    """Se lanza cuando no hay un driver disponible dentro del tiempo de espera"""
+
+
+class DriverPool:
+    """
+    Pool acotado de instancias de SUNATScraper con el navegador ya iniciado.
+
+    Los scrapers se prestan con adquirir() y se devuelven con liberar().
+    Un scraper se recicla (se cierra y se reemplaza) cuando alcanza
+    max_usos consultas o cuando su driver deja de responder.
+
+    Los préstamos respetan la clase de prioridad del thread (ver
+    planificador.py): una consulta interactiva recibe el próximo driver
+    libre antes que un lote, y tiene drivers reservados.
+    """
+
+    def __init__(self, min_size=1, max_size=3, max_usos=50, timeout_adquirir=60,
+                 fabrica=None, reservas=None):
+        """
+        Args:
+            min_size: Número de drivers que se mantienen iniciados en todo momento
+            max_size: Número máximo de drivers simultáneos
+            max_usos: Consultas que atiende un driver antes de reciclarlo
+            timeout_adquirir: Segundos máximos de espera por un driver libre
+            fabrica: Callable que retorna un SUNATScraper con el driver iniciado
+            reservas: Drivers reservados por clase de prioridad (default: PRIORIDAD_RESERVA_*)
+        """
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError("Se requiere 0 <= min_size <= max_size y max_size >= 1")
+
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_usos = max_usos
+        self.timeout_adquirir = timeout_adquirir
+        self.fabrica = fabrica or self._crear_scraper
+
+        self._libres = []
+        self._usos = {}
+        # id(scraper) -> clase de prioridad del préstamo
+        self._prestados = {}
+        self._admision = Admision(reservas)
+        self._total = 0
+        self._cerrado = False
+        self._condicion = threading.Condition()
+
+    @staticmethod
+    def _crear_scraper():
+        scraper = SUNATScraper()
+        scraper.setup_driver()
+        return scraper
+
+    @staticmethod
+    def _destruir(scraper):
+        try:
+            if scraper.driver:
+                scraper.driver.quit()
+        except Exception:
+            pass
+
+    def iniciar(self):
+        """Inicia los drivers mínimos del pool"""
+        with self._condicion:
+            faltantes = self.min_size - self._total
+            self._total += max(0, faltantes)
+
+        for _ in range(max(0, faltantes)):
+            try:
+                scraper = self.fabrica()
+            except Exception as e:
+                log.warning("No se pudo iniciar un driver del pool: %s", e)
+                with self._condicion:
+                    self._total -= 1
+                continue
+
+            with self._condicion:
+                self._usos[id(scraper)] = 0
+                self._libres.append(scraper)
+                self._condicion.notify_all()
+
+        log.info("Pool de drivers iniciado (%s/%s)", len(self._libres), self.max_size)
+
+    def adquirir(self, timeout=None):
+        """
+        Presta un scraper del pool, iniciando uno nuevo si hay capacidad.
+
+        Args:
+            timeout: Segundos máximos de espera (default: timeout_adquirir)
+
+        Returns:
+            SUNATScraper con el driver listo para usar
+        """
+        timeout = self.timeout_adquirir if timeout is None else timeout
+        limite = time.monotonic() + timeout
+        clase = prioridad_actual()
+
+        with self._condicion:
+            if self._cerrado:
+                raise DriverPoolAgotadoError("El pool de drivers está cerrado")
+            # Primero un lugar para la clase; los drivers en uso nunca superan max_size
+            if not self._admision.esperar(self._condicion, clase, lambda: self.max_size, timeout):
+                raise DriverPoolAgotadoError(
+                    f"No hay drivers disponibles después de {timeout} segundos"
+                )
+
+        try:
+            scraper = self._prestar(limite, timeout)
+        except BaseException:
+            with self._condicion:
+                self._admision.salir(clase)
+                self._condicion.notify_all()
+            raise
+        with self._condicion:
+            self._prestados[id(scraper)] = clase
+        return scraper
+
+    def _prestar(self, limite, timeout):
+        while True:
+            crear = False
+            with self._condicion:
+                while True:
+                    if self._cerrado:
+                        raise DriverPoolAgotadoError("El pool de drivers está cerrado")
+                    if self._libres:
+                        scraper = self._libres.pop()
+                        break
+                    if self._total < self.max_size:
+                        self._total += 1
+                        crear = True
+                        break
+                    restante = limite - time.monotonic()
+                    if restante <= 0:
+                        raise DriverPoolAgotadoError(
+                            f"No hay drivers disponibles después de {timeout} segundos"
+                        )
+                    self._condicion.wait(restante)
+
+            if crear:
+                try:
+                    scraper = self.fabrica()
+                except Exception:
+                    with self._condicion:
+                        self._total -= 1
+                        self._condicion.notify_all()
+                    raise
+                with self._condicion:
+                    self._usos[id(scraper)] = 0
+                return scraper
+
+            if scraper.driver_activo():
+                return scraper
+
+            # Driver caído mientras estaba libre: descartarlo y volver a intentar
+            self._retirar(scraper)
+
+    def liberar(self, scraper, descartar=False):
+        """
+        Devuelve un scraper al pool.
+
+        Args:
+            scraper: Scraper obtenido con adquirir()
+            descartar: Si True, el driver se cierra en lugar de reutilizarse
+        """
+        with self._condicion:
+            clase = self._prestados.pop(id(scraper), None)
+            if clase is not None:
+                self._admision.salir(clase)
+                self._condicion.notify_all()
+            usos = self._usos.get(id(scraper), 0) + 1
+            self._usos[id(scraper)] = usos
+            reciclar = descartar or self._cerrado or usos >= self.max_usos
+
+            if not reciclar:
+                self._libres.append(scraper)
+                self._condicion.notify_all()
+                return
+
+        self._retirar(scraper)
+        if not self._cerrado:
+            self._reponer()
+
+    def _retirar(self, scraper):
+        with self._condicion:
+            self._usos.pop(id(scraper), None)
+            self._total -= 1
+            self._condicion.notify_all()
+        self._destruir(scraper)
+
+    def _reponer(self):
+        """Mantiene al menos min_size drivers iniciados"""
+        with self._condicion:
+            if self._total >= self.min_size:
+                return
+        self.iniciar()
+
+    @contextmanager
+    def scraper(self, timeout=None):
+        """
+        Context manager que presta un scraper y lo devuelve al salir.
+        Si ocurre una excepción el driver se descarta.
+        """
+        with tramo('driver_adquirir'):
+            scraper = self.adquirir(timeout)
+        descartar = False
+        try:
+            yield scraper
+        except BaseException:
+            descartar = True
+            raise
+        finally:
+            self.liberar(scraper, descartar=descartar)
+
+    def estadisticas(self):
+        """Retorna el estado actual del pool"""
+        with self._condicion:
+            return {
+                'total': self._total,
+                'libres': len(self._libres),
+                'en_uso': self._total - len(self._libres),
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+                'max_usos': self.max_usos,
+                'por_clase': self._admision.estadisticas()
+            }
+
+    def cerrar(self):
+        """Cierra todos los drivers libres; los prestados se cierran al liberarse"""
+        with self._condicion:
+            self._cerrado = True
+            libres = self._libres
+            self._libres = []
+            for scraper in libres:
+                self._usos.pop(id(scraper), None)
+            self._total -= len(libres)
+            self._condicion.notify_all()
+
+        for scraper in libres:
+            self._destruir(scraper)
+        log.info("Pool de drivers cerrado")
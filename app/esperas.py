@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Esperas basadas en condiciones para el scraper de SUNAT
+
+Reemplaza las pausas fijas (time.sleep) por esperas sobre condiciones
+concretas: navegación a una nueva página, document.readyState, presencia
+del elemento buscado y cantidad de filas estable.
+"""
+
+import os
+import time
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.common.exceptions import TimeoutException, WebDriverException
+from limitador import limitador_sunat
+from bitacora import obtener_logger
+
+
+log = obtener_logger('esperas')
+
+
+class Esperas:
+    """Configuración y condiciones de espera por sección"""
+
+    # Timeout (segundos) para que cada página termine de cargar
+    TIMEOUTS = {
+        'busqueda': 10,
+        'cantidad_trabajadores': 10,
+        'representantes_legales': 10,
+        'informacion_historica': 15,
+        'deuda_coactiva': 10,
+        'reactiva_peru': 10,
+        'programa_covid19': 10,
+        'establecimientos_anexos': 10,
+    }
+
+    def __init__(self, timeouts=None, intervalo=0.1, timeout_contenido=2,
+                 ciclos_estables=2, pausa_minima=0.0):
+        """
+        Args:
+            timeouts: Diccionario sección -> timeout que sobrescribe TIMEOUTS
+            intervalo: Segundos entre cada verificación de una condición
+            timeout_contenido: Segundos máximos esperando el elemento de datos
+                               una vez cargada la página (puede no existir)
+            ciclos_estables: Verificaciones consecutivas con igual cantidad de filas
+            pausa_minima: Pausa de cortesía opcional después de cada página (0 = sin pausa)
+        """
+        self.timeouts = dict(self.TIMEOUTS, **(timeouts or {}))
+        self.intervalo = intervalo
+        self.timeout_contenido = timeout_contenido
+        self.ciclos_estables = ciclos_estables
+        self.pausa_minima = pausa_minima
+
+    @classmethod
+    def desde_entorno(cls):
+        """Crea la configuración a partir de variables de entorno"""
+        return cls(
+            intervalo=float(os.getenv("ESPERA_INTERVALO", "0.1")),
+            timeout_contenido=float(os.getenv("ESPERA_TIMEOUT_CONTENIDO", "2")),
+            pausa_minima=float(os.getenv("ESPERA_PAUSA_MINIMA", "0"))
+        )
+
+    def timeout(self, seccion):
+        return self.timeouts.get(seccion, 10)
+
+    def _wait(self, driver, timeout):
+        return WebDriverWait(driver, timeout, poll_frequency=self.intervalo)
+
+    def espera_contenido(self, driver):
+        """WebDriverWait para elementos de una página que ya terminó de cargar"""
+        return self._wait(driver, self.timeout_contenido)
+
+    @staticmethod
+    def marcar_pagina(driver):
+        """
+        Registra la página actual para detectar luego la navegación.
+
+        Returns:
+            Tupla (elemento html, url) de la página actual
+        """
+        try:
+            return driver.find_element(By.TAG_NAME, "html"), driver.current_url
+        except WebDriverException:
+            return None, None
+
+    def navegacion(self, driver, pagina_anterior, timeout):
+        """Espera a que el documento anterior sea reemplazado o cambie la URL"""
+        html_anterior, url_anterior = pagina_anterior
+
+        def navego(d):
+            if url_anterior is not None and d.current_url != url_anterior:
+                return True
+            if html_anterior is None:
+                return True
+            return EC.staleness_of(html_anterior)(d)
+
+        self._wait(driver, timeout).until(navego)
+
+    def documento_listo(self, driver, timeout):
+        """Espera a que document.readyState sea 'complete'"""
+        self._wait(driver, timeout).until(
+            lambda d: d.execute_script("return document.readyState") == "complete"
+        )
+
+    def elemento_presente(self, driver, localizador, timeout):
+        """Espera a que el elemento exista en el DOM y lo retorna"""
+        return self._wait(driver, timeout).until(EC.presence_of_element_located(localizador))
+
+    def filas_estables(self, driver, localizador_filas, timeout):
+        """Espera a que la cantidad de filas no cambie durante ciclos_estables verificaciones"""
+        estado = {'anterior': -1, 'estables': 0}
+
+        def estable(d):
+            cantidad = len(d.find_elements(*localizador_filas))
+            if cantidad == estado['anterior']:
+                estado['estables'] += 1
+            else:
+                estado['anterior'] = cantidad
+                estado['estables'] = 0
+            return estado['estables'] >= self.ciclos_estables
+
+        self._wait(driver, timeout).until(estable)
+
+    def pausa_cortesia(self):
+        """Pausa opcional para no saturar a SUNAT (desactivada por defecto)"""
+        if self.pausa_minima > 0:
+            time.sleep(self.pausa_minima)
+
+    def esperar_seccion(self, driver, seccion, pagina_anterior=None, localizador=None):
+        """
+        Espera a que la página de una sección esté lista para extraer datos.
+
+        Args:
+            driver: WebDriver activo
+            seccion: Clave de TIMEOUTS (ej: 'representantes_legales')
+            pagina_anterior: Resultado de marcar_pagina() antes de la navegación
+            localizador: Tupla (By, valor) del contenedor de datos esperado
+
+        Returns:
+            True si la página quedó lista, False si alguna condición agotó su tiempo
+        """
+        timeout = self.timeout(seccion)
+        lista = True
+
+        try:
+            if pagina_anterior is not None:
+                self.navegacion(driver, pagina_anterior, timeout)
+            self.documento_listo(driver, timeout)
+        except TimeoutException:
+            log.warning("Timeout esperando la carga de la página (%s)", seccion)
+            limitador_sunat.congestion(f"timeout cargando {seccion}")
+            lista = False
+
+        if localizador is not None:
+            try:
+                self.elemento_presente(driver, localizador, self.timeout_contenido)
+                by, valor = localizador
+                if by == By.XPATH:
+                    self.filas_estables(driver, (By.XPATH, f"({valor})//tr"), self.timeout_contenido)
+                elif by == By.CSS_SELECTOR:
+                    self.filas_estables(driver, (By.CSS_SELECTOR, f"{valor} tr"), self.timeout_contenido)
+            except TimeoutException:
+                lista = False
+
+        self.pausa_cortesia()
+        return lista
@@ -0,0 +1,43 @@
+<!DOCTYPE html>
+<html lang="es">
+<head>
+<meta charset="utf-8">
+<title>SUNAT - Consulta RUC</title>
+</head>
+<body>
+<div class="container">
+  <div class="panel panel-primary">
+    <div class="panel-heading">Consulta RUC</div>
+    <div class="panel-body">
+      <form id="frmBusqueda" name="frmBusqueda" method="post" action="jcrS00Alias">
+        <input type="hidden" name="accion" value="consPorRuc">
+        <input type="hidden" name="razSoc" value="">
+        <input type="hidden" name="nroRuc" value="">
+        <input type="hidden" name="nrodoc" value="">
+        <input type="hidden" name="contexto" value="ti-it">
+        <input type="hidden" name="modo" value="1">
+        <input type="hidden" name="rbtnTipo" value="1">
+        <input type="hidden" name="tipdoc" value="1">
+        <input type="hidden" name="search2" value="">
+        <input type="hidden" name="search3" value="">
+        <input type="hidden" name="codigo" value="">
+        <input type="hidden" name="token" value="">
+        <div class="form-group">
+          <label for="txtRuc">Por RUC</label>
+          <input type="text" class="form-control" id="txtRuc" name="search1" maxlength="11">
+        </div>
+        <button type="button" class="btn btn-primary" id="btnAceptar" onclick="buscar()">Buscar</button>
+      </form>
+    </div>
+  </div>
+</div>
+<script>
+function buscar() {
+    var form = document.frmBusqueda;
+    form.nroRuc.value = document.getElementById('txtRuc').value;
+    form.token.value = Math.random().toString(36).substring(2) + Math.random().toString(36).substring(2);
+    form.submit();
+}
+</script>
+</body>
+</html>
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Trabajos de consulta en lote ejecutados en segundo plano
+"""
+
+import threading
+import time
+import uuid
+from datetime import datetime
+
+
+class Trabajo:
+    """Estado y resultados parciales de un lote de RUCs"""
+
+    PENDIENTE = "pendiente"
+    EN_PROCESO = "en_proceso"
+    COMPLETADO = "completado"
+    FALLIDO = "fallido"
+
+    def __init__(self, rucs, shard=None, descartados_shard=0):
+        self.id = uuid.uuid4().hex
+        self.rucs = rucs
+        self.shard = shard
+        self.descartados_shard = descartados_shard
+        self.estado = self.PENDIENTE
+        self.error = None
+        self.resultados = []
+        self.exitosos = 0
+        self.fallidos = 0
+        self.creado = datetime.now()
+        self.finalizado = None
+        self._lock = threading.Lock()
+
+    def registrar(self, resultado):
+        with self._lock:
+            self.resultados.append(resultado)
+            if resultado.get('success', False):
+                self.exitosos += 1
+            else:
+                self.fallidos += 1
+
+    def finalizar(self, estado, error=None):
+        with self._lock:
+            self.estado = estado
+            self.error = error
+            self.finalizado = datetime.now()
+
+    def progreso(self):
+        """Resumen del avance del trabajo"""
+        with self._lock:
+            procesados = len(self.resultados)
+            return {
+                'job_id': self.id,
+                'estado': self.estado,
+                'total': len(self.rucs),
+                'procesados': procesados,
+                'pendientes': len(self.rucs) - procesados,
+                'exitosos': self.exitosos,
+                'fallidos': self.fallidos,
+                'creado': self.creado.strftime("%Y-%m-%d %H:%M:%S"),
+                'finalizado': self.finalizado.strftime("%Y-%m-%d %H:%M:%S") if self.finalizado else None,
+                'error': self.error,
+                'shard': self.shard,
+                'descartados_shard': self.descartados_shard
+            }
+
+    def pagina(self, offset=0, limit=100):
+        """Resultados disponibles en el rango [offset, offset + limit)"""
+        with self._lock:
+            return {
+                'job_id': self.id,
+                'estado': self.estado,
+                'total_resultados': len(self.resultados),
+                'offset': offset,
+                'limit': limit,
+                'resultados': self.resultados[offset:offset + limit]
+            }
+
+
+class GestorTrabajos:
+    """
+    Crea y ejecuta trabajos en segundo plano.
+
+    Cada trabajo tiene un thread coordinador que envía los RUCs al executor
+    indicado, con un máximo de max_workers consultas en vuelo por trabajo.
+    """
+
+    def __init__(self, executor, retencion=24 * 3600):
+        """
+        Args:
+            executor: Executor donde se ejecuta cada consulta
+            retencion: Segundos que se conserva un trabajo terminado
+        """
+        self.executor = executor
+        self.retencion = retencion
+        self._trabajos = {}
+        self._lock = threading.Lock()
+
+    def crear(self, rucs, procesar, max_workers=3, shard=None, descartados_shard=0):
+        """
+        Crea un trabajo y lo inicia en segundo plano.
+
+        Args:
+            rucs: Lista de RUCs a consultar
+            procesar: Callable(ruc) que retorna el resultado en formato de lote
+            max_workers: Consultas simultáneas de este trabajo
+            shard: Shard "i/N" del que se tomaron los RUCs (informativo)
+            descartados_shard: RUCs de la solicitud que corresponden a otros shards
+
+        Returns:
+            Trabajo creado
+        """
+        self._limpiar()
+
+        trabajo = Trabajo(list(rucs), shard=shard, descartados_shard=descartados_shard)
+        with self._lock:
+            self._trabajos[trabajo.id] = trabajo
+
+        threading.Thread(
+            target=self._ejecutar,
+            args=(trabajo, procesar, max_workers),
+            name=f"trabajo-{trabajo.id[:8]}",
+            daemon=True
+        ).start()
+        return trabajo
+
+    def obtener(self, job_id):
+        with self._lock:
+            return self._trabajos.get(job_id)
+
+    def _ejecutar(self, trabajo, procesar, max_workers):
+        en_vuelo = threading.BoundedSemaphore(max_workers)
+        trabajo.estado = Trabajo.EN_PROCESO
+
+        def terminado(future, ruc):
+            try:
+                if future.cancelled():
+                    raise RuntimeError('Consulta cancelada')
+                trabajo.registrar(future.result())
+            except Exception as e:
+                trabajo.registrar({
+                    'ruc': ruc,
+                    'success': False,
+                    'error': str(e),
+                    'fecha_consulta': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                })
+            finally:
+                en_vuelo.release()
+
+        try:
+            for ruc in trabajo.rucs:
+                en_vuelo.acquire()
+                future = self.executor.submit(procesar, ruc)
+                future.add_done_callback(lambda f, ruc=ruc: terminado(f, ruc))
+
+            # Esperar a que terminen las consultas en vuelo
+            for _ in range(max_workers):
+                en_vuelo.acquire()
+
+            trabajo.finalizar(Trabajo.COMPLETADO)
+        except Exception as e:
+            trabajo.finalizar(Trabajo.FALLIDO, str(e))
+
+    def _limpiar(self):
+        """Elimina los trabajos terminados hace más de `retencion` segundos"""
+        limite = time.time() - self.retencion
+        with self._lock:
+            vencidos = [
+                job_id for job_id, trabajo in self._trabajos.items()
+                if trabajo.finalizado and trabajo.finalizado.timestamp() < limite
+            ]
+            for job_id in vencidos:
+                del self._trabajos[job_id]
@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""
+Limitador global de solicitudes a SUNAT
+
+Todos los motores (Selenium, HTTP, pestañas) comparten una única instancia
+por proceso, de modo que varias consultas o lotes simultáneos no multiplican
+la carga sobre SUNAT:
+
+- TokenBucket: tasa máxima de solicitudes (cargas de página / POST) por segundo.
+- ConcurrenciaAIMD: cantidad de consultas de RUC en curso. Sube de a una
+  mientras la latencia y los errores se mantienen sanos y se reduce a la
+  mitad ante timeouts, alertas o páginas de bloqueo.
+
+Ambos respetan la clase de prioridad del thread (ver planificador.py): las
+consultas interactivas pasan antes que las de lote y tienen lugares de
+concurrencia reservados.
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+from bitacora import obtener_logger
+from planificador import Admision, CLASES, prioridad_actual
+
+
+log = obtener_logger('limitador')
+
+
+class LimitadorAgotadoError(Exception):
+    """Se lanza cuando no se obtiene turno dentro del tiempo de espera"""
+
+
+class TokenBucket:
+    """Token bucket thread-safe: `tasa` tokens por segundo con ráfagas de hasta `rafaga`"""
+
+    def __init__(self, tasa=4.0, rafaga=8):
+        self.tasa = tasa
+        self.rafaga = rafaga
+        self._tokens = float(rafaga)
+        self._ultimo = time.monotonic()
+        self._lock = threading.Lock()
+        # Threads de cada clase esperando un token; las de menor prioridad ceden el paso
+        self._esperando = {clase: 0 for clase in CLASES}
+
+    def _recargar(self):
+        ahora = time.monotonic()
+        self._tokens = min(self.rafaga, self._tokens + (ahora - self._ultimo) * self.tasa)
+        self._ultimo = ahora
+
+    def _cede_paso(self, clase):
+        return any(self._esperando[superior] for superior in CLASES[:CLASES.index(clase)])
+
+    def adquirir(self, timeout=None, clase=None):
+        """
+        Espera hasta obtener un token.
+
+        Args:
+            timeout: Segundos máximos de espera
+            clase: Clase de prioridad (default: la del thread). No se entrega un
+                token a una clase mientras una de mayor prioridad está esperando
+
+        Raises:
+            LimitadorAgotadoError: Si no se obtiene dentro de timeout segundos
+        """
+        if self.tasa <= 0:
+            return
+        clase = clase or prioridad_actual()
+        limite = None if timeout is None else time.monotonic() + timeout
+
+        with self._lock:
+            self._esperando[clase] += 1
+        try:
+            while True:
+                with self._lock:
+                    self._recargar()
+                    if self._tokens >= 1 and not self._cede_paso(clase):
+                        self._tokens -= 1
+                        return
+                    # Si solo cede el paso, vuelve a intentar en cuanto se genere el próximo token
+                    espera = max(1 - self._tokens, 0.1) / self.tasa
+
+                if limite is not None and time.monotonic() + espera > limite:
+                    raise LimitadorAgotadoError("Límite de solicitudes a SUNAT alcanzado")
+                time.sleep(espera)
+        finally:
+            with self._lock:
+                self._esperando[clase] -= 1
+
+    def intentar(self, clase=None):
+        """
+        Toma un token si hay uno disponible, sin esperar.
+
+        Returns:
+            True si se obtuvo el token
+        """
+        if self.tasa <= 0:
+            return True
+        clase = clase or prioridad_actual()
+        with self._lock:
+            self._recargar()
+            if self._tokens >= 1 and not self._cede_paso(clase):
+                self._tokens -= 1
+                return True
+            return False
+
+
+class ConcurrenciaAIMD:
+    """
+    Límite de concurrencia adaptativo (additive increase, multiplicative decrease).
+
+    Cada consulta exitosa con latencia menor a latencia_objetivo suma
+    1/limite (≈ +1 por cada `limite` consultas); una congestión multiplica el
+    límite por `factor`. Después de un recorte no se vuelve a recortar ni a
+    subir durante `enfriamiento` segundos, para no reaccionar varias veces al
+    mismo episodio.
+
+    Los lugares se reparten entre clases de prioridad con una Admision. La
+    reserva de una clase nunca ocupa el último lugar del límite: con el
+    límite en 1 (el mínimo tras un recorte) no hay reserva y las consultas
+    interactivas solo tienen preferencia sobre las de lote.
+    """
+
+    def __init__(self, minimo=1, maximo=8, inicial=2, latencia_objetivo=8.0,
+                 factor=0.5, enfriamiento=5.0, reservas=None):
+        self.minimo = minimo
+        self.maximo = maximo
+        self.latencia_objetivo = latencia_objetivo
+        self.factor = factor
+        self.enfriamiento = enfriamiento
+
+        self.limite = float(min(max(inicial, minimo), maximo))
+        self.en_curso = 0
+        self.recortes = 0
+        self._ultimo_recorte = 0.0
+        self._condicion = threading.Condition()
+        self.admision = Admision(reservas)
+
+    def entrar(self, timeout=None, clase=None):
+        """Ocupa un lugar para la clase indicada (default: la del thread)"""
+        clase = clase or prioridad_actual()
+        with self._condicion:
+            if not self.admision.esperar(self._condicion, clase, lambda: int(self.limite), timeout):
+                raise LimitadorAgotadoError("Demasiadas consultas simultáneas a SUNAT")
+            self.en_curso += 1
+        return clase
+
+    def salir(self, latencia, congestion=False, clase=None):
+        with self._condicion:
+            self.en_curso -= 1
+            self.admision.salir(clase or prioridad_actual())
+            if congestion:
+                self._recortar()
+            elif latencia <= self.latencia_objetivo and not self._enfriando():
+                self.limite = min(self.maximo, self.limite + 1.0 / self.limite)
+            self._condicion.notify_all()
+
+    def congestion(self):
+        with self._condicion:
+            self._recortar()
+
+    def reservar(self, reservas):
+        """Cambia los lugares reservados por clase (dict clase -> lugares)"""
+        with self._condicion:
+            self.admision.reservas = dict(reservas)
+            self._condicion.notify_all()
+
+    def estadisticas_clases(self):
+        with self._condicion:
+            return self.admision.estadisticas()
+
+    def _enfriando(self):
+        return time.monotonic() - self._ultimo_recorte < self.enfriamiento
+
+    def _recortar(self):
+        if self._enfriando():
+            return
+        self.limite = max(self.minimo, self.limite * self.factor)
+        self._ultimo_recorte = time.monotonic()
+        self.recortes += 1
+
+
+class LimitadorSUNAT:
+    """Token bucket + concurrencia AIMD compartidos por todos los motores"""
+
+    def __init__(self, tasa=4.0, rafaga=8, concurrencia_min=1, concurrencia_max=8,
+                 concurrencia_inicial=2, latencia_objetivo=8.0, timeout=120, reservas=None):
+        """
+        Args:
+            tasa: Solicitudes por segundo a SUNAT (0 = sin límite)
+            rafaga: Solicitudes que pueden enviarse seguidas tras un período inactivo
+            concurrencia_min: Consultas simultáneas mínimas
+            concurrencia_max: Consultas simultáneas máximas
+            concurrencia_inicial: Consultas simultáneas al iniciar
+            latencia_objetivo: Segundos por consulta considerados sanos
+            timeout: Segundos máximos esperando turno
+            reservas: Lugares de concurrencia reservados por clase de prioridad
+                (default: PRIORIDAD_RESERVA_*)
+        """
+        self.bucket = TokenBucket(tasa, rafaga)
+        self.concurrencia = ConcurrenciaAIMD(
+            minimo=concurrencia_min,
+            maximo=concurrencia_max,
+            inicial=concurrencia_inicial,
+            latencia_objetivo=latencia_objetivo,
+            reservas=reservas
+        )
+        self.timeout = timeout
+        self._local = threading.local()
+
+    @classmethod
+    def desde_entorno(cls, reservas=None):
+        """
+        Crea el limitador a partir de variables de entorno
+
+        Args:
+            reservas: Lugares reservados por clase (default: PRIORIDAD_RESERVA_*)
+        """
+        return cls(
+            tasa=float(os.getenv("SUNAT_TASA", "4")),
+            rafaga=int(os.getenv("SUNAT_RAFAGA", "8")),
+            concurrencia_min=int(os.getenv("SUNAT_CONCURRENCIA_MIN", "1")),
+            concurrencia_max=int(os.getenv("SUNAT_CONCURRENCIA_MAX", "8")),
+            concurrencia_inicial=int(os.getenv("SUNAT_CONCURRENCIA_INICIAL", "2")),
+            latencia_objetivo=float(os.getenv("SUNAT_LATENCIA_OBJETIVO", "8")),
+            reservas=reservas
+        )
+
+    def esperar_turno(self):
+        """Espera un token antes de enviar una solicitud (carga de página o POST) a SUNAT"""
+        self.bucket.adquirir(self.timeout)
+
+    def reservar(self, reservas):
+        """Cambia los lugares de concurrencia reservados por clase de prioridad"""
+        self.concurrencia.reservar(reservas)
+
+    def intentar_turno(self):
+        """Toma un token si hay uno disponible, sin esperar (para despachadores que atienden varias consultas)"""
+        return self.bucket.intentar()
+
+    @contextmanager
+    def consulta(self):
+        """
+        Ocupa un lugar de concurrencia durante la consulta de un RUC.
+
+        Una excepción dentro del bloque cuenta como congestión. Las llamadas
+        anidadas en el mismo thread (ej: un motor que usa otro como respaldo)
+        no ocupan un segundo lugar.
+        """
+        if getattr(self._local, 'dentro', False):
+            yield
+            return
+
+        clase = self.concurrencia.entrar(self.timeout)
+        self._local.dentro = True
+        self._local.congestion = False
+        inicio = time.monotonic()
+        try:
+            yield
+        except Exception:
+            self._local.congestion = True
+            raise
+        finally:
+            self._local.dentro = False
+            self.concurrencia.salir(time.monotonic() - inicio, self._local.congestion, clase)
+
+    def congestion(self, motivo=""):
+        """Registra un timeout, alerta o página de bloqueo de SUNAT"""
+        if getattr(self._local, 'dentro', False):
+            self._local.congestion = True
+        else:
+            self.concurrencia.congestion()
+        if motivo:
+            log.warning("Congestión en SUNAT: %s (concurrencia: %s)", motivo, int(self.concurrencia.limite))
+
+    def estadisticas(self):
+        return {
+            'tasa': self.bucket.tasa,
+            'concurrencia_limite': round(self.concurrencia.limite, 2),
+            'en_curso': self.concurrencia.en_curso,
+            'recortes': self.concurrencia.recortes,
+            'por_clase': self.concurrencia.estadisticas_clases(),
+        }
+
+
+# Instancia compartida por todo el proceso
+limitador_sunat = LimitadorSUNAT.desde_entorno()
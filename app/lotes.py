@@ -0,0 +1,433 @@
+#!/usr/bin/env python3
+"""
+Lotes reanudables de RUCs desde archivo, con salida JSONL y checkpoint
+
+El archivo de entrada se lee línea por línea (sin cargarlo completo) y cada
+resultado se agrega como una línea JSON a la salida apenas termina. Cada
+cierto número de RUCs se guarda un checkpoint con la posición en la entrada
+hasta la que todo está procesado y el tamaño de la salida en ese momento.
+
+Si la ejecución se interrumpe, volver a ejecutarla con los mismos archivos
+continúa desde el checkpoint: la salida se recorta al tamaño guardado (así
+no quedan resultados repetidos ni líneas a medio escribir) y se sigue desde
+esa posición de la entrada. La memoria usada no depende del tamaño del lote.
+
+Con varios workers, los resultados se escriben en el orden de la entrada
+(a lo sumo unos pocos RUCs por worker esperan en memoria a los anteriores),
+de modo que el checkpoint sigue siendo una posición única en la entrada.
+Con varias particiones, cada proceso procesa solo los RUCs de la suya
+(ver particion_de) y escribe su propia salida, que al final se combinan.
+
+Un shard ("i/N") reparte un portafolio entre N máquinas con el mismo hash
+estable, sin coordinación entre ellas. Las salidas de los shards se unen
+con combinar_resultados en un solo archivo ordenado por RUC y sin repetidos:
+
+    python lotes.py combinar --salida todo.jsonl nodo1.jsonl nodo2.jsonl nodo3.jsonl
+"""
+
+import heapq
+import itertools
+import json
+import os
+import tempfile
+import time
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+
+class CheckpointInvalidoError(Exception):
+    """El checkpoint existente no corresponde a los archivos de esta ejecución"""
+
+
+def particion_de(ruc, total, dentro_de=1):
+    """
+    Partición (0 a total-1) de un RUC; estable entre procesos, máquinas y versiones de Python.
+
+    Args:
+        ruc: Número de RUC
+        total: Cantidad de particiones
+        dentro_de: Cantidad de particiones del nivel superior (ej: shards), para
+            que las particiones de un shard se repartan sus RUCs de forma pareja
+    """
+    return (zlib.crc32(ruc.encode('utf-8')) // dentro_de) % total
+
+
+def parsear_shard(texto):
+    """
+    Convierte "i/N" (i de 1 a N) en la tupla (i - 1, N).
+
+    Raises:
+        ValueError: Si el texto no tiene el formato i/N o i está fuera de rango
+    """
+    try:
+        indice, total = (int(valor) for valor in texto.split('/'))
+    except ValueError:
+        raise ValueError(f"Shard inválido: {texto!r} (formato: i/N, ej: 1/4)")
+    if total < 1 or not 1 <= indice <= total:
+        raise ValueError(f"Shard inválido: {texto!r} (i debe estar entre 1 y N)")
+    return indice - 1, total
+
+
+def en_shard(ruc, shard):
+    """True si el RUC corresponde al shard (indice, total); sin shard, todos corresponden"""
+    return shard is None or particion_de(ruc, shard[1]) == shard[0]
+
+
+def leer_rucs(ruta, desde=0, particion=None, shard=None):
+    """
+    Lee los RUCs de un archivo (uno por línea) a partir de un byte.
+
+    Args:
+        ruta: Archivo de entrada
+        desde: Posición en bytes desde donde leer (inicio de una línea)
+        particion: Tupla (indice, total) para leer solo los RUCs de esa partición
+        shard: Tupla (indice, total) del shard; la partición se aplica dentro del shard
+
+    Yields:
+        Tuplas (ruc, posición del byte siguiente a la línea)
+    """
+    with open(ruta, 'rb') as f:
+        f.seek(desde)
+        posicion = desde
+        for linea in f:
+            posicion += len(linea)
+            ruc = linea.decode('utf-8', errors='replace').strip()
+            if not ruc:
+                continue
+            if not en_shard(ruc, shard):
+                continue
+            if particion and particion_de(ruc, particion[1], shard[1] if shard else 1) != particion[0]:
+                continue
+            yield ruc, posicion
+
+
+def nombre_parte(salida, indice, total):
+    """Archivo de salida de una partición (ej: resultados.jsonl.parte-1-de-4)"""
+    return f"{salida}.parte-{indice + 1}-de-{total}"
+
+
+def _escribir_bloque(registros, directorio):
+    registros.sort(key=lambda r: r[0])
+    fd, ruta = tempfile.mkstemp(prefix='bloque_', dir=directorio)
+    with os.fdopen(fd, 'wb') as f:
+        for ruc, preferencia, linea in registros:
+            # json.dumps escapa tabs y saltos de línea: el tab separa sin ambigüedad
+            f.write(b'%s\t%s\t%s' % (ruc, preferencia, linea))
+    return ruta
+
+
+def _leer_bloque(ruta):
+    with open(ruta, 'rb', buffering=1 << 20) as f:
+        for linea in f:
+            ruc, preferencia, resultado = linea.split(b'\t', 2)
+            yield ruc, preferencia, resultado
+
+
+def combinar_resultados(entradas, salida, lineas_por_bloque=500_000):
+    """
+    Une salidas JSONL (ej: una por shard) en un archivo ordenado por RUC y sin repetidos.
+
+    Las entradas se ordenan por bloques (memoria acotada por lineas_por_bloque)
+    y los bloques se combinan con un merge de k vías. Si un RUC aparece más de
+    una vez se conserva un resultado exitoso antes que uno fallido y, entre
+    ellos, el de fecha_consulta más reciente. La salida se escribe en un
+    archivo temporal y se reemplaza de forma atómica.
+
+    Args:
+        entradas: Rutas de los archivos JSONL a unir
+        salida: Archivo JSONL resultante
+        lineas_por_bloque: Líneas que se ordenan en memoria a la vez
+
+    Returns:
+        Dict con rucs (escritos), repetidos (descartados) e invalidas (líneas sin RUC o JSON inválido)
+    """
+    directorio = os.path.dirname(os.path.abspath(salida))
+    invalidas = 0
+
+    with tempfile.TemporaryDirectory(prefix='combinar_', dir=directorio) as temporal:
+        # 1. Ordenar por bloques
+        bloques = []
+        lote = []
+        for entrada in entradas:
+            with open(entrada, 'rb', buffering=1 << 20) as f:
+                for linea in f:
+                    try:
+                        resultado = json.loads(linea)
+                        ruc = str(resultado['ruc']).encode('utf-8')
+                    except (ValueError, KeyError, TypeError):
+                        invalidas += 1
+                        continue
+                    if not linea.endswith(b'\n'):
+                        linea += b'\n'
+                    preferencia = b'%d%s' % (
+                        1 if resultado.get('success') else 0,
+                        str(resultado.get('fecha_consulta') or '').encode('utf-8')
+                    )
+                    lote.append((ruc, preferencia, linea))
+                    if len(lote) >= lineas_por_bloque:
+                        bloques.append(_escribir_bloque(lote, temporal))
+                        lote = []
+        if lote or not bloques:
+            bloques.append(_escribir_bloque(lote, temporal))
+
+        # 2. Combinar los bloques conservando el mejor resultado de cada RUC
+        rucs = 0
+        repetidos = 0
+        fd, ruta_final = tempfile.mkstemp(prefix='combinado_', dir=directorio)
+        try:
+            with os.fdopen(fd, 'wb', buffering=1 << 20) as f:
+                ordenados = heapq.merge(*(_leer_bloque(b) for b in bloques), key=lambda r: r[0])
+                for _, grupo in itertools.groupby(ordenados, key=lambda r: r[0]):
+                    candidatos = list(grupo)
+                    f.write(max(candidatos, key=lambda r: r[1])[2])
+                    rucs += 1
+                    repetidos += len(candidatos) - 1
+            os.replace(ruta_final, salida)
+        except BaseException:
+            os.remove(ruta_final)
+            raise
+
+    return {'rucs': rucs, 'repetidos': repetidos, 'invalidas': invalidas}
+
+
+class Checkpoint:
+    """Estado de avance de un lote, guardado de forma atómica en un archivo JSON"""
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+
+    def cargar(self):
+        """Retorna el estado guardado o None si no hay checkpoint"""
+        if not os.path.exists(self.ruta):
+            return None
+        with open(self.ruta, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def guardar(self, estado):
+        temporal = f"{self.ruta}.tmp"
+        with open(temporal, 'w', encoding='utf-8') as f:
+            json.dump(estado, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporal, self.ruta)
+
+    def eliminar(self):
+        if os.path.exists(self.ruta):
+            os.remove(self.ruta)
+
+
+class EjecucionLote:
+    """
+    Ejecuta un lote de RUCs desde archivo escribiendo los resultados en JSONL.
+
+    Los resultados tienen el formato de los lotes (success/error, ver
+    SUNATScraper._worker_procesar_ruc). El checkpoint se guarda cada
+    `cada` RUCs y al terminar o interrumpirse. Al completar el archivo, el
+    checkpoint queda marcado como completo y volver a ejecutar el lote no
+    repite consultas.
+    """
+
+    def __init__(self, archivo, salida, checkpoint=None, cada=50, reiniciar=False,
+                 workers=1, particion=None, shard=None):
+        """
+        Args:
+            archivo: Archivo de entrada con un RUC por línea
+            salida: Archivo JSONL de resultados (se agregan líneas)
+            checkpoint: Archivo de checkpoint (default: <salida>.checkpoint)
+            cada: RUCs procesados entre checkpoints
+            reiniciar: Si True, descarta el checkpoint y la salida anteriores
+            workers: RUCs consultados en paralelo (threads)
+            particion: Tupla (indice, total) para procesar solo esa partición de la entrada
+            shard: Tupla (indice, total) para procesar solo los RUCs de ese shard
+        """
+        self.archivo = os.path.abspath(archivo)
+        self.salida = os.path.abspath(salida)
+        self.checkpoint = Checkpoint(checkpoint or f"{salida}.checkpoint")
+        self.cada = max(1, cada)
+        self.reiniciar = reiniciar
+        self.workers = max(1, workers)
+        self.particion = tuple(particion) if particion else None
+        self.shard = tuple(shard) if shard else None
+
+        self.posicion = 0
+        self.procesados = 0
+        self.exitosos = 0
+        self.fallidos = 0
+        self.completo = False
+        self._salida = None
+
+    def _estado(self):
+        return {
+            'archivo': self.archivo,
+            'salida': self.salida,
+            'posicion': self.posicion,
+            'bytes_salida': self._salida.tell() if self._salida else 0,
+            'procesados': self.procesados,
+            'exitosos': self.exitosos,
+            'fallidos': self.fallidos,
+            'particion': list(self.particion) if self.particion else None,
+            'shard': list(self.shard) if self.shard else None,
+            'completo': self.completo,
+            'actualizado': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        }
+
+    def _abrir(self):
+        """Abre la salida y restaura el avance desde el checkpoint, si existe"""
+        estado = None if self.reiniciar else self.checkpoint.cargar()
+
+        if estado is None:
+            self._salida = open(self.salida, 'wb')
+            return False
+
+        particion = tuple(estado['particion']) if estado.get('particion') else None
+        shard = tuple(estado['shard']) if estado.get('shard') else None
+        if (estado['archivo'] != self.archivo or estado['salida'] != self.salida
+                or particion != self.particion or shard != self.shard):
+            raise CheckpointInvalidoError(
+                f"El checkpoint {self.checkpoint.ruta} es de otra ejecución "
+                f"({estado['archivo']} -> {estado['salida']}). Use --reiniciar para empezar de nuevo"
+            )
+        if not os.path.exists(self.salida) or os.path.getsize(self.salida) < estado['bytes_salida']:
+            raise CheckpointInvalidoError(
+                f"La salida {self.salida} tiene menos datos que los registrados en el checkpoint"
+            )
+
+        # Lo escrito después del checkpoint se vuelve a consultar
+        self._salida = open(self.salida, 'r+b')
+        self._salida.truncate(estado['bytes_salida'])
+        self._salida.seek(estado['bytes_salida'])
+
+        self.posicion = estado['posicion']
+        self.procesados = estado['procesados']
+        self.exitosos = estado['exitosos']
+        self.fallidos = estado['fallidos']
+        self.completo = estado.get('completo', False)
+        return True
+
+    def _guardar_checkpoint(self):
+        self._salida.flush()
+        os.fsync(self._salida.fileno())
+        self.checkpoint.guardar(self._estado())
+
+    def _registrar(self, resultado, posicion):
+        linea = json.dumps(resultado, ensure_ascii=False) + "\n"
+        self._salida.write(linea.encode('utf-8'))
+        self.posicion = posicion
+        self.procesados += 1
+        if resultado.get('success'):
+            self.exitosos += 1
+        else:
+            self.fallidos += 1
+
+    def _resultados(self, consultar, pendientes):
+        """
+        Consulta los RUCs pendientes y entrega los resultados en el orden de la entrada.
+
+        Con varios workers se mantienen hasta 4 RUCs por worker en curso; un
+        RUC lento detiene la escritura de los siguientes, no su consulta.
+        """
+        if self.workers == 1:
+            for ruc, posicion in pendientes:
+                yield consultar(ruc), posicion
+            return
+
+        executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="lote")
+        en_curso = deque()
+        try:
+            for ruc, posicion in pendientes:
+                en_curso.append((executor.submit(consultar, ruc), posicion))
+                if len(en_curso) >= self.workers * 4:
+                    futuro, posicion_lista = en_curso.popleft()
+                    yield futuro.result(), posicion_lista
+            while en_curso:
+                futuro, posicion_lista = en_curso.popleft()
+                yield futuro.result(), posicion_lista
+        finally:
+            # Al interrumpirse no se espera a los RUCs encolados; se repiten al reanudar
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def ejecutar(self, consultar, al_avanzar=None):
+        """
+        Procesa los RUCs pendientes del archivo.
+
+        Args:
+            consultar: Callable(ruc) -> resultado en formato de lote (dict con 'success').
+                Con varios workers se llama desde varios threads a la vez. Si lanza
+                una excepción, el lote se detiene y se reanuda desde ese RUC.
+            al_avanzar: Callable(resumen) llamado después de cada checkpoint
+
+        Returns:
+            Resumen del lote (procesados, exitosos, fallidos, reanudado, completo)
+        """
+        reanudado = self._abrir()
+        inicio = time.time()
+        procesados_inicio = self.procesados
+
+        if self.completo:
+            self._salida.close()
+            return self.resumen(inicio, procesados_inicio, reanudado, True)
+
+        try:
+            pendientes = leer_rucs(self.archivo, self.posicion, self.particion, self.shard)
+            for resultado, posicion in self._resultados(consultar, pendientes):
+                self._registrar(resultado, posicion)
+                if (self.procesados - procesados_inicio) % self.cada == 0:
+                    self._guardar_checkpoint()
+                    if al_avanzar:
+                        al_avanzar(self.resumen(inicio, procesados_inicio, reanudado))
+            self.completo = True
+        finally:
+            # También al interrumpirse (Ctrl+C o error): lo ya escrito no se repite al reanudar
+            self._guardar_checkpoint()
+            self._salida.close()
+
+        return self.resumen(inicio, procesados_inicio, reanudado, True)
+
+    def resumen(self, inicio, procesados_inicio=0, reanudado=False, completo=False):
+        segundos = time.time() - inicio
+        nuevos = self.procesados - procesados_inicio
+        return {
+            'procesados': self.procesados,
+            'exitosos': self.exitosos,
+            'fallidos': self.fallidos,
+            'en_esta_ejecucion': nuevos,
+            'rucs_por_segundo': round(nuevos / segundos, 2) if segundos > 0 else None,
+            'reanudado': reanudado,
+            'completo': completo,
+        }
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser_args = argparse.ArgumentParser(description='Lotes reanudables de RUCs')
+    subcomandos = parser_args.add_subparsers(dest='comando', required=True)
+
+    p_combinar = subcomandos.add_parser(
+        'combinar', help='Une salidas JSONL (ej: de cada shard) ordenadas por RUC y sin repetidos'
+    )
+    p_combinar.add_argument('entradas', nargs='+', help='Archivos JSONL a unir')
+    p_combinar.add_argument('--salida', '-o', required=True, help='Archivo JSONL resultante')
+    p_combinar.add_argument('--bloque', type=int, default=500_000,
+                            help='Líneas ordenadas en memoria a la vez')
+
+    p_shard = subcomandos.add_parser('shard', help='Muestra el shard de cada RUC')
+    p_shard.add_argument('total', type=int, help='Cantidad de shards (N)')
+    p_shard.add_argument('rucs', nargs='+')
+
+    args = parser_args.parse_args()
+
+    if args.comando == 'combinar':
+        inicio = time.time()
+        resumen = combinar_resultados(args.entradas, args.salida, args.bloque)
+        print(f"✓ {resumen['rucs']} RUCs en {args.salida} ({time.time() - inicio:.1f}s)")
+        if resumen['repetidos']:
+            print(f"ℹ {resumen['repetidos']} resultado(s) repetido(s) descartado(s)")
+        if resumen['invalidas']:
+            print(f"⚠ {resumen['invalidas']} línea(s) inválida(s) ignorada(s)")
+
+    elif args.comando == 'shard':
+        for ruc in args.rucs:
+            print(f"{ruc}: {particion_de(ruc, args.total) + 1}/{args.total}")
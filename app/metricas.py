@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""
+Tiempos por etapa y métricas en formato Prometheus
+
+Cada consulta se divide en tramos (adquirir/iniciar el driver, navegación,
+búsqueda, extracción de datos básicos y cada sección). Los tramos se
+acumulan en histogramas y, si el thread tiene una traza activa, también se
+guardan en ella para devolverlos en la respuesta de la API.
+
+Las métricas se exponen en /metrics con el formato de texto de Prometheus
+(version 0.0.4), sin dependencias adicionales.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+
+
+# Límites (segundos) de los buckets de duración: desde lecturas del cache hasta timeouts
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+
+
+def _etiquetas(nombres, valores):
+    if not nombres:
+        return ""
+    pares = []
+    for nombre, valor in zip(nombres, valores):
+        valor = str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        pares.append(f'{nombre}="{valor}"')
+    return "{" + ",".join(pares) + "}"
+
+
+def _numero(valor):
+    if valor == float("inf"):
+        return "+Inf"
+    if float(valor).is_integer():
+        return str(int(valor))
+    return repr(float(valor))
+
+
+class Contador:
+    """Contador monotónico con etiquetas"""
+
+    tipo = "counter"
+
+    def __init__(self, nombre, ayuda, etiquetas=()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self._valores = {}
+        self._lock = threading.Lock()
+
+    def incrementar(self, cantidad=1, **etiquetas):
+        clave = tuple(etiquetas.get(nombre, "") for nombre in self.etiquetas)
+        with self._lock:
+            self._valores[clave] = self._valores.get(clave, 0) + cantidad
+
+    def valor(self, **etiquetas):
+        clave = tuple(etiquetas.get(nombre, "") for nombre in self.etiquetas)
+        with self._lock:
+            return self._valores.get(clave, 0)
+
+    def muestras(self):
+        with self._lock:
+            valores = sorted(self._valores.items())
+        for clave, valor in valores:
+            yield f"{self.nombre}{_etiquetas(self.etiquetas, clave)} {_numero(valor)}"
+
+
+class Histograma:
+    """Histograma acumulado (buckets, suma y cantidad) con etiquetas"""
+
+    tipo = "histogram"
+
+    def __init__(self, nombre, ayuda, etiquetas=(), buckets=BUCKETS):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observar(self, valor, **etiquetas):
+        clave = tuple(etiquetas.get(nombre, "") for nombre in self.etiquetas)
+        with self._lock:
+            serie = self._series.get(clave)
+            if serie is None:
+                serie = self._series[clave] = {'buckets': [0] * len(self.buckets), 'suma': 0.0, 'cantidad': 0}
+            for i, limite in enumerate(self.buckets):
+                if valor <= limite:
+                    serie['buckets'][i] += 1
+                    break
+            serie['suma'] += valor
+            serie['cantidad'] += 1
+
+    def muestras(self):
+        with self._lock:
+            series = sorted((clave, dict(serie, buckets=list(serie['buckets'])))
+                            for clave, serie in self._series.items())
+        for clave, serie in series:
+            acumulado = 0
+            for limite, cantidad in zip(self.buckets, serie['buckets']):
+                acumulado += cantidad
+                etiquetas = _etiquetas(self.etiquetas + ('le',), clave + (_numero(limite),))
+                yield f"{self.nombre}_bucket{etiquetas} {acumulado}"
+            etiquetas = _etiquetas(self.etiquetas, clave)
+            yield f"{self.nombre}_sum{etiquetas} {_numero(round(serie['suma'], 6))}"
+            yield f"{self.nombre}_count{etiquetas} {serie['cantidad']}"
+
+
+class Medidor:
+    """
+    Valor instantáneo leído al momento de exponer las métricas.
+
+    `leer` retorna un número, o un diccionario {tupla de etiquetas: número}
+    cuando el medidor tiene etiquetas. Con tipo="counter" expone un contador
+    que ya lleva otro componente (ej: recortes del limitador).
+    """
+
+    def __init__(self, nombre, ayuda, leer, etiquetas=(), tipo="gauge"):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self.leer = leer
+        self.tipo = tipo
+
+    def muestras(self):
+        try:
+            valores = self.leer()
+        except Exception:
+            return
+        if not self.etiquetas:
+            valores = {(): valores}
+        for clave, valor in sorted(valores.items()):
+            if valor is None:
+                continue
+            yield f"{self.nombre}{_etiquetas(self.etiquetas, clave)} {_numero(valor)}"
+
+
+class RegistroMetricas:
+    """Conjunto de métricas del proceso"""
+
+    def __init__(self):
+        self._metricas = {}
+        self._lock = threading.Lock()
+
+    def _registrar(self, metrica):
+        with self._lock:
+            self._metricas[metrica.nombre] = metrica
+        return metrica
+
+    def contador(self, nombre, ayuda, etiquetas=()):
+        return self._registrar(Contador(nombre, ayuda, etiquetas))
+
+    def histograma(self, nombre, ayuda, etiquetas=(), buckets=BUCKETS):
+        return self._registrar(Histograma(nombre, ayuda, etiquetas, buckets))
+
+    def medidor(self, nombre, ayuda, leer, etiquetas=(), tipo="gauge"):
+        """Registra (o reemplaza) un medidor calculado por `leer`"""
+        return self._registrar(Medidor(nombre, ayuda, leer, etiquetas, tipo))
+
+    def exponer(self):
+        """Texto en formato de exposición de Prometheus"""
+        with self._lock:
+            metricas = list(self._metricas.values())
+        lineas = []
+        for metrica in metricas:
+            lineas.append(f"# HELP {metrica.nombre} {metrica.ayuda}")
+            lineas.append(f"# TYPE {metrica.nombre} {metrica.tipo}")
+            lineas.extend(metrica.muestras())
+        return "\n".join(lineas) + "\n"
+
+
+# Registro compartido por todo el proceso
+registro = RegistroMetricas()
+
+duracion_etapas = registro.histograma(
+    "sunat_etapa_duracion_segundos",
+    "Duración de cada etapa de una consulta de RUC",
+    etiquetas=("etapa",)
+)
+secciones_total = registro.contador(
+    "sunat_secciones_total",
+    "Secciones extraídas por resultado (datos, vacio, error)",
+    etiquetas=("seccion", "resultado")
+)
+consultas_total = registro.contador(
+    "sunat_consultas_total",
+    "Consultas de RUC por motor y resultado (encontrado, no_encontrado, error)",
+    etiquetas=("motor", "resultado")
+)
+duracion_consultas = registro.histograma(
+    "sunat_consulta_duracion_segundos",
+    "Duración total de una consulta de RUC en SUNAT por motor",
+    etiquetas=("motor",)
+)
+cache_total = registro.contador(
+    "sunat_cache_secciones_total",
+    "Secciones resueltas por el cache (hit), consultadas (miss) o compartidas con otra consulta",
+    etiquetas=("resultado",)
+)
+
+
+_local = threading.local()
+
+
+@contextmanager
+def traza():
+    """
+    Activa la traza del thread actual y entrega la lista donde se guardan los
+    tramos ({'etapa', 'ms'}) en el orden en que terminan. Las trazas anidadas
+    comparten la lista de la traza exterior.
+    """
+    actual = getattr(_local, 'tramos', None)
+    if actual is not None:
+        yield actual
+        return
+
+    _local.tramos = []
+    try:
+        yield _local.tramos
+    finally:
+        _local.tramos = None
+
+
+def registrar_tramo(etapa, segundos, tramos=None):
+    """
+    Registra la duración de una etapa en el histograma y en la traza.
+
+    Args:
+        etapa: Nombre de la etapa (ej: 'navegacion', 'seccion.deuda_coactiva')
+        segundos: Duración medida
+        tramos: Lista de tramos destino (default: la traza del thread actual)
+    """
+    duracion_etapas.observar(segundos, etapa=etapa)
+    if tramos is None:
+        tramos = getattr(_local, 'tramos', None)
+    if tramos is not None:
+        tramos.append({'etapa': etapa, 'ms': round(segundos * 1000, 1)})
+
+
+def agregar_tramos(tramos):
+    """Copia a la traza del thread actual tramos medidos en otro thread (ya registrados)"""
+    actual = getattr(_local, 'tramos', None)
+    if actual is not None:
+        actual.extend(tramos)
+
+
+@contextmanager
+def tramo(etapa):
+    """Mide la duración del bloque como una etapa (también si termina con una excepción)"""
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        registrar_tramo(etapa, time.perf_counter() - inicio)
+
+
+def registrar_seccion(seccion, datos=None, error=False):
+    """Cuenta una sección extraída según su resultado"""
+    resultado = "error" if error else ("datos" if datos else "vacio")
+    secciones_total.incrementar(seccion=seccion, resultado=resultado)
+
+
+def registrar_cache(info):
+    """Cuenta las secciones de un campo 'cache' ({'hits', 'misses', 'compartidas'})"""
+    for clave, resultado in (('hits', 'hit'), ('misses', 'miss'), ('compartidas', 'compartida')):
+        if info.get(clave):
+            cache_total.incrementar(len(info[clave]), resultado=resultado)
+
+
+def marcar_error_seccion():
+    """
+    Indica que la sección en curso falló aunque el extractor retorne None en
+    lugar de lanzar la excepción (como los extraer_* de SUNATScraper).
+    """
+    _local.error_seccion = True
+
+
+def medir_seccion(seccion, extraer, *args):
+    """
+    Ejecuta extraer(*args) como el tramo 'seccion.<seccion>' y cuenta su resultado.
+    Cuenta un error si extraer lanza una excepción o llama a marcar_error_seccion().
+
+    Returns:
+        Lo que retorne extraer
+    """
+    _local.error_seccion = False
+    try:
+        with tramo(f"seccion.{seccion}"):
+            datos = extraer(*args)
+    except Exception:
+        registrar_seccion(seccion, error=True)
+        raise
+    finally:
+        fallida = _local.error_seccion
+        _local.error_seccion = False
+    registrar_seccion(seccion, datos, error=fallida)
+    return datos
+
+
+def medir_consulta(motor, consultar, *args, **kwargs):
+    """
+    Ejecuta una consulta de RUC, registra su duración y la cuenta según su
+    resultado (encontrado, no_encontrado o error).
+
+    Returns:
+        Lo que retorne consultar
+    """
+    inicio = time.perf_counter()
+    try:
+        resultado = consultar(*args, **kwargs)
+    except Exception:
+        consultas_total.incrementar(motor=motor, resultado="error")
+        raise
+    finally:
+        duracion_consultas.observar(time.perf_counter() - inicio, motor=motor)
+    consultas_total.incrementar(motor=motor, resultado="encontrado" if resultado else "no_encontrado")
+    return resultado
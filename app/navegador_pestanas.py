@@ -0,0 +1,538 @@
+#!/usr/bin/env python3
+"""
+Motor de consulta con pestañas multiplexadas
+
+Atiende muchas consultas simultáneas con pocos procesos de Chrome: cada
+consulta ocupa una pestaña y un thread despachador por navegador avanza
+todas las pestañas a la vez. Los envíos de formulario no bloquean, así que
+mientras SUNAT responde una página el despachador atiende las demás.
+Las consultas interactivas toman la próxima pestaña libre antes que las de lote.
+
+El despachador nunca espera al limitador: un formulario queda pendiente en
+su pestaña hasta que hay un turno, y mientras tanto las demás pestañas
+siguen avanzando. Si quien encoló la consulta deja de esperarla, su
+pestaña se libera sin enviar más solicitudes.
+"""
+
+import itertools
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from datetime import datetime
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.common.exceptions import TimeoutException, WebDriverException
+
+import parsers
+from cliente_http import SUNATClienteHTTP
+from esperas import Esperas
+from limitador import limitador_sunat
+from metricas import registrar_tramo, registrar_seccion, agregar_tramos, medir_consulta
+from depuracion import artefactos
+from scraper import SUNATScraper
+from bitacora import obtener_logger, contexto_actual, contexto_activo, contexto_consulta
+from planificador import CLASES, LOTE, prioridad_actual, prioridad_activa
+
+
+log = obtener_logger('navegador_pestanas')
+
+
+# Envía un formulario POST a jcrS00Alias en la pestaña actual
+ENVIAR_FORMULARIO = """
+var form = document.createElement('form');
+form.method = 'POST';
+form.action = '/cl-ti-itmrconsruc/jcrS00Alias';
+
+var campos = arguments[0];
+for (var key in campos) {
+    var input = document.createElement('input');
+    input.type = 'hidden';
+    input.name = key;
+    input.value = campos[key];
+    form.appendChild(input);
+}
+
+document.body.appendChild(form);
+form.submit();
+"""
+
+
+class _Consulta:
+    """Una consulta de RUC en curso: secciones pendientes y resultado parcial"""
+
+    def __init__(self, numero_ruc, secciones):
+        self.ruc = numero_ruc
+        self.secciones = list(secciones)
+        self.resultado = None
+        self.future = Future()
+        # Tramos medidos por el despachador; se copian a la traza de quien espera
+        self.tramos = []
+        self.encolada = time.perf_counter()
+        # El despachador captura artefactos con el modo de depuración de quien encoló la consulta
+        self.depuracion = artefactos.modo_actual()
+        # Los eventos del despachador se asocian al contexto (ID y buffer) de quien la encoló
+        self.contexto = contexto_actual()
+        # Los tokens del limitador que pide el despachador usan la prioridad de quien la encoló
+        self.prioridad = prioridad_actual()
+
+
+class _ColaConsultas(queue.PriorityQueue):
+    """Consultas pendientes: primero las de mayor prioridad y, dentro de cada clase, en orden de llegada"""
+
+    def _init(self, maxsize):
+        super()._init(maxsize)
+        self._secuencia = itertools.count()
+
+    def _put(self, consulta):
+        # None (señal de cierre) va después de todas las consultas, como en una cola FIFO
+        rango = len(CLASES) if consulta is None else CLASES.index(consulta.prioridad)
+        super()._put((rango, next(self._secuencia), consulta))
+
+    def _get(self):
+        return super()._get()[2]
+
+
+class _Pestana:
+    """Pestaña del navegador y el paso que está esperando"""
+
+    def __init__(self, handle):
+        self.handle = handle
+        self.consulta = None
+        self.paso = None
+        # Campos del formulario del paso que espera un turno del limitador
+        self.pendiente = None
+        self.pagina_anterior = (None, None)
+        self.limite = 0
+        self.enviado = 0.0
+
+
+class NavegadorPestanas:
+    """
+    Un proceso de Chrome con varias pestañas y su thread despachador.
+
+    Toma consultas de la cola compartida cuando tiene una pestaña libre.
+    Cada consulta avanza por pasos (datos básicos y luego cada sección);
+    un paso termina cuando la página navegó y document.readyState es
+    'complete', y su HTML se parsea con parsers.py.
+    """
+
+    def __init__(self, cola, pestanas=8, esperas=None, fabrica=None, nombre="navegador"):
+        """
+        Args:
+            cola: _ColaConsultas compartida de _Consulta pendientes
+            pestanas: Consultas simultáneas en este navegador
+            esperas: Configuración de Esperas (intervalo y timeouts por sección)
+            fabrica: Callable que retorna un SUNATScraper con el driver iniciado
+            nombre: Nombre del thread despachador
+        """
+        self.cola = cola
+        self.max_pestanas = pestanas
+        self.esperas = esperas or Esperas.desde_entorno()
+        self.fabrica = fabrica or self._crear_scraper
+        self.nombre = nombre
+
+        self.scraper = None
+        self.pestanas = []
+        self.consultas_atendidas = 0
+        self.consultas_canceladas = 0
+        self._cerrado = False
+        self._thread = None
+
+    @staticmethod
+    def _crear_scraper():
+        scraper = SUNATScraper()
+        scraper.setup_driver()
+        return scraper
+
+    @property
+    def driver(self):
+        return self.scraper.driver
+
+    def iniciar(self):
+        """Inicia Chrome, abre las pestañas en el formulario de búsqueda y arranca el despachador"""
+        self._abrir_navegador()
+        self._thread = threading.Thread(target=self._bucle, name=self.nombre, daemon=True)
+        self._thread.start()
+
+    def _abrir_navegador(self):
+        self.scraper = self.fabrica()
+        self.pestanas = []
+
+        for i in range(self.max_pestanas):
+            if i > 0:
+                # Cada pestaña necesita su propio bloqueo de recursos
+                self.scraper.abrir_pestana()
+            # Las consultas se envían desde esta página para mantener el mismo origen y cookies
+            self.driver.get(self.scraper.url)
+            self.pestanas.append(_Pestana(self.driver.current_window_handle))
+
+        log.info("%s: %s pestañas listas", self.nombre, self.max_pestanas)
+
+    def _reiniciar_navegador(self):
+        """Cierra el navegador caído, falla sus consultas en curso y abre uno nuevo"""
+        log.warning("%s: el navegador dejó de responder, reiniciando...", self.nombre)
+        for pestana in self.pestanas:
+            if pestana.consulta is not None:
+                self._fallar(pestana, WebDriverException("El navegador dejó de responder"))
+        try:
+            self.driver.quit()
+        except Exception:
+            pass
+
+        self._abrir_navegador()
+
+    def ocupadas(self):
+        return sum(1 for pestana in self.pestanas if pestana.consulta is not None)
+
+    def esperando_turno(self):
+        return sum(1 for pestana in self.pestanas if pestana.pendiente is not None)
+
+    def _tomar_consulta(self, bloquear):
+        """
+        Próxima consulta de la cola que alguien sigue esperando (o None, la señal de cierre)
+
+        Raises:
+            queue.Empty: Si no hay consultas en la cola
+        """
+        while True:
+            consulta = self.cola.get(timeout=0.5) if bloquear else self.cola.get_nowait()
+            if consulta is None or not consulta.future.cancelled():
+                return consulta
+            self.consultas_canceladas += 1
+
+    def _bucle(self):
+        while not self._cerrado:
+            try:
+                for pestana in self.pestanas:
+                    if pestana.consulta is not None and pestana.consulta.future.cancelled():
+                        self._abandonar(pestana)
+
+                libres = [p for p in self.pestanas if p.consulta is None and p.paso is None]
+                activas = len(self.pestanas) - len(libres)
+
+                # Sin trabajo en curso se bloquea en la cola en lugar de sondear
+                for i, pestana in enumerate(libres):
+                    try:
+                        consulta = self._tomar_consulta(bloquear=activas == 0 and i == 0)
+                    except queue.Empty:
+                        break
+                    if consulta is None:
+                        self._cerrado = True
+                        break
+                    with contexto_activo(consulta.contexto), prioridad_activa(consulta.prioridad):
+                        self._iniciar_consulta(pestana, consulta)
+
+                # Formularios pendientes por prioridad y antigüedad, mientras haya turnos
+                pendientes = sorted(
+                    (p for p in self.pestanas if p.pendiente is not None),
+                    key=lambda p: (CLASES.index(p.consulta.prioridad), p.enviado)
+                )
+                for pestana in pendientes:
+                    with contexto_activo(pestana.consulta.contexto), prioridad_activa(pestana.consulta.prioridad):
+                        if not self._despachar(pestana):
+                            break
+
+                for pestana in self.pestanas:
+                    if pestana.paso is not None and pestana.pendiente is None:
+                        consulta = pestana.consulta
+                        with contexto_activo(consulta.contexto if consulta else None), \
+                                prioridad_activa(consulta.prioridad if consulta else LOTE):
+                            self._avanzar(pestana)
+
+                time.sleep(self.esperas.intervalo)
+
+            except WebDriverException:
+                if self._cerrado:
+                    break
+                if not self.scraper.driver_activo():
+                    try:
+                        self._reiniciar_navegador()
+                    except Exception as e:
+                        log.warning("%s: no se pudo reiniciar el navegador: %s", self.nombre, e)
+                        time.sleep(1)
+            except Exception as e:
+                # La pestaña conserva su paso; si no avanza, vence por timeout
+                log.warning("%s: %s", self.nombre, e)
+                time.sleep(self.esperas.intervalo)
+
+    def _enviar(self, pestana, paso, campos):
+        """Prepara el formulario del paso y lo envía si hay un turno disponible"""
+        pestana.paso = paso
+        pestana.pendiente = campos
+        pestana.enviado = time.perf_counter()
+        self._despachar(pestana)
+
+    def _despachar(self, pestana):
+        """
+        Envía el formulario pendiente de la pestaña sin esperar la respuesta.
+        No espera al limitador: sin turno disponible el formulario sigue pendiente.
+
+        Returns:
+            True si se envió
+        """
+        if not limitador_sunat.intentar_turno():
+            return False
+        self.driver.switch_to.window(pestana.handle)
+        pestana.pagina_anterior = Esperas.marcar_pagina(self.driver)
+        pestana.limite = time.time() + self.esperas.timeout(pestana.paso)
+        campos, pestana.pendiente = pestana.pendiente, None
+        self.driver.execute_script(ENVIAR_FORMULARIO, campos)
+        return True
+
+    def _iniciar_consulta(self, pestana, consulta):
+        pestana.consulta = consulta
+        registrar_tramo('cola', time.perf_counter() - consulta.encolada, consulta.tramos)
+        try:
+            self._enviar(pestana, 'busqueda', {
+                'accion': 'consPorRuc',
+                'razSoc': '',
+                'nroRuc': consulta.ruc,
+                'nrodoc': '',
+                'contexto': 'ti-it',
+                'modo': '1',
+                'rbtnTipo': '1',
+                'search1': consulta.ruc,
+                'tipdoc': '1',
+                'search2': '',
+                'search3': '',
+                'codigo': '',
+                'token': SUNATClienteHTTP._token(),
+            })
+        except Exception as e:
+            self._fallar(pestana, e)
+            raise
+
+    def _pagina_lista(self, pestana):
+        html_anterior, url_anterior = pestana.pagina_anterior
+        if url_anterior is not None and self.driver.current_url != url_anterior:
+            navego = True
+        else:
+            navego = html_anterior is None or EC.staleness_of(html_anterior)(self.driver)
+        return navego and self.driver.execute_script("return document.readyState") == "complete"
+
+    def _avanzar(self, pestana):
+        """Verifica el paso actual de la pestaña y, si terminó, envía el siguiente"""
+        self.driver.switch_to.window(pestana.handle)
+
+        if not self._pagina_lista(pestana):
+            if time.time() > pestana.limite:
+                if pestana.consulta is not None:
+                    log.warning("%s: tiempo de espera agotado (%s)", self.nombre, pestana.paso)
+                    if pestana.paso in parsers.PARSERS:
+                        registrar_seccion(pestana.paso, error=True)
+                    artefactos.capturar(
+                        self.driver, pestana.paso, pestana.consulta.ruc, fallo=True,
+                        modo=pestana.consulta.depuracion
+                    )
+                    self._fallar(pestana, TimeoutException(f"Tiempo de espera agotado ({pestana.paso})"))
+                self._volver_al_formulario(pestana)
+            return
+
+        if pestana.paso == 'reinicio':
+            pestana.paso = None
+            return
+
+        consulta = pestana.consulta
+
+        try:
+            if pestana.paso == 'busqueda':
+                listo = time.perf_counter()
+                registrar_tramo('busqueda', listo - pestana.enviado, consulta.tramos)
+                datos = self.scraper._parsear_snapshot(parsers.parsear_datos_basicos)
+                registrar_tramo('extraccion_base', time.perf_counter() - listo, consulta.tramos)
+                if not datos:
+                    self._terminar(pestana, None)
+                    return
+                datos['ruc'] = consulta.ruc
+                datos['fecha_consulta'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                consulta.resultado = datos
+                if not datos.get('razon_social'):
+                    consulta.secciones = []
+            else:
+                datos = self.scraper._parsear_snapshot(parsers.PARSERS[pestana.paso])
+                registrar_tramo(f"seccion.{pestana.paso}", time.perf_counter() - pestana.enviado, consulta.tramos)
+                registrar_seccion(pestana.paso, datos)
+                artefactos.capturar(self.driver, pestana.paso, consulta.ruc, modo=consulta.depuracion)
+                if datos:
+                    consulta.resultado[pestana.paso] = datos
+        except Exception as e:
+            # Sin esto la pestaña volvería a parsear la misma página en cada ciclo
+            log.warning("%s: error al procesar %s del RUC %s: %s", self.nombre, pestana.paso, consulta.ruc, e)
+            if pestana.paso in parsers.PARSERS:
+                registrar_seccion(pestana.paso, error=True)
+            artefactos.capturar(self.driver, pestana.paso, consulta.ruc, fallo=True, modo=consulta.depuracion)
+            self._fallar(pestana, e)
+            self._volver_al_formulario(pestana)
+            return
+
+        if not consulta.secciones:
+            self._terminar(pestana, consulta.resultado)
+            return
+
+        seccion = consulta.secciones.pop(0)
+        accion, _ = SUNATScraper.ACCIONES_SECCION[seccion]
+        self._enviar(pestana, seccion, {
+            'accion': accion,
+            'contexto': 'ti-it',
+            'modo': '1',
+            'nroRuc': consulta.ruc,
+            'desRuc': consulta.resultado.get('razon_social', ''),
+        })
+
+    def _terminar(self, pestana, resultado):
+        consulta = pestana.consulta
+        pestana.consulta = None
+        pestana.paso = None
+        self.consultas_atendidas += 1
+        if not consulta.future.done():
+            consulta.future.set_result(resultado)
+
+    def _abandonar(self, pestana):
+        """Libera la pestaña de una consulta que nadie espera, sin enviar sus pasos restantes"""
+        log.info("%s: consulta del RUC %s cancelada, liberando la pestaña", self.nombre, pestana.consulta.ruc)
+        self.consultas_canceladas += 1
+        en_vuelo = pestana.paso is not None and pestana.pendiente is None
+        pestana.consulta = None
+        pestana.paso = None
+        pestana.pendiente = None
+        if en_vuelo:
+            # Detiene la carga en curso volviendo al formulario
+            self.driver.switch_to.window(pestana.handle)
+            self._volver_al_formulario(pestana)
+
+    def _fallar(self, pestana, error):
+        consulta = pestana.consulta
+        pestana.consulta = None
+        pestana.paso = None
+        pestana.pendiente = None
+        if consulta is not None and not consulta.future.done():
+            consulta.future.set_exception(error)
+
+    def _volver_al_formulario(self, pestana):
+        """Recarga el formulario de búsqueda en una pestaña que quedó en mal estado"""
+        pestana.pagina_anterior = Esperas.marcar_pagina(self.driver)
+        pestana.paso = 'reinicio'
+        pestana.limite = time.time() + self.esperas.timeout('busqueda')
+        self.driver.execute_script("window.location.href = arguments[0];", self.scraper.url)
+
+    def cerrar(self):
+        self._cerrado = True
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        for pestana in self.pestanas:
+            self._fallar(pestana, RuntimeError("Motor de pestañas cerrado"))
+        if self.scraper is not None:
+            try:
+                self.driver.quit()
+            except Exception:
+                pass
+
+
+class MotorPestanas:
+    """
+    Despachador de consultas sobre varios NavegadorPestanas.
+
+    Expone consultar_ruc_completo con el mismo contrato que SUNATScraper,
+    por lo que puede usarse desde varios threads a la vez: cada llamada
+    encola la consulta y espera su resultado.
+    """
+
+    def __init__(self, navegadores=1, pestanas=8, esperas=None, fabrica=None, timeout=120):
+        """
+        Args:
+            navegadores: Procesos de Chrome
+            pestanas: Pestañas (consultas simultáneas) por navegador
+            esperas: Configuración de Esperas
+            fabrica: Callable que retorna un SUNATScraper con el driver iniciado
+            timeout: Segundos máximos que una llamada espera su resultado
+        """
+        self.timeout = timeout
+        self._cerrado = False
+        self._cola = _ColaConsultas()
+        self._navegadores = [
+            NavegadorPestanas(self._cola, pestanas, esperas, fabrica, nombre=f"pestanas-{i}")
+            for i in range(navegadores)
+        ]
+
+    def iniciar(self):
+        for navegador in self._navegadores:
+            navegador.iniciar()
+
+    def enviar(self, numero_ruc, secciones=()):
+        """
+        Encola una consulta sin esperar su resultado.
+
+        Args:
+            numero_ruc: Número de RUC
+            secciones: Claves de SECCIONES a incluir
+
+        Returns:
+            Future con el diccionario del RUC (o None si no se encontró).
+            Cancelarlo libera la pestaña sin enviar los pasos restantes.
+        """
+        return self._encolar(numero_ruc, secciones).future
+
+    def _encolar(self, numero_ruc, secciones):
+        if self._cerrado:
+            raise RuntimeError("Motor de pestañas cerrado")
+        consulta = _Consulta(numero_ruc, secciones)
+        self._cola.put(consulta)
+        return consulta
+
+    def consultar_ruc_completo(self, numero_ruc, incluir_trabajadores=False, incluir_representantes=False,
+                               incluir_historico=False, incluir_deuda_coactiva=False,
+                               incluir_reactiva_peru=False, incluir_programa_covid19=False,
+                               incluir_establecimientos=False):
+        """Mismo contrato que SUNATScraper.consultar_ruc_completo"""
+        solicitadas = [
+            ('cantidad_trabajadores', incluir_trabajadores),
+            ('representantes_legales', incluir_representantes),
+            ('informacion_historica', incluir_historico),
+            ('deuda_coactiva', incluir_deuda_coactiva),
+            ('reactiva_peru', incluir_reactiva_peru),
+            ('programa_covid19', incluir_programa_covid19),
+            ('establecimientos_anexos', incluir_establecimientos),
+        ]
+        secciones = [seccion for seccion, incluir in solicitadas if incluir]
+
+        def esperar():
+            with contexto_consulta(numero_ruc):
+                consulta = self._encolar(numero_ruc, secciones)
+            try:
+                return consulta.future.result(timeout=self.timeout)
+            except BaseException:
+                # Nadie más espera el resultado: el despachador libera la pestaña
+                consulta.future.cancel()
+                raise
+            finally:
+                agregar_tramos(consulta.tramos)
+
+        with limitador_sunat.consulta():
+            return medir_consulta('pestanas', esperar)
+
+    def estadisticas(self):
+        return {
+            'navegadores': len(self._navegadores),
+            'pestanas': sum(len(n.pestanas) for n in self._navegadores),
+            'ocupadas': sum(n.ocupadas() for n in self._navegadores),
+            'en_cola': self._cola.qsize(),
+            'esperando_turno': sum(n.esperando_turno() for n in self._navegadores),
+            'atendidas': sum(n.consultas_atendidas for n in self._navegadores),
+            'canceladas': sum(n.consultas_canceladas for n in self._navegadores),
+        }
+
+    def cerrar(self):
+        self._cerrado = True
+        for _ in self._navegadores:
+            self._cola.put(None)
+        for navegador in self._navegadores:
+            navegador.cerrar()
+
+        # Fallar las consultas que quedaron en cola
+        while True:
+            try:
+                consulta = self._cola.get_nowait()
+            except queue.Empty:
+                break
+            if consulta is not None and not consulta.future.done():
+                consulta.future.set_exception(RuntimeError("Motor de pestañas cerrado"))
@@ -0,0 +1,430 @@
+#!/usr/bin/env python3
+"""
+Índice local del padrón reducido de SUNAT
+
+SUNAT publica el padrón reducido (padron_reducido_ruc.zip) con todos los
+RUC, su razón social, estado, condición de domicilio, ubigeo y dirección en
+un archivo de texto delimitado por '|'. Este módulo lo convierte en un
+índice ordenado por RUC en un único archivo que se lee con mmap:
+
+    cabecera | N entradas (ruc, offset) de 16 bytes | registros
+
+La búsqueda es binaria sobre las entradas (O(log n)) y solo se decodifica
+el registro encontrado, por lo que una consulta toma microsegundos sin
+cargar el archivo en memoria.
+
+Uso:
+    python padron.py construir padron_reducido_ruc.zip --destino padron.idx
+    python padron.py buscar 20100070970 --indice padron.idx
+    python padron.py sintetico padron_prueba.txt --registros 1000000
+"""
+
+import heapq
+import io
+import json
+import mmap
+import os
+import random
+import struct
+import tempfile
+import threading
+import time
+import zipfile
+from datetime import datetime
+from bitacora import obtener_logger
+
+
+log = obtener_logger('padron')
+
+
+MAGIA = b'PADRON01'
+CABECERA = struct.Struct('<8sQQd')      # magia, cantidad, inicio de registros, fecha de creación
+ENTRADA = struct.Struct('<QQ')          # ruc, offset del registro
+BLOQUE = struct.Struct('<QI')           # ruc, largo (archivos temporales del ordenamiento)
+
+# Columnas del padrón después del RUC
+COLUMNAS = [
+    'razon_social', 'estado', 'condicion', 'ubigeo', 'tipo_via', 'nombre_via',
+    'codigo_zona', 'tipo_zona', 'numero', 'interior', 'lote', 'departamento',
+    'manzana', 'kilometro',
+]
+
+
+def _firma(origen):
+    """Tamaño y fecha de modificación del archivo de origen"""
+    estado = os.stat(origen)
+    return {'origen': os.path.abspath(origen), 'tamano': estado.st_size, 'mtime': estado.st_mtime}
+
+
+def _abrir_origen(origen):
+    """Abre el padrón como binario; acepta el .txt o el .zip publicado por SUNAT"""
+    if zipfile.is_zipfile(origen):
+        archivo_zip = zipfile.ZipFile(origen)
+        nombre = next(n for n in archivo_zip.namelist() if n.lower().endswith('.txt'))
+        return archivo_zip.open(nombre)
+    return open(origen, 'rb')
+
+
+def _registros(origen):
+    """Genera (ruc, resto de la línea) omitiendo la cabecera y las líneas inválidas"""
+    with _abrir_origen(origen) as f:
+        for linea in io.BufferedReader(f, buffer_size=1 << 20):
+            ruc, separador, resto = linea.rstrip(b'\r\n').partition(b'|')
+            if separador and len(ruc) == 11 and ruc.isdigit():
+                yield int(ruc), resto
+
+
+def _escribir_bloque(registros, directorio):
+    registros.sort(key=lambda r: r[0])
+    fd, ruta = tempfile.mkstemp(prefix='bloque_', dir=directorio)
+    with os.fdopen(fd, 'wb') as f:
+        for ruc, resto in registros:
+            f.write(BLOQUE.pack(ruc, len(resto)))
+            f.write(resto)
+    return ruta
+
+
+def _leer_bloque(ruta):
+    with open(ruta, 'rb', buffering=1 << 20) as f:
+        while True:
+            cabecera = f.read(BLOQUE.size)
+            if not cabecera:
+                return
+            ruc, largo = BLOQUE.unpack(cabecera)
+            yield ruc, f.read(largo)
+
+
+def construir_indice(origen, destino, registros_por_bloque=1_000_000):
+    """
+    Construye el índice ordenado a partir del padrón.
+
+    El archivo se ordena por bloques (memoria acotada por registros_por_bloque)
+    y los bloques se combinan con un merge. El índice nuevo se escribe en un
+    archivo temporal y reemplaza al anterior de forma atómica, así los
+    lectores nunca ven un índice a medio escribir.
+
+    Args:
+        origen: Ruta del padrón (.txt o .zip)
+        destino: Ruta del índice a generar
+        registros_por_bloque: Registros que se ordenan en memoria a la vez
+
+    Returns:
+        Cantidad de RUCs en el índice
+    """
+    inicio = time.time()
+    firma = _firma(origen)
+    directorio = os.path.dirname(os.path.abspath(destino))
+
+    with tempfile.TemporaryDirectory(prefix='padron_', dir=directorio) as temporal:
+        # 1. Ordenar por bloques
+        bloques = []
+        lote = []
+        for registro in _registros(origen):
+            lote.append(registro)
+            if len(lote) >= registros_por_bloque:
+                bloques.append(_escribir_bloque(lote, temporal))
+                lote = []
+        if lote or not bloques:
+            bloques.append(_escribir_bloque(lote, temporal))
+        log.info("%s bloque(s) ordenados en %.1fs", len(bloques), time.time() - inicio)
+
+        # 2. Combinar: entradas y registros en archivos separados (un RUC repetido conserva el último)
+        ruta_entradas = os.path.join(temporal, 'entradas')
+        ruta_registros = os.path.join(temporal, 'registros')
+        cantidad = 0
+        offset = 0
+        with open(ruta_entradas, 'wb', buffering=1 << 20) as entradas, \
+                open(ruta_registros, 'wb', buffering=1 << 20) as registros:
+            anterior = None
+            pendiente = None
+            for ruc, resto in heapq.merge(*(_leer_bloque(b) for b in bloques), key=lambda r: r[0]):
+                if ruc != anterior and pendiente is not None:
+                    entradas.write(ENTRADA.pack(anterior, offset))
+                    registros.write(pendiente)
+                    offset += len(pendiente)
+                    cantidad += 1
+                anterior, pendiente = ruc, resto
+            if pendiente is not None:
+                entradas.write(ENTRADA.pack(anterior, offset))
+                registros.write(pendiente)
+                cantidad += 1
+
+        # 3. Unir cabecera + entradas + registros y reemplazar el índice
+        inicio_registros = CABECERA.size + cantidad * ENTRADA.size
+        fd, ruta_final = tempfile.mkstemp(prefix='indice_', dir=directorio)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(CABECERA.pack(MAGIA, cantidad, inicio_registros, time.time()))
+                for ruta in (ruta_entradas, ruta_registros):
+                    with open(ruta, 'rb') as parte:
+                        while True:
+                            datos = parte.read(1 << 20)
+                            if not datos:
+                                break
+                            f.write(datos)
+            os.chmod(ruta_final, 0o644)
+            os.replace(ruta_final, destino)
+        except BaseException:
+            if os.path.exists(ruta_final):
+                os.remove(ruta_final)
+            raise
+
+    with open(destino + '.json', 'w') as f:
+        json.dump(dict(firma, cantidad=cantidad), f)
+
+    log.info("Índice del padrón generado: %s RUCs en %.1fs (%s)", cantidad, time.time() - inicio, destino)
+    return cantidad
+
+
+def requiere_reconstruir(origen, destino):
+    """True si el índice no existe o el padrón cambió desde que se construyó"""
+    if not os.path.exists(destino):
+        return True
+    try:
+        with open(destino + '.json') as f:
+            anterior = json.load(f)
+    except (OSError, ValueError):
+        return True
+    actual = _firma(origen)
+    return any(anterior.get(clave) != actual[clave] for clave in ('origen', 'tamano', 'mtime'))
+
+
+class IndicePadron:
+    """
+    Lector del índice con mmap.
+
+    recargar() abre el índice si el archivo fue reemplazado; las búsquedas
+    en curso siguen usando el mapeo anterior hasta terminar.
+    """
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self._estado = None
+        self._lock = threading.Lock()
+        self.recargar()
+
+    def recargar(self):
+        """Abre (o vuelve a abrir) el índice si cambió en disco. Retorna True si se recargó"""
+        try:
+            estado_archivo = os.stat(self.ruta)
+        except OSError:
+            return False
+
+        firma = (estado_archivo.st_ino, estado_archivo.st_mtime_ns, estado_archivo.st_size)
+        with self._lock:
+            if self._estado is not None and self._estado['firma'] == firma:
+                return False
+
+            with open(self.ruta, 'rb') as f:
+                mapa = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            magia, cantidad, inicio_registros, creado = CABECERA.unpack_from(mapa, 0)
+            if magia != MAGIA:
+                mapa.close()
+                raise ValueError(f"{self.ruta} no es un índice del padrón")
+
+            # El mapeo anterior se libera cuando ninguna búsqueda lo referencia
+            self._estado = {
+                'firma': firma,
+                'mapa': mapa,
+                'cantidad': cantidad,
+                'inicio_registros': inicio_registros,
+                'creado': datetime.fromtimestamp(creado).strftime("%Y-%m-%d %H:%M:%S"),
+            }
+            return True
+
+    def __len__(self):
+        return self._estado['cantidad'] if self._estado else 0
+
+    @property
+    def creado(self):
+        return self._estado['creado'] if self._estado else None
+
+    def buscar(self, numero_ruc):
+        """
+        Busca un RUC en el índice.
+
+        Returns:
+            Diccionario con los datos básicos del padrón o None si no está
+        """
+        estado = self._estado
+        if estado is None or len(numero_ruc) != 11 or not numero_ruc.isdigit():
+            return None
+
+        mapa = estado['mapa']
+        cantidad = estado['cantidad']
+        objetivo = int(numero_ruc)
+
+        bajo, alto = 0, cantidad
+        while bajo < alto:
+            medio = (bajo + alto) // 2
+            ruc, _ = ENTRADA.unpack_from(mapa, CABECERA.size + medio * ENTRADA.size)
+            if ruc < objetivo:
+                bajo = medio + 1
+            else:
+                alto = medio
+
+        if bajo == cantidad:
+            return None
+        ruc, offset = ENTRADA.unpack_from(mapa, CABECERA.size + bajo * ENTRADA.size)
+        if ruc != objetivo:
+            return None
+
+        if bajo + 1 < cantidad:
+            _, fin = ENTRADA.unpack_from(mapa, CABECERA.size + (bajo + 1) * ENTRADA.size)
+        else:
+            fin = len(mapa) - estado['inicio_registros']
+
+        inicio = estado['inicio_registros']
+        registro = mapa[inicio + offset:inicio + fin]
+        return self._decodificar(numero_ruc, registro, estado['creado'])
+
+    @staticmethod
+    def _decodificar(numero_ruc, registro, creado):
+        valores = registro.decode('latin-1').split('|')
+        campos = {
+            columna: (valores[i].strip() if i < len(valores) else '')
+            for i, columna in enumerate(COLUMNAS)
+        }
+        campos = {columna: ('' if valor == '-' else valor) for columna, valor in campos.items()}
+
+        partes = [
+            f"{campos['tipo_via']} {campos['nombre_via']}".strip(),
+            f"NRO. {campos['numero']}" if campos['numero'] else '',
+            f"INT. {campos['interior']}" if campos['interior'] else '',
+            f"LOTE {campos['lote']}" if campos['lote'] else '',
+            f"DPTO. {campos['departamento']}" if campos['departamento'] else '',
+            f"MZA. {campos['manzana']}" if campos['manzana'] else '',
+            f"KM. {campos['kilometro']}" if campos['kilometro'] else '',
+            f"{campos['codigo_zona']} {campos['tipo_zona']}".strip(),
+        ]
+
+        return {
+            'ruc': numero_ruc,
+            'numero_ruc': numero_ruc,
+            'razon_social': campos['razon_social'],
+            'estado': campos['estado'],
+            'condicion': campos['condicion'],
+            'ubigeo': campos['ubigeo'],
+            'direccion_fiscal': ' '.join(p for p in partes if p) or None,
+            'fecha_consulta': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            'fuente': 'padron',
+            'fecha_padron': creado,
+        }
+
+    def estadisticas(self):
+        return {'ruta': self.ruta, 'rucs': len(self), 'creado': self.creado}
+
+
+class ActualizadorPadron:
+    """
+    Reconstruye el índice periódicamente cuando el archivo del padrón cambia
+    (ej: luego de descargar la versión diaria) y recarga el lector.
+    """
+
+    def __init__(self, origen, indice, intervalo=24 * 3600):
+        """
+        Args:
+            origen: Ruta del padrón (.txt o .zip)
+            indice: IndicePadron a recargar
+            intervalo: Segundos entre verificaciones
+        """
+        self.origen = origen
+        self.indice = indice
+        self.intervalo = intervalo
+        self._detener = threading.Event()
+        self._thread = None
+
+    def actualizar(self):
+        """Reconstruye el índice si el padrón cambió. Retorna True si se reconstruyó"""
+        if not os.path.exists(self.origen) or not requiere_reconstruir(self.origen, self.indice.ruta):
+            return False
+        construir_indice(self.origen, self.indice.ruta)
+        self.indice.recargar()
+        return True
+
+    def iniciar(self):
+        self._thread = threading.Thread(target=self._bucle, name="actualizador-padron", daemon=True)
+        self._thread.start()
+
+    def _bucle(self):
+        while not self._detener.is_set():
+            try:
+                self.actualizar()
+            except Exception as e:
+                log.warning("No se pudo actualizar el índice del padrón: %s", e)
+            self._detener.wait(self.intervalo)
+
+    def detener(self):
+        self._detener.set()
+
+
+def generar_sintetico(destino, registros=100_000, semilla=0):
+    """Genera un padrón sintético (mismo formato que el de SUNAT) en orden aleatorio"""
+    aleatorio = random.Random(semilla)
+    estados = ['ACTIVO', 'ACTIVO', 'ACTIVO', 'BAJA DE OFICIO', 'SUSPENSION TEMPORAL']
+    condiciones = ['HABIDO', 'HABIDO', 'NO HABIDO', 'NO HALLADO']
+    rucs = aleatorio.sample(range(10_000_000_000, 20_999_999_999), registros)
+
+    with open(destino, 'w', encoding='latin-1', newline='\n') as f:
+        f.write("RUC|NOMBRE O RAZÓN SOCIAL|ESTADO DEL CONTRIBUYENTE|CONDICIÓN DE DOMICILIO|UBIGEO|"
+                "TIPO DE VÍA|NOMBRE DE VÍA|CÓDIGO DE ZONA|TIPO DE ZONA|NÚMERO|INTERIOR|LOTE|"
+                "DEPARTAMENTO|MANZANA|KILÓMETRO|\n")
+        for i, ruc in enumerate(rucs):
+            f.write('|'.join([
+                str(ruc),
+                f"EMPRESA SINTÉTICA {i} S.A.C.",
+                aleatorio.choice(estados),
+                aleatorio.choice(condiciones),
+                f"{aleatorio.randint(10101, 250401):06d}",
+                aleatorio.choice(['AV.', 'JR.', 'CAL.', '-']),
+                f"VIA {aleatorio.randint(1, 999)}",
+                aleatorio.choice(['URB.', '-']),
+                aleatorio.choice(['SANTA ROSA', '-']),
+                str(aleatorio.randint(1, 3000)),
+                '-', '-', '-', '-', '-',
+            ]) + '|\n')
+    return rucs
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser_args = argparse.ArgumentParser(description='Índice local del padrón reducido de SUNAT')
+    subcomandos = parser_args.add_subparsers(dest='comando', required=True)
+
+    p_construir = subcomandos.add_parser('construir', help='Genera el índice a partir del padrón')
+    p_construir.add_argument('origen', help='padron_reducido_ruc.txt o .zip')
+    p_construir.add_argument('--destino', default='padron.idx')
+    p_construir.add_argument('--bloque', type=int, default=1_000_000,
+                             help='Registros ordenados en memoria a la vez')
+    p_construir.add_argument('--si-cambio', action='store_true',
+                             help='Solo reconstruir si el padrón cambió')
+
+    p_buscar = subcomandos.add_parser('buscar', help='Busca uno o más RUCs en el índice')
+    p_buscar.add_argument('rucs', nargs='+')
+    p_buscar.add_argument('--indice', default='padron.idx')
+
+    p_sintetico = subcomandos.add_parser('sintetico', help='Genera un padrón sintético para pruebas')
+    p_sintetico.add_argument('destino')
+    p_sintetico.add_argument('--registros', type=int, default=100_000)
+
+    args = parser_args.parse_args()
+
+    if args.comando == 'construir':
+        if args.si_cambio and not requiere_reconstruir(args.origen, args.destino):
+            print("ℹ El padrón no cambió, no se reconstruye el índice")
+        else:
+            construir_indice(args.origen, args.destino, args.bloque)
+
+    elif args.comando == 'buscar':
+        indice = IndicePadron(args.indice)
+        for ruc in args.rucs:
+            inicio = time.perf_counter()
+            datos = indice.buscar(ruc)
+            duracion = (time.perf_counter() - inicio) * 1_000_000
+            print(json.dumps(datos, ensure_ascii=False, indent=2))
+            print(f"Tiempo de búsqueda: {duracion:.1f} µs")
+
+    elif args.comando == 'sintetico':
+        generar_sintetico(args.destino, args.registros)
+        print(f"✓ Padrón sintético con {args.registros} registros: {args.destino}")
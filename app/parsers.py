@@ -0,0 +1,392 @@
+#!/usr/bin/env python3
+"""
+Parsers HTML de las páginas de consulta RUC de SUNAT
+
+Funciones puras que reciben el HTML de una página (str o bytes) y retornan
+los mismos diccionarios que los métodos extraer_* de SUNATScraper, sin
+depender de un navegador.
+"""
+
+import re
+from lxml import html as lxml_html
+
+
+def _clase(nombre):
+    """Condición XPath equivalente al selector CSS .nombre"""
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {nombre} ')"
+
+
+def _texto(elemento):
+    """Texto visible del elemento con los espacios normalizados"""
+    return ' '.join(elemento.text_content().split())
+
+
+def _documento(contenido):
+    if isinstance(contenido, (str, bytes)):
+        return lxml_html.document_fromstring(contenido)
+    return contenido
+
+
+def _primero(doc, xpath):
+    elementos = doc.xpath(xpath)
+    return elementos[0] if elementos else None
+
+
+def _celdas(fila):
+    return [_texto(celda) for celda in fila.xpath('.//td')]
+
+
+def parsear_datos_basicos(contenido):
+    """
+    Extrae los datos básicos de la ficha RUC (resultado de consPorRuc)
+
+    Returns:
+        Diccionario con los datos encontrados o None si la página no contiene la ficha
+    """
+    doc = _documento(contenido)
+    datos = {}
+
+    def extraer_campo(label_text):
+        for xpath in (
+            f"//h4[contains(text(), '{label_text}')]/parent::div/following-sibling::div//p[@class='list-group-item-text']",
+            f"//h4[contains(text(), '{label_text}')]/parent::div/parent::div//p[@class='list-group-item-text']",
+        ):
+            elemento = _primero(doc, xpath)
+            if elemento is not None:
+                return _texto(elemento)
+        return None
+
+    ruc = _primero(doc, "//h4[contains(text(), 'Número de RUC:')]/parent::div/following-sibling::div//h4")
+    if ruc is not None:
+        ruc_text = _texto(ruc)
+        if ' - ' in ruc_text:
+            parts = ruc_text.split(' - ', 1)
+            datos['numero_ruc'] = parts[0].strip()
+            datos['razon_social'] = parts[1].strip()
+
+    campos = [
+        ('tipo_contribuyente', 'Tipo Contribuyente:'),
+        ('nombre_comercial', 'Nombre Comercial:'),
+        ('fecha_inscripcion', 'Fecha de Inscripción:'),
+        ('fecha_inicio_actividades', 'Fecha de Inicio de Actividades:'),
+        ('estado', 'Estado del Contribuyente:'),
+        ('condicion', 'Condición del Contribuyente:'),
+        ('direccion_fiscal', 'Domicilio Fiscal:'),
+        ('sistema_emision', 'Sistema Emisión de Comprobante:'),
+        ('actividad_comercio_exterior', 'Actividad Comercio Exterior:'),
+        ('sistema_contabilidad', 'Sistema Contabilidad:'),
+    ]
+    for clave, label in campos:
+        valor = extraer_campo(label)
+        if valor:
+            datos[clave] = valor
+
+    actividades = [
+        texto for texto in (
+            _texto(td) for td in doc.xpath(
+                "//h4[contains(text(), 'Actividad(es) Económica(s):')]/parent::div/following-sibling::div//table//tr/td"
+            )
+        ) if texto
+    ]
+    if actividades:
+        datos['actividades_economicas'] = actividades
+
+    comprobantes = [
+        texto for texto in (
+            _texto(td) for td in doc.xpath(
+                "//h4[contains(text(), 'Comprobantes de Pago')]/parent::div/following-sibling::div//table//tr/td"
+            )
+        ) if texto
+    ]
+    if comprobantes:
+        datos['comprobantes_pago'] = comprobantes
+
+    for clave, label in (
+        ('emisor_electronico_desde', 'Emisor electrónico desde:'),
+        ('comprobantes_electronicos', 'Comprobantes Electrónicos:'),
+        ('afiliado_ple_desde', 'Afiliado al PLE desde:'),
+    ):
+        valor = extraer_campo(label)
+        if valor:
+            datos[clave] = valor
+
+    return datos if datos else None
+
+
+_NO_ENCONTRADO = re.compile(r"n[úu]mero de ruc .* (no es v[áa]lido|no existe)", re.IGNORECASE)
+
+
+def es_ruc_no_encontrado(contenido):
+    """True si la página es el aviso de SUNAT de RUC no válido o inexistente (sin ficha)"""
+    doc = _documento(contenido)
+    return any(_NO_ENCONTRADO.search(_texto(p)) for p in doc.xpath("//p | //div[" + _clase('error') + "]"))
+
+
+def parsear_cantidad_trabajadores(contenido):
+    """Extrae los períodos de la tabla de cantidad de trabajadores (getCantTrab)"""
+    doc = _documento(contenido)
+    tabla = _primero(doc, "//table[@class='table']")
+    if tabla is None:
+        return None
+
+    datos_trabajadores = []
+    for fila in tabla.xpath(".//tbody//tr"):
+        celdas = _celdas(fila)
+        if len(celdas) >= 4:
+            datos_trabajadores.append({
+                'periodo': celdas[0],
+                'trabajadores': celdas[1].replace(' ', ''),
+                'pensionistas': celdas[2].replace(' ', ''),
+                'prestadores_servicio': celdas[3].replace(' ', '')
+            })
+
+    return datos_trabajadores or None
+
+
+def parsear_representantes_legales(contenido):
+    """Extrae la tabla de representantes legales (getRepLeg)"""
+    doc = _documento(contenido)
+    tabla = _primero(doc, "//table[@class='table']")
+    if tabla is None:
+        return None
+
+    datos_representantes = []
+    for fila in tabla.xpath(".//tbody//tr"):
+        celdas = _celdas(fila)
+        if len(celdas) >= 5:
+            datos_representantes.append({
+                'tipo_documento': celdas[0],
+                'nro_documento': celdas[1],
+                'nombre': celdas[2],
+                'cargo': celdas[3],
+                'fecha_desde': celdas[4]
+            })
+
+    return datos_representantes or None
+
+
+def parsear_informacion_historica(contenido):
+    """Extrae razones sociales, condiciones y direcciones anteriores (getinfHis)"""
+    doc = _documento(contenido)
+
+    informacion_historica = {
+        'razon_social_anteriores': [],
+        'condicion_anteriores': [],
+        'direccion_anteriores': []
+    }
+
+    tablas = []
+    for xpath in (
+        "//div[@class='panel panel-primary']//table[@class='table']",
+        "//table[@class='table']",
+        "//div[@class='table-responsive']//table",
+        "//table",
+    ):
+        tablas = doc.xpath(xpath)
+        if tablas:
+            break
+
+    for idx, tabla in enumerate(tablas):
+        header_texts = [_texto(h) for h in tabla.xpath(".//thead//th")]
+        filas = [_celdas(fila) for fila in tabla.xpath(".//tbody//tr")]
+        encabezados = str(header_texts)
+
+        if len(header_texts) < 2:
+            continue
+
+        if "Nombre" in encabezados or "Razón Social" in encabezados:
+            for celdas in filas:
+                if len(celdas) >= 2 and celdas[0]:
+                    informacion_historica['razon_social_anteriores'].append({
+                        'razon_social': celdas[0],
+                        'fecha_baja': celdas[1]
+                    })
+
+        elif "Direcci" in encabezados or "Domicilio" in encabezados:
+            for celdas in filas:
+                if len(celdas) >= 2 and celdas[0]:
+                    informacion_historica['direccion_anteriores'].append({
+                        'direccion': celdas[0],
+                        'fecha_baja': celdas[1]
+                    })
+
+        elif len(header_texts) == 3 and ("Condici" in encabezados or "Fecha Desde" in encabezados):
+            for celdas in filas:
+                if len(celdas) >= 3 and celdas[0]:
+                    informacion_historica['condicion_anteriores'].append({
+                        'condicion': celdas[0],
+                        'fecha_desde': celdas[1],
+                        'fecha_hasta': celdas[2]
+                    })
+
+        elif len(header_texts) == 2 and filas:
+            # Tabla genérica de 2 columnas - identificar por posición
+            primer_header = header_texts[0].lower()
+            es_nombres = idx == 0 or "nombre" in primer_header or "raz" in primer_header
+            es_direcciones = "direcci" in primer_header or "domicilio" in primer_header
+
+            for celdas in filas:
+                if len(celdas) < 2 or not celdas[0]:
+                    continue
+                valor, fecha = celdas[0], celdas[1]
+                if not es_direcciones and (es_nombres or len(valor) < 150):
+                    informacion_historica['razon_social_anteriores'].append({
+                        'razon_social': valor,
+                        'fecha_baja': fecha
+                    })
+                else:
+                    informacion_historica['direccion_anteriores'].append({
+                        'direccion': valor,
+                        'fecha_baja': fecha
+                    })
+
+    total_registros = sum(len(v) for v in informacion_historica.values())
+    return informacion_historica if total_registros > 0 else None
+
+
+def parsear_deuda_coactiva(contenido):
+    """
+    Extrae la deuda coactiva remitida a centrales de riesgo (getInfoDC)
+
+    Returns:
+        Lista de registros si hay deuda, o {'tiene_deuda': False, 'mensaje': ...}
+    """
+    doc = _documento(contenido)
+
+    tablas = doc.xpath(f"//div[{_clase('table-responsive')}]//table[{_clase('table')}]")
+    if not tablas:
+        tablas = doc.xpath("//table")
+
+    deuda_coactiva = []
+    for tabla in tablas:
+        header_texts = [_texto(h) for h in tabla.xpath(".//th")]
+        if len(header_texts) < 4 or not any("Monto" in h for h in header_texts):
+            continue
+
+        tbody = tabla.xpath(".//tbody")
+        filas = tbody[0].xpath(".//tr") if tbody else tabla.xpath(".//tr")[1:]
+
+        for fila in filas:
+            celdas = fila.xpath(".//td")
+            if len(celdas) >= 4:
+                monto, periodo, fecha_inicio, entidad = (_texto(c) for c in celdas[:4])
+                if monto and periodo:
+                    deuda_coactiva.append({
+                        'monto': monto,
+                        'periodo_tributario': periodo,
+                        'fecha_inicio_cobranza': fecha_inicio,
+                        'entidad': entidad
+                    })
+
+    if deuda_coactiva:
+        return deuda_coactiva
+
+    mensaje = _primero(doc, f"//div[{_clase('list-group-item')}]//div[{_clase('col-sm-12')}]")
+    if mensaje is not None and _texto(mensaje):
+        return {
+            'tiene_deuda': False,
+            'mensaje': _texto(mensaje)
+        }
+
+    return {
+        'tiene_deuda': False,
+        'mensaje': 'No se encontró información de deuda coactiva'
+    }
+
+
+def _parsear_programa(doc, clave_detalle, palabra_detalle):
+    label = _primero(doc, f"//span[{_clase('label')}]")
+    tiene_deuda = _texto(label) if label is not None else None
+    if not tiene_deuda:
+        return None
+
+    fecha_actualizacion = None
+    detalle = None
+    for h5 in doc.xpath("//h5"):
+        texto = _texto(h5)
+        if "actualizada al" in texto.lower():
+            match = re.search(r'(\d{2}/\d{2}/\d{4})', texto)
+            if match:
+                fecha_actualizacion = match.group(1)
+        elif palabra_detalle in texto.lower():
+            detalle = texto
+
+    return {
+        'tiene_deuda_mayor_1_uit': tiene_deuda,
+        'fecha_actualizacion': fecha_actualizacion,
+        clave_detalle: detalle
+    }
+
+
+def parsear_reactiva_peru(contenido):
+    """Extrae la información de Reactiva Perú (getReactivaPeru)"""
+    return _parsear_programa(_documento(contenido), 'decreto', 'decreto')
+
+
+def parsear_programa_covid19(contenido):
+    """Extrae la información del Programa de Garantías COVID-19 (getPGarantiaCOVID19)"""
+    return _parsear_programa(_documento(contenido), 'ley', 'ley')
+
+
+def parsear_establecimientos_anexos(contenido):
+    """Extrae la tabla de establecimientos anexos (getLocAnex)"""
+    doc = _documento(contenido)
+    tabla = _primero(doc, f"//table[{_clase('table')}]")
+    if tabla is None:
+        return None
+
+    tbody = _primero(tabla, ".//tbody")
+    if tbody is None:
+        return None
+
+    establecimientos = []
+    for fila in tbody.xpath(".//tr"):
+        celdas = fila.xpath(".//td")
+        if len(celdas) >= 4:
+            codigo, tipo, direccion, actividad = (_texto(c) for c in celdas[:4])
+            if codigo:
+                establecimientos.append({
+                    'codigo': codigo,
+                    'tipo_establecimiento': tipo,
+                    'direccion': direccion,
+                    'actividad_economica': actividad
+                })
+
+    return establecimientos or None
+
+
+PARSERS = {
+    'datos_basicos': parsear_datos_basicos,
+    'cantidad_trabajadores': parsear_cantidad_trabajadores,
+    'representantes_legales': parsear_representantes_legales,
+    'informacion_historica': parsear_informacion_historica,
+    'deuda_coactiva': parsear_deuda_coactiva,
+    'reactiva_peru': parsear_reactiva_peru,
+    'programa_covid19': parsear_programa_covid19,
+    'establecimientos_anexos': parsear_establecimientos_anexos,
+}
+
+
+if __name__ == "__main__":
+    # Uso: python parsers.py pagina.html --seccion datos_basicos --repeticiones 100
+    import argparse
+    import json
+    import time
+
+    parser_args = argparse.ArgumentParser(description='Parsea una página de SUNAT guardada en disco')
+    parser_args.add_argument('archivo', help='Archivo HTML guardado')
+    parser_args.add_argument('--seccion', choices=sorted(PARSERS), default='datos_basicos')
+    parser_args.add_argument('--repeticiones', type=int, default=1,
+                             help='Repite el parseo para medir el tiempo promedio')
+    args = parser_args.parse_args()
+
+    with open(args.archivo, 'rb') as f:
+        contenido = f.read()
+
+    inicio = time.perf_counter()
+    for _ in range(max(1, args.repeticiones)):
+        resultado = PARSERS[args.seccion](contenido)
+    promedio = (time.perf_counter() - inicio) / max(1, args.repeticiones)
+
+    print(json.dumps(resultado, ensure_ascii=False, indent=2))
+    print(f"\nTiempo promedio de parseo: {promedio * 1000:.3f} ms")
@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+Clases de prioridad para repartir navegadores, threads y el cupo de SUNAT
+
+Las consultas individuales de la API (clase "interactiva") y el trabajo en
+lote (clase "lote": /consultar-lote, /jobs, el CLI) compiten por los mismos
+recursos. En cada punto donde se espera un lugar (executor de la API,
+concurrencia y tokens del limitador, pool de navegadores):
+
+- Una clase no entra mientras una clase de mayor prioridad está esperando:
+  las consultas interactivas se adelantan a los lotes en cola.
+- Cada clase puede tener lugares reservados que las demás no usan aunque
+  estén libres: con PRIORIDAD_RESERVA_INTERACTIVA=1 (default) un lote nunca
+  ocupa todos los lugares, y una consulta interactiva entra sin esperar a que
+  termine una consulta del lote.
+
+La clase es la del thread (prioridad_activa); si no se indicó, es "lote".
+"""
+
+import os
+import threading
+from collections import deque
+from concurrent.futures import Executor, Future
+from contextlib import contextmanager
+
+
+INTERACTIVA = "interactiva"
+LOTE = "lote"
+
+# De mayor a menor prioridad
+CLASES = (INTERACTIVA, LOTE)
+
+_local = threading.local()
+
+
+def reservas_desde_entorno():
+    """Lugares reservados por clase (PRIORIDAD_RESERVA_INTERACTIVA, PRIORIDAD_RESERVA_LOTE)"""
+    return {
+        INTERACTIVA: int(os.getenv("PRIORIDAD_RESERVA_INTERACTIVA") or "1"),
+        LOTE: int(os.getenv("PRIORIDAD_RESERVA_LOTE") or "0"),
+    }
+
+
+def prioridad_actual():
+    """Clase de prioridad del trabajo en curso en este thread"""
+    return getattr(_local, 'clase', None) or LOTE
+
+
+@contextmanager
+def prioridad_activa(clase):
+    """Usa esta clase de prioridad para el trabajo del thread actual"""
+    if clase not in CLASES:
+        raise ValueError(f"Clase de prioridad inválida: {clase} (opciones: {', '.join(CLASES)})")
+    anterior = getattr(_local, 'clase', None)
+    _local.clase = clase
+    try:
+        yield
+    finally:
+        _local.clase = anterior
+
+
+def con_prioridad(clase, fn, *args, **kwargs):
+    """Ejecuta fn con la clase de prioridad indicada en este thread"""
+    with prioridad_activa(clase):
+        return fn(*args, **kwargs)
+
+
+class Admision:
+    """
+    Reparte una capacidad entre las clases de prioridad.
+
+    No tiene lock propio: se usa bajo el lock (o Condition) del recurso que
+    protege, y quien la usa debe hacer notify_all al liberar un lugar o al
+    dejar de esperar, porque los que esperan pueden ser de otra clase.
+    """
+
+    def __init__(self, reservas=None):
+        """
+        Args:
+            reservas: Dict clase -> lugares reservados (default: reservas_desde_entorno())
+        """
+        self.reservas = reservas if reservas is not None else reservas_desde_entorno()
+        self.en_uso = {clase: 0 for clase in CLASES}
+        self.esperando = {clase: 0 for clase in CLASES}
+
+    def puede_entrar(self, clase, capacidad):
+        """True si la clase puede ocupar un lugar de los `capacidad` disponibles"""
+        libres = capacidad - sum(self.en_uso.values())
+        if libres <= 0:
+            return False
+
+        for superior in CLASES[:CLASES.index(clase)]:
+            if self.esperando[superior]:
+                return False
+
+        # Lugares reservados a otras clases que no están usando. La reserva deja
+        # al menos un lugar para las demás: con capacidad 1 solo queda la preferencia
+        reservados = sum(
+            max(0, min(reserva, capacidad - 1) - self.en_uso[otra])
+            for otra, reserva in self.reservas.items() if otra != clase
+        )
+        return libres - reservados >= 1
+
+    def esperar(self, condicion, clase, capacidad, timeout=None):
+        """
+        Espera un lugar para la clase y lo ocupa. Se llama con el lock de `condicion` tomado.
+
+        Args:
+            condicion: threading.Condition del recurso
+            clase: Clase de prioridad
+            capacidad: Callable que retorna la capacidad actual (puede cambiar mientras se espera)
+            timeout: Segundos máximos de espera
+
+        Returns:
+            False si venció el timeout sin obtener lugar
+        """
+        self.esperando[clase] += 1
+        try:
+            obtenido = condicion.wait_for(lambda: self.puede_entrar(clase, capacidad()), timeout)
+        finally:
+            self.esperando[clase] -= 1
+            # Las clases que cedían el paso a esta pueden intentar de nuevo
+            condicion.notify_all()
+        if obtenido:
+            self.en_uso[clase] += 1
+        return obtenido
+
+    def ocupar(self, clase):
+        self.en_uso[clase] += 1
+
+    def salir(self, clase):
+        self.en_uso[clase] -= 1
+
+    def estadisticas(self):
+        return {
+            'en_uso': dict(self.en_uso),
+            'esperando': dict(self.esperando),
+            'reservas': dict(self.reservas),
+        }
+
+
+class _VistaEjecutor(Executor):
+    """Executor que envía las tareas a un EjecutorPrioridad con una clase fija"""
+
+    def __init__(self, ejecutor, clase):
+        self._ejecutor = ejecutor
+        self.clase = clase
+
+    def submit(self, fn, /, *args, **kwargs):
+        return self._ejecutor.enviar(self.clase, fn, *args, **kwargs)
+
+    def shutdown(self, wait=True, *, cancel_futures=False):
+        self._ejecutor.shutdown(wait=wait, cancel_futures=cancel_futures)
+
+
+class EjecutorPrioridad:
+    """
+    Pool de threads con una cola por clase de prioridad.
+
+    Un thread libre toma primero las tareas interactivas; las tareas de una
+    clase no ocupan los threads reservados a otra. Cada tarea se ejecuta con
+    su clase activa (prioridad_activa), así el limitador y el pool de
+    navegadores también la respetan.
+    """
+
+    def __init__(self, max_workers=4, reservas=None, thread_name_prefix="ejecutor"):
+        """
+        Args:
+            max_workers: Threads del pool
+            reservas: Threads reservados por clase (default: reservas_desde_entorno())
+            thread_name_prefix: Prefijo del nombre de los threads
+        """
+        self.max_workers = max_workers
+        self.admision = Admision(reservas)
+        self._colas = {clase: deque() for clase in CLASES}
+        self._condicion = threading.Condition()
+        self._cerrado = False
+        self._threads = [
+            threading.Thread(target=self._trabajar, name=f"{thread_name_prefix}_{i}", daemon=True)
+            for i in range(max_workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def clase(self, clase):
+        """Executor (compatible con run_in_executor) que envía tareas con esta clase"""
+        if clase not in CLASES:
+            raise ValueError(f"Clase de prioridad inválida: {clase} (opciones: {', '.join(CLASES)})")
+        return _VistaEjecutor(self, clase)
+
+    def enviar(self, clase, fn, *args, **kwargs):
+        future = Future()
+        with self._condicion:
+            if self._cerrado:
+                raise RuntimeError("El ejecutor está cerrado")
+            self._colas[clase].append((future, fn, args, kwargs))
+            self.admision.esperando[clase] += 1
+            self._condicion.notify_all()
+        return future
+
+    def _siguiente(self):
+        """Clase de la próxima tarea a ejecutar (o None). Se llama con el lock tomado"""
+        for clase in CLASES:
+            if self._colas[clase] and self.admision.puede_entrar(clase, self.max_workers):
+                return clase
+        return None
+
+    def _trabajar(self):
+        while True:
+            with self._condicion:
+                while True:
+                    clase = self._siguiente()
+                    if clase is not None:
+                        break
+                    if self._cerrado and not any(self._colas.values()):
+                        return
+                    self._condicion.wait()
+                future, fn, args, kwargs = self._colas[clase].popleft()
+                self.admision.esperando[clase] -= 1
+                self.admision.ocupar(clase)
+
+            try:
+                if future.set_running_or_notify_cancel():
+                    try:
+                        with prioridad_activa(clase):
+                            resultado = fn(*args, **kwargs)
+                    except BaseException as e:
+                        future.set_exception(e)
+                    else:
+                        future.set_result(resultado)
+            finally:
+                with self._condicion:
+                    self.admision.salir(clase)
+                    self._condicion.notify_all()
+
+    def en_cola(self, clase=None):
+        """Tareas esperando un thread libre (de una clase o de todas)"""
+        with self._condicion:
+            if clase is not None:
+                return len(self._colas[clase])
+            return sum(len(cola) for cola in self._colas.values())
+
+    def estadisticas(self):
+        with self._condicion:
+            return dict(self.admision.estadisticas(), max_workers=self.max_workers)
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        with self._condicion:
+            self._cerrado = True
+            if cancel_futures:
+                for clase, cola in self._colas.items():
+                    while cola:
+                        future, _, _, _ = cola.popleft()
+                        self.admision.esperando[clase] -= 1
+                        future.cancel()
+            self._condicion.notify_all()
+        if wait:
+            for thread in self._threads:
+                if thread is not threading.current_thread():
+                    thread.join()
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Bloqueo de recursos innecesarios en el navegador
+
+Los extractores solo necesitan el HTML y los scripts de SUNAT; imágenes,
+fuentes, hojas de estilo y scripts de terceros se bloquean con
+Network.setBlockedURLs de Chrome DevTools Protocol. El bloqueo de CDP es
+por pestaña (target): se aplica a cada pestaña nueva después de abrirla.
+También mide los bytes transferidos y el tiempo de carga de cada página para
+comparar el ahorro.
+"""
+
+import fnmatch
+import os
+import threading
+
+
+class BloqueoRecursos:
+    """Política de bloqueo de recursos aplicada a un WebDriver de Chrome"""
+
+    # Patrones de Network.setBlockedURLs por tipo de recurso ('*' es comodín)
+    TIPOS = {
+        'imagenes': ['*.png', '*.jpg', '*.jpeg', '*.gif', '*.svg', '*.ico', '*.webp', '*.bmp'],
+        'fuentes': ['*.woff', '*.woff2', '*.ttf', '*.otf', '*.eot', '*fonts.googleapis.com*', '*fonts.gstatic.com*'],
+        'css': ['*.css', '*.css?*'],
+        'terceros': [
+            '*google-analytics.com*',
+            '*googletagmanager.com*',
+            '*doubleclick.net*',
+            '*facebook.net*',
+            '*facebook.com/tr*',
+            '*hotjar.com*',
+        ],
+    }
+
+    def __init__(self, activo=True, tipos=None, permitidos=None, extra=None):
+        """
+        Args:
+            activo: Si False no se bloquea nada
+            tipos: Claves de TIPOS a bloquear (default: todas)
+            permitidos: URLs que nunca se bloquean; se quita todo patrón que las cubra
+            extra: Patrones adicionales a bloquear
+        """
+        self.activo = activo
+        self.tipos = list(tipos) if tipos is not None else list(self.TIPOS)
+        self.permitidos = list(permitidos or [])
+        self.extra = list(extra or [])
+
+    @classmethod
+    def desde_entorno(cls, headless=True):
+        """
+        Crea la política a partir de variables de entorno.
+        El bloqueo está activo por defecto cuando el navegador es headless.
+        """
+        def lista(variable):
+            return [valor.strip() for valor in os.getenv(variable, "").split(",") if valor.strip()]
+
+        activo = os.getenv("BLOQUEO_RECURSOS", "1" if headless else "0") == "1"
+        return cls(
+            activo=activo,
+            tipos=lista("BLOQUEO_TIPOS") or None,
+            permitidos=lista("BLOQUEO_PERMITIDOS"),
+            extra=lista("BLOQUEO_EXTRA")
+        )
+
+    def patrones(self):
+        """Patrones a bloquear, sin los que cubren alguna URL permitida"""
+        if not self.activo:
+            return []
+
+        patrones = [p for tipo in self.tipos for p in self.TIPOS.get(tipo, [])] + self.extra
+        return [
+            patron for patron in patrones
+            if not any(fnmatch.fnmatchcase(url, patron) for url in self.permitidos)
+        ]
+
+    def aplicar(self, driver):
+        """
+        Configura el bloqueo en la pestaña actual del driver (requiere Chrome/Chromium)
+
+        Returns:
+            True si la pestaña quedó con recursos bloqueados
+        """
+        patrones = self.patrones()
+        if not patrones:
+            return False
+        driver.execute_cdp_cmd('Network.enable', {})
+        driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': patrones})
+        return True
+
+
+# Bytes transferidos y tiempo de carga de la página actual (Navigation/Resource Timing)
+MEDIR_PAGINA = """
+var nav = performance.getEntriesByType('navigation')[0];
+var recursos = performance.getEntriesByType('resource');
+var bytes = nav ? nav.transferSize : 0;
+for (var i = 0; i < recursos.length; i++) {
+    bytes += recursos[i].transferSize;
+}
+var fin = nav && nav.loadEventEnd > 0 ? nav.loadEventEnd : performance.now();
+return {bytes: bytes, carga_ms: fin - (nav ? nav.startTime : 0), recursos: recursos.length};
+"""
+
+
+class MetricasRed:
+    """Acumula bytes y tiempo de carga por página, separados por bloqueo activo o no"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._totales = {
+            True: {'paginas': 0, 'bytes': 0, 'carga_ms': 0.0, 'recursos': 0},
+            False: {'paginas': 0, 'bytes': 0, 'carga_ms': 0.0, 'recursos': 0},
+        }
+
+    def medir(self, driver, bloqueo_activo):
+        """Registra la página actual del driver; los errores de medición se ignoran"""
+        try:
+            medicion = driver.execute_script(MEDIR_PAGINA)
+        except Exception:
+            return None
+        if not medicion:
+            return None
+
+        with self._lock:
+            totales = self._totales[bool(bloqueo_activo)]
+            totales['paginas'] += 1
+            totales['bytes'] += int(medicion.get('bytes') or 0)
+            totales['carga_ms'] += float(medicion.get('carga_ms') or 0)
+            totales['recursos'] += int(medicion.get('recursos') or 0)
+        return medicion
+
+    def totales(self):
+        """Totales acumulados por bloqueo activo (True) o no (False)"""
+        with self._lock:
+            return {activo: dict(totales) for activo, totales in self._totales.items()}
+
+    def resumen(self):
+        """
+        Promedios por página con y sin bloqueo, y el ahorro por página
+        cuando hay mediciones de ambos modos.
+        """
+        with self._lock:
+            promedios = {}
+            for activo, clave in ((True, 'con_bloqueo'), (False, 'sin_bloqueo')):
+                totales = self._totales[activo]
+                paginas = totales['paginas']
+                promedios[clave] = {
+                    'paginas': paginas,
+                    'bytes_por_pagina': round(totales['bytes'] / paginas) if paginas else None,
+                    'carga_ms_por_pagina': round(totales['carga_ms'] / paginas, 1) if paginas else None,
+                    'recursos_por_pagina': round(totales['recursos'] / paginas, 1) if paginas else None,
+                }
+
+        con, sin = promedios['con_bloqueo'], promedios['sin_bloqueo']
+        if con['paginas'] and sin['paginas']:
+            promedios['ahorro_por_pagina'] = {
+                'bytes': sin['bytes_por_pagina'] - con['bytes_por_pagina'],
+                'carga_ms': round(sin['carga_ms_por_pagina'] - con['carga_ms_por_pagina'], 1),
+            }
+        return promedios
+
+
+# Métricas compartidas por todos los navegadores del proceso
+metricas_red = MetricasRed()
@@ -3,8 +3,10 @@
 Web Scraper para consulta de RUC en SUNAT
 """
 
-import json
-import time
+import logging
+import os
+import shutil
+import threading
 from datetime import datetime
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from selenium import webdriver
@@ -14,15 +16,114 @@ from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.chrome.service import Service
 from selenium.common.exceptions import TimeoutException, NoSuchElementException
 from webdriver_manager.chrome import ChromeDriverManager
+import parsers
+from esperas import Esperas
+from recursos import BloqueoRecursos, metricas_red
+from limitador import limitador_sunat
+from metricas import tramo, registrar_seccion, medir_seccion, medir_consulta, marcar_error_seccion
+from depuracion import artefactos
+from bitacora import obtener_logger, contexto_consulta, contexto_activo, ContextoConsulta
+
+
+# Clave de cada sección adicional en el resultado -> parámetro incluir_* que la activa
+SECCIONES = {
+    'cantidad_trabajadores': 'incluir_trabajadores',
+    'representantes_legales': 'incluir_representantes',
+    'informacion_historica': 'incluir_historico',
+    'deuda_coactiva': 'incluir_deuda_coactiva',
+    'reactiva_peru': 'incluir_reactiva_peru',
+    'programa_covid19': 'incluir_programa_covid19',
+    'establecimientos_anexos': 'incluir_establecimientos',
+}
+
+
+_ruta_chromedriver = None
+_lock_chromedriver = threading.Lock()
+
+log = obtener_logger('scraper')
+
+
+def ruta_chromedriver():
+    """
+    Resuelve la ruta de chromedriver una sola vez por proceso.
+
+    Orden de búsqueda:
+        1. Variable de entorno CHROMEDRIVER_PATH
+        2. chromedriver en el PATH
+        3. webdriver_manager (descarga), salvo con CHROMEDRIVER_OFFLINE=1
+
+    Returns:
+        Ruta al ejecutable de chromedriver
+
+    Raises:
+        RuntimeError: En modo offline si no se encuentra chromedriver localmente
+    """
+    global _ruta_chromedriver
+
+    with _lock_chromedriver:
+        if _ruta_chromedriver is not None:
+            return _ruta_chromedriver
+
+        ruta = os.getenv("CHROMEDRIVER_PATH") or shutil.which("chromedriver")
+        if ruta:
+            log.info("Usando chromedriver local: %s", ruta)
+        elif os.getenv("CHROMEDRIVER_OFFLINE", "0") == "1":
+            raise RuntimeError(
+                "CHROMEDRIVER_OFFLINE=1 y no se encontró chromedriver "
+                "(definir CHROMEDRIVER_PATH o agregarlo al PATH)"
+            )
+        else:
+            ruta = ChromeDriverManager().install()
+            log.info("chromedriver resuelto con webdriver_manager: %s", ruta)
+
+        _ruta_chromedriver = ruta
+        return ruta
 
 
 class SUNATScraper:
     """Clase para realizar web scraping de RUC en SUNAT"""
     
-    def __init__(self):
-        """Iniciar el scraper"""
-        self.url = "https://e-consultaruc.sunat.gob.pe/cl-ti-itmrconsruc/FrameCriterioBusquedaWeb.jsp"
+    # Sección -> valor del parámetro 'accion' de jcrS00Alias y contenedor de datos esperado
+    ACCIONES_SECCION = {
+        'cantidad_trabajadores': ('getCantTrab', (By.XPATH, "//table[@class='table']")),
+        'representantes_legales': ('getRepLeg', (By.XPATH, "//table[@class='table']")),
+        'informacion_historica': ('getinfHis', (By.XPATH, "//div[contains(@class, 'panel-primary')]")),
+        'deuda_coactiva': ('getInfoDC', (By.XPATH, "//div[contains(@class, 'panel-primary')]")),
+        'reactiva_peru': ('getReactivaPeru', (By.XPATH, "//div[contains(@class, 'panel-primary')]")),
+        'programa_covid19': ('getPGarantiaCOVID19', (By.XPATH, "//div[contains(@class, 'panel-primary')]")),
+        'establecimientos_anexos': ('getLocAnex', (By.CSS_SELECTOR, "table.table")),
+    }
+
+    def __init__(self, modo_extraccion="snapshot", esperas=None, secciones_en_pestanas=None,
+                 bloqueo=None, base_url=None):
+        """
+        Iniciar el scraper
+        
+        Args:
+            modo_extraccion: "snapshot" parsea un único page_source con lxml;
+                             "dom" consulta cada campo al driver con find_element
+            esperas: Configuración de Esperas (default: desde variables de entorno)
+            secciones_en_pestanas: Si True, las secciones adicionales se cargan en paralelo
+                                   en pestañas del mismo navegador (solo modo snapshot).
+                                   Default: variable de entorno SECCIONES_EN_PESTANAS (1)
+            bloqueo: Política BloqueoRecursos (default: desde variables de entorno)
+            base_url: URL base de cl-ti-itmrconsruc (default: variable de entorno
+                      SUNAT_BASE_URL o el sitio de SUNAT); permite usar servidor_simulado.py
+        """
+        self.base_url = (
+            base_url or os.getenv("SUNAT_BASE_URL") or "https://e-consultaruc.sunat.gob.pe/cl-ti-itmrconsruc"
+        ).rstrip('/')
+        self.url = f"{self.base_url}/FrameCriterioBusquedaWeb.jsp"
         self.driver = None
+        self.modo_extraccion = modo_extraccion
+        self.esperas = esperas or Esperas.desde_entorno()
+        if secciones_en_pestanas is None:
+            secciones_en_pestanas = os.getenv("SECCIONES_EN_PESTANAS", "1") == "1"
+        self.secciones_en_pestanas = secciones_en_pestanas
+        # El navegador siempre se inicia headless, por lo que el bloqueo está activo por defecto
+        self.bloqueo = bloqueo or BloqueoRecursos.desde_entorno(headless=True)
+        # Estado del bloqueo de cada pestaña (handle -> bool): CDP bloquea por pestaña
+        self._bloqueo_pestanas = {}
         
     def setup_driver(self):
         options = webdriver.ChromeOptions()
@@ -40,69 +141,123 @@ class SUNATScraper:
         options.add_experimental_option("excludeSwitches", ["enable-automation"])
         options.add_experimental_option('useAutomationExtension', False)
         
-        service = Service(ChromeDriverManager().install())
-        self.driver = webdriver.Chrome(service=service, options=options)
+        with tramo('driver_inicio'):
+            service = Service(ruta_chromedriver())
+            self.driver = webdriver.Chrome(service=service, options=options)
         
+        self._bloqueo_pestanas = {}
+        self._aplicar_bloqueo()
+
+    def _aplicar_bloqueo(self):
+        """Aplica la política de bloqueo a la pestaña actual y registra si quedó activa"""
+        try:
+            activo = self.bloqueo.aplicar(self.driver)
+        except Exception as e:
+            log.warning("No se pudo aplicar el bloqueo de recursos: %s", e)
+            activo = False
+        self._bloqueo_pestanas[self.driver.current_window_handle] = activo
+        return activo
+
+    def abrir_pestana(self):
+        """Abre una pestaña nueva, cambia a ella y le aplica el bloqueo de recursos"""
+        self.driver.switch_to.new_window('tab')
+        self._aplicar_bloqueo()
+        return self.driver.current_window_handle
+
+    def cerrar_pestana(self, handle):
+        """Cierra la pestaña indicada (deja el driver sin pestaña activa)"""
+        self._bloqueo_pestanas.pop(handle, None)
+        self.driver.switch_to.window(handle)
+        self.driver.close()
+
+    def bloqueo_en_pestana(self):
+        """True si la pestaña actual tiene el bloqueo de recursos aplicado"""
+        try:
+            return self._bloqueo_pestanas.get(self.driver.current_window_handle, False)
+        except Exception:
+            return False
+
     def consultar_ruc(self, numero_ruc):
      
         try:
-            print(f"Navegando a SUNAT...")
-            self.driver.get(self.url)
-            
-            wait = WebDriverWait(self.driver, 10)
-            input_ruc = wait.until(
-                EC.presence_of_element_located((By.ID, "txtRuc"))
+            log.debug("Navegando a SUNAT...")
+            wait = WebDriverWait(
+                self.driver, self.esperas.timeout('busqueda'), poll_frequency=self.esperas.intervalo
             )
+            with tramo('navegacion'):
+                limitador_sunat.esperar_turno()
+                self.driver.get(self.url)
+                input_ruc = wait.until(
+                    EC.presence_of_element_located((By.ID, "txtRuc"))
+                )
             
             
-            print(f"Consultando RUC: {numero_ruc}")
-            input_ruc.clear()
-            time.sleep(0.5) 
-            input_ruc.send_keys(numero_ruc)
-            time.sleep(1) 
-            
-            btn_buscar = wait.until(
-                EC.element_to_be_clickable((By.ID, "btnAceptar"))
-            )
-            btn_buscar.click()
-            
-            try:
-                WebDriverWait(self.driver, 10).until(
-                    lambda driver: "jcrS00Alias" in driver.current_url or 
-                    len(driver.find_elements(By.XPATH, "//td[contains(text(), 'RUC')]")) > 0
+            log.info("Consultando RUC: %s", numero_ruc)
+            with tramo('busqueda'):
+                input_ruc.clear()
+                input_ruc.send_keys(numero_ruc)
+                
+                btn_buscar = wait.until(
+                    EC.element_to_be_clickable((By.ID, "btnAceptar"))
                 )
-            except TimeoutException:
+                limitador_sunat.esperar_turno()
+                btn_buscar.click()
+                
                 try:
-                    alert = self.driver.switch_to.alert
-                    print(f"Alerta detectada: {alert.text}")
-                    alert.accept()
-                    return None
-                except:
-                    pass
-            
-            time.sleep(1)
+                    WebDriverWait(
+                        self.driver, self.esperas.timeout('busqueda'), poll_frequency=self.esperas.intervalo
+                    ).until(
+                        lambda driver: "jcrS00Alias" in driver.current_url or 
+                        len(driver.find_elements(By.XPATH, "//td[contains(text(), 'RUC')]")) > 0
+                    )
+                except TimeoutException:
+                    try:
+                        alert = self.driver.switch_to.alert
+                        log.warning("Alerta detectada: %s", alert.text)
+                        alert.accept()
+                        limitador_sunat.congestion("alerta en la búsqueda")
+                        return None
+                    except:
+                        pass
             
-            datos = self.extraer_datos()
+            with tramo('extraccion_base'):
+                self.esperas.esperar_seccion(
+                    self.driver, 'busqueda',
+                    localizador=(By.XPATH, "//h4[contains(text(), 'Número de RUC:')]")
+                )
+                
+                datos = self.extraer_datos()
             
             if datos:
                 datos['ruc'] = numero_ruc
                 datos['fecha_consulta'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                print(f" Datos extraídos exitosamente para RUC {numero_ruc}")
+                log.info("Datos extraídos exitosamente para RUC %s", numero_ruc)
                 return datos
             else:
-                print(f"No se encontraron datos para el RUC {numero_ruc}")
+                log.info("No se encontraron datos para el RUC %s", numero_ruc)
                 return None
                 
         except TimeoutException:
-            print(f"Error: Tiempo de espera agotado al consultar RUC {numero_ruc}")
+            log.warning("Error: Tiempo de espera agotado al consultar RUC %s", numero_ruc)
+            limitador_sunat.congestion("timeout en la búsqueda")
+            artefactos.capturar(self.driver, 'busqueda', numero_ruc, fallo=True)
             return None
         except Exception as e:
-            print(f"Error al consultar RUC {numero_ruc}: {str(e)}")
+            log.warning("Error al consultar RUC %s: %s", numero_ruc, e)
+            artefactos.capturar(self.driver, 'busqueda', numero_ruc, fallo=True)
             return None
             
+    def _parsear_snapshot(self, parser):
+        """Aplica un parser de parsers.py sobre el HTML actual del driver (una sola llamada)"""
+        metricas_red.medir(self.driver, self.bloqueo_en_pestana())
+        return parser(self.driver.page_source)
+
     def extraer_datos(self):
       
         try:
+            if self.modo_extraccion == "snapshot":
+                return self._parsear_snapshot(parsers.parsear_datos_basicos)
+            
             datos = {}
             
             def extraer_campo(label_text):
@@ -206,42 +361,39 @@ class SUNATScraper:
             return datos if datos else None
             
         except Exception as e:
-            print(f"Error al extraer datos: {str(e)}")
-            import traceback
-            traceback.print_exc()
+            log.warning("Error al extraer datos: %s", e)
+            log.debug("Traza del error", exc_info=True)
             return None
     
     def extraer_cantidad_trabajadores(self, numero_ruc, razon_social):
         try:
-            print("\n" + "="*60)
-            print("Consultando cantidad de trabajadores...")
-            print("="*60)
+            log.info("Consultando cantidad de trabajadores...")
+            
+            pagina_anterior = Esperas.marcar_pagina(self.driver)
+            limitador_sunat.esperar_turno()
             
             try:
                 # Esperar a que el botón esté presente en el DOM
-                wait = WebDriverWait(self.driver, 10)
+                wait = self.esperas.espera_contenido(self.driver)
                 boton = wait.until(
                     EC.presence_of_element_located((By.CLASS_NAME, "btnInfNumTra"))
                 )
-                print("✓ Botón encontrado en la página")
+                log.debug("Botón encontrado en la página")
                 
                 # Hacer scroll hacia el botón para asegurar que sea visible
-                self.driver.execute_script("arguments[0].scrollIntoView({behavior: 'smooth', block: 'center'});", boton)
-                time.sleep(1)
+                self.driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", boton)
                 
                 # Intentar esperar a que sea clickeable
                 try:
                     boton = wait.until(EC.element_to_be_clickable((By.CLASS_NAME, "btnInfNumTra")))
-                    print("✓ Haciendo clic en el botón...")
+                    log.debug("Haciendo clic en el botón...")
                     boton.click()
-                    time.sleep(3)
                 except TimeoutException:
-                    print("⚠ Botón no clickeable, usando JavaScript...")
+                    log.debug("Botón no clickeable, usando JavaScript...")
                     self.driver.execute_script("arguments[0].click();", boton)
-                    time.sleep(3)
                     
             except (NoSuchElementException, TimeoutException):
-                print("ℹ Botón no encontrado o no visible, intentando envío directo del formulario...")
+                log.debug("Botón no encontrado o no visible, intentando envío directo del formulario...")
                 
                 script = f"""
                 var form = document.createElement('form');
@@ -269,16 +421,23 @@ class SUNATScraper:
                 """
                 
                 self.driver.execute_script(script)
-                time.sleep(3)
             
-            try:
-                screenshot_path = f"/tmp/sunat_trabajadores_{numero_ruc}.png"
-                self.driver.save_screenshot(screenshot_path)
-                print(f"Screenshot guardado en: {screenshot_path}")
-            except:
-                pass
+            self.esperas.esperar_seccion(
+                self.driver, 'cantidad_trabajadores', pagina_anterior,
+                (By.XPATH, "//table[@class='table']")
+            )
+            
+            artefactos.capturar(self.driver, 'cantidad_trabajadores', numero_ruc)
             
-            print(f"URL actual: {self.driver.current_url}")
+            log.debug("URL actual: %s", self.driver.current_url)
+            
+            if self.modo_extraccion == "snapshot":
+                datos_trabajadores = self._parsear_snapshot(parsers.parsear_cantidad_trabajadores)
+                if datos_trabajadores:
+                    log.info("Extraídos %s períodos de datos", len(datos_trabajadores))
+                else:
+                    log.info("No se encontraron datos de trabajadores")
+                return datos_trabajadores
             
             datos_trabajadores = []
             
@@ -293,10 +452,10 @@ class SUNATScraper:
                     if texto:
                         encabezados.append(texto)
                 
-                print(f"Encabezados encontrados: {encabezados}")
+                log.debug("Encabezados encontrados: %s", encabezados)
                 
                 filas = tabla.find_elements(By.XPATH, ".//tbody//tr")
-                print(f"Encontradas {len(filas)} filas de datos")
+                log.debug("Encontradas %s filas de datos", len(filas))
                 
                 for fila in filas:
                     celdas = fila.find_elements(By.TAG_NAME, "td")
@@ -315,61 +474,61 @@ class SUNATScraper:
                         }
                         
                         datos_trabajadores.append(registro)
-                        print(f"   {periodo}: {trabajadores} trabajadores, {pensionistas} pensionistas, {prestadores} prestadores")
+                        log.debug("%s: %s trabajadores, %s pensionistas, %s prestadores", periodo, trabajadores, pensionistas, prestadores)
                 
                 if datos_trabajadores:
-                    print(f"\nExtraídos {len(datos_trabajadores)} períodos de datos")
+                    log.info("Extraídos %s períodos de datos", len(datos_trabajadores))
                     return datos_trabajadores
                 else:
-                    print("No se encontraron datos en la tabla")
+                    log.info("No se encontraron datos en la tabla")
                     return None
                     
             except NoSuchElementException:
-                print("No se encontró la tabla de trabajadores")
+                log.info("No se encontró la tabla de trabajadores")
                 return None
             except Exception as e:
-                print(f"Error al extraer datos de trabajadores: {str(e)}")
-                import traceback
-                traceback.print_exc()
+                log.warning("Error al extraer datos de trabajadores: %s", e)
+                marcar_error_seccion()
+                log.debug("Traza del error", exc_info=True)
                 return None
                 
         except Exception as e:
-            print(f"Error al consultar cantidad de trabajadores: {str(e)}")
+            log.warning("Error al consultar cantidad de trabajadores: %s", e)
+            marcar_error_seccion()
+            artefactos.capturar(self.driver, 'cantidad_trabajadores', numero_ruc, fallo=True)
             return None
 
     
     def extraer_representantes_legales(self, numero_ruc, razon_social):
         """Extrae los representantes legales de la empresa"""
         try:
-            print("\n" + "="*60)
-            print("Consultando representantes legales...")
-            print("="*60)
+            log.info("Consultando representantes legales...")
+            
+            pagina_anterior = Esperas.marcar_pagina(self.driver)
+            limitador_sunat.esperar_turno()
             
             try:
                 # Esperar a que el botón esté presente en el DOM
-                wait = WebDriverWait(self.driver, 10)
+                wait = self.esperas.espera_contenido(self.driver)
                 boton = wait.until(
                     EC.presence_of_element_located((By.CLASS_NAME, "btnInfRepLeg"))
                 )
-                print("✓ Botón encontrado en la página")
+                log.debug("Botón encontrado en la página")
                 
                 # Hacer scroll hacia el botón para asegurar que sea visible
-                self.driver.execute_script("arguments[0].scrollIntoView({behavior: 'smooth', block: 'center'});", boton)
-                time.sleep(1)
+                self.driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", boton)
                 
                 # Intentar esperar a que sea clickeable
                 try:
                     boton = wait.until(EC.element_to_be_clickable((By.CLASS_NAME, "btnInfRepLeg")))
-                    print("✓ Haciendo clic en el botón...")
+                    log.debug("Haciendo clic en el botón...")
                     boton.click()
-                    time.sleep(3)
                 except TimeoutException:
-                    print("⚠ Botón no clickeable, usando JavaScript...")
+                    log.debug("Botón no clickeable, usando JavaScript...")
                     self.driver.execute_script("arguments[0].click();", boton)
-                    time.sleep(3)
                     
             except (NoSuchElementException, TimeoutException):
-                print("ℹ Botón no encontrado o no visible, intentando envío directo del formulario...")
+                log.debug("Botón no encontrado o no visible, intentando envío directo del formulario...")
                 
                 script = f"""
                 var form = document.createElement('form');
@@ -397,16 +556,23 @@ class SUNATScraper:
                 """
                 
                 self.driver.execute_script(script)
-                time.sleep(3)
             
-            try:
-                screenshot_path = f"/tmp/sunat_representantes_{numero_ruc}.png"
-                self.driver.save_screenshot(screenshot_path)
-                print(f"Screenshot guardado en: {screenshot_path}")
-            except:
-                pass
+            self.esperas.esperar_seccion(
+                self.driver, 'representantes_legales', pagina_anterior,
+                (By.XPATH, "//table[@class='table']")
+            )
+            
+            artefactos.capturar(self.driver, 'representantes_legales', numero_ruc)
+            
+            log.debug("URL actual: %s", self.driver.current_url)
             
-            print(f"URL actual: {self.driver.current_url}")
+            if self.modo_extraccion == "snapshot":
+                datos_representantes = self._parsear_snapshot(parsers.parsear_representantes_legales)
+                if datos_representantes:
+                    log.info("Extraídos %s representantes legales", len(datos_representantes))
+                else:
+                    log.info("No se encontraron representantes legales")
+                return datos_representantes
             
             datos_representantes = []
             
@@ -420,10 +586,10 @@ class SUNATScraper:
                     if texto:
                         encabezados.append(texto)
                 
-                print(f"Encabezados encontrados: {encabezados}")
+                log.debug("Encabezados encontrados: %s", encabezados)
                 
                 filas = tabla.find_elements(By.XPATH, ".//tbody//tr")
-                print(f"Encontradas {len(filas)} representantes legales")
+                log.debug("Encontradas %s representantes legales", len(filas))
                 
                 for fila in filas:
                     celdas = fila.find_elements(By.TAG_NAME, "td")
@@ -444,62 +610,62 @@ class SUNATScraper:
                         }
                         
                         datos_representantes.append(representante)
-                        print(f"   {nombre} - {cargo} (desde {fecha_desde})")
+                        log.debug("%s - %s (desde %s)", nombre, cargo, fecha_desde)
                 
                 if datos_representantes:
-                    print(f"\nExtraídos {len(datos_representantes)} representantes legales")
+                    log.info("Extraídos %s representantes legales", len(datos_representantes))
                     return datos_representantes
                 else:
-                    print("No se encontraron representantes legales")
+                    log.info("No se encontraron representantes legales")
                     return None
                     
             except NoSuchElementException:
-                print("No se encontró la tabla de representantes legales")
+                log.info("No se encontró la tabla de representantes legales")
                 return None
             except Exception as e:
-                print(f"Error al extraer representantes legales: {str(e)}")
-                import traceback
-                traceback.print_exc()
+                log.warning("Error al extraer representantes legales: %s", e)
+                marcar_error_seccion()
+                log.debug("Traza del error", exc_info=True)
                 return None
                 
         except Exception as e:
-            print(f"Error al consultar representantes legales: {str(e)}")
+            log.warning("Error al consultar representantes legales: %s", e)
+            marcar_error_seccion()
+            artefactos.capturar(self.driver, 'representantes_legales', numero_ruc, fallo=True)
             return None
 
     
     def extraer_informacion_historica(self, numero_ruc, razon_social):
         """Extrae la información histórica de la empresa"""
         try:
-            print("\n" + "="*60)
-            print("Consultando información histórica...")
-            print("="*60)
+            log.info("Consultando información histórica...")
+            
+            pagina_anterior = Esperas.marcar_pagina(self.driver)
+            limitador_sunat.esperar_turno()
             
             # Intentar hacer clic en el botón de información histórica
             try:
                 # Esperar a que el botón esté presente en el DOM
-                wait = WebDriverWait(self.driver, 10)
+                wait = self.esperas.espera_contenido(self.driver)
                 boton = wait.until(
                     EC.presence_of_element_located((By.CLASS_NAME, "btnInfHis"))
                 )
-                print("✓ Botón encontrado en la página")
+                log.debug("Botón encontrado en la página")
                 
                 # Hacer scroll hacia el botón para asegurar que sea visible
-                self.driver.execute_script("arguments[0].scrollIntoView({behavior: 'smooth', block: 'center'});", boton)
-                time.sleep(1)
+                self.driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", boton)
                 
                 # Intentar esperar a que sea clickeable
                 try:
                     boton = wait.until(EC.element_to_be_clickable((By.CLASS_NAME, "btnInfHis")))
-                    print("✓ Haciendo clic en el botón...")
+                    log.debug("Haciendo clic en el botón...")
                     boton.click()
-                    time.sleep(5)
                 except TimeoutException:
-                    print("⚠ Botón no clickeable, usando JavaScript...")
+                    log.debug("Botón no clickeable, usando JavaScript...")
                     self.driver.execute_script("arguments[0].click();", boton)
-                    time.sleep(5)
                     
             except (NoSuchElementException, TimeoutException):
-                print("ℹ Botón no encontrado o no visible, intentando envío directo del formulario...")
+                log.debug("Botón no encontrado o no visible, intentando envío directo del formulario...")
                 
                 # Envío directo del formulario usando JavaScript
                 script = f"""
@@ -528,26 +694,38 @@ class SUNATScraper:
                 """
                 
                 self.driver.execute_script(script)
-                time.sleep(6)  # Aumentado a 6 segundos
             
-            print(f"URL actual: {self.driver.current_url}")
+            self.esperas.esperar_seccion(
+                self.driver, 'informacion_historica', pagina_anterior,
+                (By.XPATH, "//div[contains(@class, 'panel-primary')]")
+            )
+            
+            log.debug("URL actual: %s", self.driver.current_url)
             
             # Esperar a que la página cargue completamente - intentar esperar por el panel
             try:
-                wait = WebDriverWait(self.driver, 15)
+                wait = self.esperas.espera_contenido(self.driver)
                 # Esperar por el div que contiene los resultados
                 wait.until(
                     EC.presence_of_element_located((By.CLASS_NAME, "panel-primary"))
                 )
-                print("✓ Panel de resultados detectado")
-                time.sleep(3)  # Espera adicional para que las tablas se rendericen
+                log.debug("Panel de resultados detectado")
             except TimeoutException:
-                print("⚠ Timeout esperando el panel de resultados")
+                log.warning("Timeout esperando el panel de resultados")
+            
+            if self.modo_extraccion == "snapshot":
+                informacion_historica = self._parsear_snapshot(parsers.parsear_informacion_historica)
+                if informacion_historica:
+                    total_registros = sum(len(v) for v in informacion_historica.values())
+                    log.info("Extraídos %s registros históricos en total", total_registros)
+                else:
+                    log.info("No se encontraron datos históricos en las tablas")
+                return informacion_historica
             
             # Intentar obtener el HTML para debug
             try:
                 page_title = self.driver.find_element(By.TAG_NAME, "h3").text
-                print(f"Título de página: {page_title}")
+                log.debug("Título de página: %s", page_title)
             except:
                 pass
             
@@ -560,44 +738,44 @@ class SUNATScraper:
             try:
                 # Estrategia 1: Buscar tablas dentro del panel
                 tablas = self.driver.find_elements(By.XPATH, "//div[@class='panel panel-primary']//table[@class='table']")
-                print(f"Estrategia 1 (panel + table): {len(tablas)} tablas encontradas")
+                log.debug("Estrategia 1 (panel + table): %s tablas encontradas", len(tablas))
                 
                 # Estrategia 2: Buscar tablas con class='table'
                 if len(tablas) == 0:
                     tablas = self.driver.find_elements(By.XPATH, "//table[@class='table']")
-                    print(f"Estrategia 2 (table.table): {len(tablas)} tablas encontradas")
+                    log.debug("Estrategia 2 (table.table): %s tablas encontradas", len(tablas))
                 
                 # Estrategia 3: Buscar cualquier tabla en el container
                 if len(tablas) == 0:
                     tablas = self.driver.find_elements(By.XPATH, "//div[@class='table-responsive']//table")
-                    print(f"Estrategia 3 (table-responsive): {len(tablas)} tablas encontradas")
+                    log.debug("Estrategia 3 (table-responsive): %s tablas encontradas", len(tablas))
                 
                 # Estrategia 4: Buscar todas las tablas
                 if len(tablas) == 0:
                     tablas = self.driver.find_elements(By.TAG_NAME, "table")
-                    print(f"Estrategia 4 (todas las tablas): {len(tablas)} tablas encontradas")
+                    log.debug("Estrategia 4 (todas las tablas): %s tablas encontradas", len(tablas))
                 
-                if len(tablas) == 0:
-                    # Debug: Obtener el HTML de la página
-                    print("\n⚠ DEBUG: No se encontraron tablas. Analizando HTML...")
+                if len(tablas) == 0 and log.isEnabledFor(logging.DEBUG):
+                    # Debug: analizar el HTML de la página (varias llamadas a chromedriver, solo en DEBUG)
+                    log.debug("No se encontraron tablas. Analizando HTML...")
                     try:
                         # Verificar si hay contenido en el panel
                         panels = self.driver.find_elements(By.CLASS_NAME, "panel")
-                        print(f"   Paneles encontrados: {len(panels)}")
+                        log.debug("Paneles encontrados: %s", len(panels))
                         
                         # Verificar divs con table-responsive
                         responsive_divs = self.driver.find_elements(By.CLASS_NAME, "table-responsive")
-                        print(f"   Divs table-responsive: {len(responsive_divs)}")
+                        log.debug("Divs table-responsive: %s", len(responsive_divs))
                         
                         # Intentar obtener el contenido del body
                         body_text = self.driver.find_element(By.TAG_NAME, "body").text
                         if "INFORMACION HISTORICA" in body_text.upper():
-                            print("   ✓ La página contiene texto de información histórica")
+                            log.debug("La página contiene texto de información histórica")
                         else:
-                            print("   ✗ La página NO contiene texto esperado")
-                            print(f"   Primeros 500 caracteres: {body_text[:500]}")
+                            log.debug("La página NO contiene texto esperado")
+                            log.debug("Primeros 500 caracteres: %s", body_text[:500])
                     except Exception as debug_e:
-                        print(f"   Error en debug: {debug_e}")
+                        log.debug("Error en debug: %s", debug_e)
                 
                 # Procesar cada tabla encontrada
                 for idx, tabla in enumerate(tablas):
@@ -605,17 +783,17 @@ class SUNATScraper:
                         # Obtener encabezados para identificar la tabla
                         headers = tabla.find_elements(By.XPATH, ".//thead//th")
                         header_texts = [h.text.strip() for h in headers]
-                        print(f"\nTabla {idx+1} - Encabezados: {header_texts}")
+                        log.debug("Tabla %s - Encabezados: %s", idx + 1, header_texts)
                         
                         filas = tabla.find_elements(By.XPATH, ".//tbody//tr")
-                        print(f"   Filas en tbody: {len(filas)}")
+                        log.debug("Filas en tbody: %s", len(filas))
                         
                         # Identificar tipo de tabla por sus encabezados
                         if len(header_texts) >= 2:
                             # Tabla de nombres anteriores o direcciones (2 columnas)
                             if "Nombre" in str(header_texts) or "Razón Social" in str(header_texts):
                                 # Primera tabla: Nombres
-                                print(f"   → Identificada como tabla de Razón Social Anteriores")
+                                log.debug("Identificada como tabla de Razón Social Anteriores")
                                 for fila in filas:
                                     celdas = fila.find_elements(By.TAG_NAME, "td")
                                     if len(celdas) >= 2:
@@ -628,11 +806,11 @@ class SUNATScraper:
                                                 'fecha_baja': fecha_baja
                                             }
                                             informacion_historica['razon_social_anteriores'].append(registro)
-                                            print(f"      {razon_social_ant} - Baja: {fecha_baja}")
+                                            log.debug("%s - Baja: %s", razon_social_ant, fecha_baja)
                             
                             elif "Direcci" in str(header_texts) or "Domicilio" in str(header_texts):
                                 # Tabla de direcciones
-                                print(f"   → Identificada como tabla de Direcciones")
+                                log.debug("Identificada como tabla de Direcciones")
                                 for fila in filas:
                                     celdas = fila.find_elements(By.TAG_NAME, "td")
                                     if len(celdas) >= 2:
@@ -645,12 +823,12 @@ class SUNATScraper:
                                                 'fecha_baja': fecha_baja
                                             }
                                             informacion_historica['direccion_anteriores'].append(registro)
-                                            print(f"      {direccion} - Baja: {fecha_baja}")
+                                            log.debug("%s - Baja: %s", direccion, fecha_baja)
                             
                             # Tabla de condición del contribuyente (3 columnas)
                             elif len(header_texts) == 3 and ("Condici" in str(header_texts) or 
                                                              "Fecha Desde" in str(header_texts)):
-                                print(f"   → Identificada como tabla de Condición del Contribuyente")
+                                log.debug("Identificada como tabla de Condición del Contribuyente")
                                 for fila in filas:
                                     celdas = fila.find_elements(By.TAG_NAME, "td")
                                     if len(celdas) >= 3:
@@ -665,11 +843,11 @@ class SUNATScraper:
                                                 'fecha_hasta': fecha_hasta
                                             }
                                             informacion_historica['condicion_anteriores'].append(registro)
-                                            print(f"      {condicion}: {fecha_desde} → {fecha_hasta}")
+                                            log.debug("%s: %s → %s", condicion, fecha_desde, fecha_hasta)
                             
                             elif len(header_texts) == 2 and len(filas) > 0:
                                 # Tabla genérica de 2 columnas - identificar por posición
-                                print(f"   → Tabla genérica de 2 columnas (índice {idx})")
+                                log.debug("Tabla genérica de 2 columnas (índice %s)", idx)
                                 primer_header = header_texts[0].lower()
                                 
                                 # Determinar tipo por el primer encabezado o posición
@@ -711,7 +889,7 @@ class SUNATScraper:
                                                     informacion_historica['direccion_anteriores'].append(registro)
                                 
                     except Exception as e:
-                        print(f"   ⚠ Error procesando tabla {idx+1}: {str(e)}")
+                        log.debug("Error procesando tabla %s: %s", idx + 1, e)
                         continue
                 
                 # Verificar si se obtuvo al menos algún dato
@@ -722,28 +900,29 @@ class SUNATScraper:
                 )
                 
                 if total_registros > 0:
-                    print(f"\n✓ Extraídos {total_registros} registros históricos en total")
-                    print(f"   - Razones sociales: {len(informacion_historica['razon_social_anteriores'])}")
-                    print(f"   - Condiciones: {len(informacion_historica['condicion_anteriores'])}")
-                    print(f"   - Direcciones: {len(informacion_historica['direccion_anteriores'])}")
+                    log.info("Extraídos %s registros históricos en total", total_registros)
+                    log.debug("- Razones sociales: %s", len(informacion_historica['razon_social_anteriores']))
+                    log.debug("- Condiciones: %s", len(informacion_historica['condicion_anteriores']))
+                    log.debug("- Direcciones: %s", len(informacion_historica['direccion_anteriores']))
                     return informacion_historica
                 else:
-                    print("ℹ No se encontraron datos históricos en las tablas")
+                    log.info("No se encontraron datos históricos en las tablas")
                     return None
                     
             except NoSuchElementException:
-                print("✗ No se encontraron tablas de información histórica")
+                log.info("No se encontraron tablas de información histórica")
                 return None
             except Exception as e:
-                print(f"Error al extraer información histórica: {str(e)}")
-                import traceback
-                traceback.print_exc()
+                log.warning("Error al extraer información histórica: %s", e)
+                marcar_error_seccion()
+                log.debug("Traza del error", exc_info=True)
                 return None
                 
         except Exception as e:
-            print(f"Error al consultar información histórica: {str(e)}")
-            import traceback
-            traceback.print_exc()
+            log.warning("Error al consultar información histórica: %s", e)
+            marcar_error_seccion()
+            artefactos.capturar(self.driver, 'informacion_historica', numero_ruc, fallo=True)
+            log.debug("Traza del error", exc_info=True)
             return None
 
     
@@ -761,36 +940,34 @@ class SUNATScraper:
             - None si hay error en la extracción
         """
         try:
-            print("\n" + "="*60)
-            print("Consultando deuda coactiva...")
-            print("="*60)
+            log.info("Consultando deuda coactiva...")
+            
+            pagina_anterior = Esperas.marcar_pagina(self.driver)
+            limitador_sunat.esperar_turno()
             
             # Intentar hacer clic en el botón
             try:
                 # Esperar a que el botón esté presente en el DOM
-                wait = WebDriverWait(self.driver, 10)
+                wait = self.esperas.espera_contenido(self.driver)
                 boton = wait.until(
                     EC.presence_of_element_located((By.CLASS_NAME, "btnInfDeuCoa"))
                 )
-                print("✓ Botón encontrado en la página")
+                log.debug("Botón encontrado en la página")
                 
                 # Hacer scroll hacia el botón para asegurar que sea visible
-                self.driver.execute_script("arguments[0].scrollIntoView({behavior: 'smooth', block: 'center'});", boton)
-                time.sleep(1)
+                self.driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", boton)
                 
                 # Intentar esperar a que sea clickeable
                 try:
                     boton = wait.until(EC.element_to_be_clickable((By.CLASS_NAME, "btnInfDeuCoa")))
-                    print("✓ Haciendo clic en el botón...")
+                    log.debug("Haciendo clic en el botón...")
                     boton.click()
-                    time.sleep(3)
                 except TimeoutException:
-                    print("⚠ Botón no clickeable, usando JavaScript...")
+                    log.debug("Botón no clickeable, usando JavaScript...")
                     self.driver.execute_script("arguments[0].click();", boton)
-                    time.sleep(3)
                     
             except (NoSuchElementException, TimeoutException):
-                print("ℹ Botón no encontrado o no visible, intentando envío directo del formulario...")
+                log.debug("Botón no encontrado o no visible, intentando envío directo del formulario...")
                 
                 # Enviar formulario directamente con JavaScript
                 script = f"""
@@ -818,15 +995,26 @@ class SUNATScraper:
                 form.submit();
                 """
                 self.driver.execute_script(script)
-                time.sleep(3)
+            
+            self.esperas.esperar_seccion(
+                self.driver, 'deuda_coactiva', pagina_anterior,
+                (By.XPATH, "//div[contains(@class, 'panel-primary')]")
+            )
             
             # Esperar a que cargue la página de deuda coactiva
             try:
-                wait = WebDriverWait(self.driver, 10)
+                wait = self.esperas.espera_contenido(self.driver)
                 wait.until(EC.presence_of_element_located((By.CLASS_NAME, "panel-primary")))
-                time.sleep(2)
                 
-                print(f"\n📍 URL actual: {self.driver.current_url}")
+                log.debug("URL actual: %s", self.driver.current_url)
+                
+                if self.modo_extraccion == "snapshot":
+                    deuda_coactiva = self._parsear_snapshot(parsers.parsear_deuda_coactiva)
+                    if isinstance(deuda_coactiva, list):
+                        log.info("Extraídos %s registros de deuda coactiva", len(deuda_coactiva))
+                    else:
+                        log.info("%s", deuda_coactiva['mensaje'])
+                    return deuda_coactiva
                 
                 # Buscar la tabla de deuda coactiva
                 deuda_coactiva = []
@@ -839,21 +1027,21 @@ class SUNATScraper:
                         # Intentar con selector más general
                         tablas = self.driver.find_elements(By.TAG_NAME, "table")
                     
-                    print(f"\n🔍 Encontradas {len(tablas)} tablas en la página")
+                    log.debug("Encontradas %s tablas en la página", len(tablas))
                     
                     for idx, tabla in enumerate(tablas):
-                        print(f"\n📊 Procesando tabla {idx + 1}...")
+                        log.debug("Procesando tabla %s...", idx + 1)
                         
                         try:
                             # Buscar encabezados
                             headers = tabla.find_elements(By.TAG_NAME, "th")
                             header_texts = [h.text.strip() for h in headers]
                             
-                            print(f"   Encabezados: {header_texts}")
+                            log.debug("Encabezados: %s", header_texts)
                             
                             # Verificar si es la tabla de deuda (tiene 4 columnas específicas)
                             if len(header_texts) >= 4 and any("Monto" in h for h in header_texts):
-                                print(f"   → Identificada como tabla de Deuda Coactiva")
+                                log.debug("Identificada como tabla de Deuda Coactiva")
                                 
                                 # Extraer filas
                                 filas = tabla.find_elements(By.TAG_NAME, "tbody")
@@ -862,7 +1050,7 @@ class SUNATScraper:
                                 else:
                                     filas = tabla.find_elements(By.TAG_NAME, "tr")[1:]  # Skip header
                                 
-                                print(f"   Filas encontradas: {len(filas)}")
+                                log.debug("Filas encontradas: %s", len(filas))
                                 
                                 for fila in filas:
                                     celdas = fila.find_elements(By.TAG_NAME, "td")
@@ -881,14 +1069,14 @@ class SUNATScraper:
                                                 'entidad': entidad
                                             }
                                             deuda_coactiva.append(registro)
-                                            print(f"      {periodo}: S/ {monto} - {entidad}")
+                                            log.debug("%s: S/ %s - %s", periodo, monto, entidad)
                         
                         except Exception as e:
-                            print(f"   ⚠ Error procesando tabla {idx + 1}: {str(e)}")
+                            log.debug("Error procesando tabla %s: %s", idx + 1, e)
                             continue
                     
                     if len(deuda_coactiva) > 0:
-                        print(f"\n✓ Extraídos {len(deuda_coactiva)} registros de deuda coactiva")
+                        log.info("Extraídos %s registros de deuda coactiva", len(deuda_coactiva))
                         return deuda_coactiva
                     else:
                         # Buscar el mensaje cuando no hay deuda
@@ -897,7 +1085,7 @@ class SUNATScraper:
                             mensaje = mensaje_elemento.text.strip()
                             
                             if mensaje:
-                                print(f"ℹ Mensaje encontrado: {mensaje}")
+                                log.debug("Mensaje encontrado: %s", mensaje)
                                 return {
                                     'tiene_deuda': False,
                                     'mensaje': mensaje
@@ -905,29 +1093,31 @@ class SUNATScraper:
                         except NoSuchElementException:
                             pass
                         
-                        print("ℹ No se encontró deuda coactiva registrada")
+                        log.info("No se encontró deuda coactiva registrada")
                         return {
                             'tiene_deuda': False,
                             'mensaje': 'No se encontró información de deuda coactiva'
                         }
                         
                 except NoSuchElementException:
-                    print("✗ No se encontraron tablas de deuda coactiva")
+                    log.info("No se encontraron tablas de deuda coactiva")
                     return None
                 except Exception as e:
-                    print(f"Error al extraer deuda coactiva: {str(e)}")
-                    import traceback
-                    traceback.print_exc()
+                    log.warning("Error al extraer deuda coactiva: %s", e)
+                    marcar_error_seccion()
+                    log.debug("Traza del error", exc_info=True)
                     return None
                     
             except Exception as e:
-                print(f"Error esperando la página de deuda coactiva: {str(e)}")
+                log.warning("Error esperando la página de deuda coactiva: %s", e)
+                marcar_error_seccion()
                 return None
                 
         except Exception as e:
-            print(f"Error al consultar deuda coactiva: {str(e)}\")")
-            import traceback
-            traceback.print_exc()
+            log.warning("Error al consultar deuda coactiva: %s", e)
+            marcar_error_seccion()
+            artefactos.capturar(self.driver, 'deuda_coactiva', numero_ruc, fallo=True)
+            log.debug("Traza del error", exc_info=True)
             return None
 
     
@@ -943,36 +1133,34 @@ class SUNATScraper:
             Diccionario con información de Reactiva Perú o None si no aplica
         """
         try:
-            print("\n" + "="*60)
-            print("Consultando Reactiva Perú...")
-            print("="*60)
+            log.info("Consultando Reactiva Perú...")
+            
+            pagina_anterior = Esperas.marcar_pagina(self.driver)
+            limitador_sunat.esperar_turno()
             
             # Intentar hacer clic en el botón
             try:
                 # Esperar a que el botón esté presente en el DOM
-                wait = WebDriverWait(self.driver, 10)
+                wait = self.esperas.espera_contenido(self.driver)
                 boton = wait.until(
                     EC.presence_of_element_located((By.CLASS_NAME, "btnInfReaPer"))
                 )
-                print("✓ Botón encontrado en la página")
+                log.debug("Botón encontrado en la página")
                 
                 # Hacer scroll hacia el botón para asegurar que sea visible
-                self.driver.execute_script("arguments[0].scrollIntoView({behavior: 'smooth', block: 'center'});", boton)
-                time.sleep(1)
+                self.driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", boton)
                 
                 # Intentar esperar a que sea clickeable
                 try:
                     boton = wait.until(EC.element_to_be_clickable((By.CLASS_NAME, "btnInfReaPer")))
-                    print("✓ Haciendo clic en el botón...")
+                    log.debug("Haciendo clic en el botón...")
                     boton.click()
-                    time.sleep(3)
                 except TimeoutException:
-                    print("⚠ Botón no clickeable, usando JavaScript...")
+                    log.debug("Botón no clickeable, usando JavaScript...")
                     self.driver.execute_script("arguments[0].click();", boton)
-                    time.sleep(3)
                     
             except (NoSuchElementException, TimeoutException):
-                print("ℹ Botón no encontrado o no visible, intentando envío directo del formulario...")
+                log.debug("Botón no encontrado o no visible, intentando envío directo del formulario...")
                 
                 # Enviar formulario directamente con JavaScript
                 script = f"""
@@ -1000,15 +1188,26 @@ class SUNATScraper:
                 form.submit();
                 """
                 self.driver.execute_script(script)
-                time.sleep(3)
+            
+            self.esperas.esperar_seccion(
+                self.driver, 'reactiva_peru', pagina_anterior,
+                (By.XPATH, "//div[contains(@class, 'panel-primary')]")
+            )
             
             # Esperar a que cargue la página de Reactiva Perú
             try:
-                wait = WebDriverWait(self.driver, 10)
+                wait = self.esperas.espera_contenido(self.driver)
                 wait.until(EC.presence_of_element_located((By.CLASS_NAME, "panel-primary")))
-                time.sleep(2)
                 
-                print(f"\n📍 URL actual: {self.driver.current_url}")
+                log.debug("URL actual: %s", self.driver.current_url)
+                
+                if self.modo_extraccion == "snapshot":
+                    reactiva_info = self._parsear_snapshot(parsers.parsear_reactiva_peru)
+                    if reactiva_info:
+                        log.info("Información de Reactiva Perú extraída")
+                    else:
+                        log.info("No se encontró información de Reactiva Perú")
+                    return reactiva_info
                 
                 # Extraer información de la página
                 reactiva_info = {}
@@ -1023,9 +1222,9 @@ class SUNATScraper:
                     try:
                         label_element = self.driver.find_element(By.CSS_SELECTOR, "span.label")
                         tiene_deuda = label_element.text.strip()
-                        print(f"   ✓ Estado encontrado: {tiene_deuda}")
+                        log.debug("Estado encontrado: %s", tiene_deuda)
                     except NoSuchElementException:
-                        print("   ⚠ No se encontró el label de estado")
+                        log.debug("No se encontró el label de estado")
                     
                     # Buscar la fecha de actualización
                     try:
@@ -1038,12 +1237,12 @@ class SUNATScraper:
                                 match = re.search(r'(\d{2}/\d{2}/\d{4})', texto)
                                 if match:
                                     fecha_actualizacion = match.group(1)
-                                    print(f"   ✓ Fecha de actualización: {fecha_actualizacion}")
+                                    log.debug("Fecha de actualización: %s", fecha_actualizacion)
                             elif "decreto" in texto.lower():
                                 decreto = texto
-                                print(f"   ✓ Decreto: {decreto}")
+                                log.debug("Decreto: %s", decreto)
                     except Exception as e:
-                        print(f"   ⚠ Error extrayendo detalles: {str(e)}")
+                        log.debug("Error extrayendo detalles: %s", e)
                     
                     if tiene_deuda:
                         reactiva_info = {
@@ -1051,29 +1250,31 @@ class SUNATScraper:
                             'fecha_actualizacion': fecha_actualizacion,
                             'decreto': decreto
                         }
-                        print(f"\n✓ Información de Reactiva Perú extraída")
+                        log.info("Información de Reactiva Perú extraída")
                         return reactiva_info
                     else:
-                        print("ℹ No se encontró información de Reactiva Perú")
+                        log.info("No se encontró información de Reactiva Perú")
                         return None
                         
                 except NoSuchElementException:
-                    print("✗ No se encontró información de Reactiva Perú")
+                    log.info("No se encontró información de Reactiva Perú")
                     return None
                 except Exception as e:
-                    print(f"Error al extraer Reactiva Perú: {str(e)}")
-                    import traceback
-                    traceback.print_exc()
+                    log.warning("Error al extraer Reactiva Perú: %s", e)
+                    marcar_error_seccion()
+                    log.debug("Traza del error", exc_info=True)
                     return None
                     
             except Exception as e:
-                print(f"Error esperando la página de Reactiva Perú: {str(e)}")
+                log.warning("Error esperando la página de Reactiva Perú: %s", e)
+                marcar_error_seccion()
                 return None
                 
         except Exception as e:
-            print(f"Error al consultar Reactiva Perú: {str(e)}")
-            import traceback
-            traceback.print_exc()
+            log.warning("Error al consultar Reactiva Perú: %s", e)
+            marcar_error_seccion()
+            artefactos.capturar(self.driver, 'reactiva_peru', numero_ruc, fallo=True)
+            log.debug("Traza del error", exc_info=True)
             return None
 
     
@@ -1089,37 +1290,35 @@ class SUNATScraper:
             Diccionario con información del programa COVID-19 o None si no aplica
         """
         try:
-            print("\n" + "="*60)
-            print("Consultando Programa de Garantías COVID-19...")
-            print("="*60)
+            log.info("Consultando Programa de Garantías COVID-19...")
+            
+            pagina_anterior = Esperas.marcar_pagina(self.driver)
+            limitador_sunat.esperar_turno()
             
             # Intentar hacer clic en el botón
             try:
                 # Esperar a que el botón esté presente en el DOM
-                wait = WebDriverWait(self.driver, 10)
+                wait = self.esperas.espera_contenido(self.driver)
                 boton = wait.until(
                     EC.presence_of_element_located((By.CLASS_NAME, "btnInfCovid"))
                 )
-                print("✓ Botón encontrado en la página")
+                log.debug("Botón encontrado en la página")
                 
                 # Hacer scroll hacia el botón para asegurar que sea visible
-                self.driver.execute_script("arguments[0].scrollIntoView({behavior: 'smooth', block: 'center'});", boton)
-                time.sleep(1)
+                self.driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", boton)
                 
                 # Intentar esperar a que sea clickeable
                 try:
                     boton = wait.until(EC.element_to_be_clickable((By.CLASS_NAME, "btnInfCovid")))
-                    print("✓ Haciendo clic en el botón...")
+                    log.debug("Haciendo clic en el botón...")
                     boton.click()
-                    time.sleep(3)
                 except TimeoutException:
-                    print("⚠ Botón no clickeable, usando JavaScript...")
+                    log.debug("Botón no clickeable, usando JavaScript...")
                     # Si no es clickeable, hacer clic con JavaScript
                     self.driver.execute_script("arguments[0].click();", boton)
-                    time.sleep(3)
                     
             except (NoSuchElementException, TimeoutException):
-                print("ℹ Botón no encontrado o no visible, intentando envío directo del formulario...")
+                log.debug("Botón no encontrado o no visible, intentando envío directo del formulario...")
                 
                 # Enviar formulario directamente con JavaScript
                 script = f"""
@@ -1147,15 +1346,26 @@ class SUNATScraper:
                 form.submit();
                 """
                 self.driver.execute_script(script)
-                time.sleep(3)
+            
+            self.esperas.esperar_seccion(
+                self.driver, 'programa_covid19', pagina_anterior,
+                (By.XPATH, "//div[contains(@class, 'panel-primary')]")
+            )
             
             # Esperar a que cargue la página
             try:
-                wait = WebDriverWait(self.driver, 10)
+                wait = self.esperas.espera_contenido(self.driver)
                 wait.until(EC.presence_of_element_located((By.CLASS_NAME, "panel-primary")))
-                time.sleep(2)
                 
-                print(f"\n📍 URL actual: {self.driver.current_url}")
+                log.debug("URL actual: %s", self.driver.current_url)
+                
+                if self.modo_extraccion == "snapshot":
+                    covid_info = self._parsear_snapshot(parsers.parsear_programa_covid19)
+                    if covid_info:
+                        log.info("Información del Programa COVID-19 extraída")
+                    else:
+                        log.info("No se encontró información del Programa COVID-19")
+                    return covid_info
                 
                 # Extraer información
                 covid_info = {}
@@ -1169,9 +1379,9 @@ class SUNATScraper:
                     try:
                         label_element = self.driver.find_element(By.CSS_SELECTOR, "span.label")
                         tiene_deuda = label_element.text.strip()
-                        print(f"   ✓ Estado encontrado: {tiene_deuda}")
+                        log.debug("Estado encontrado: %s", tiene_deuda)
                     except NoSuchElementException:
-                        print("   ⚠ No se encontró el label de estado")
+                        log.debug("No se encontró el label de estado")
                     
                     # Buscar fecha y ley
                     try:
@@ -1183,12 +1393,12 @@ class SUNATScraper:
                                 match = re.search(r'(\d{2}/\d{2}/\d{4})', texto)
                                 if match:
                                     fecha_actualizacion = match.group(1)
-                                    print(f"   ✓ Fecha de actualización: {fecha_actualizacion}")
+                                    log.debug("Fecha de actualización: %s", fecha_actualizacion)
                             elif "ley" in texto.lower():
                                 ley = texto
-                                print(f"   ✓ Ley: {ley}")
+                                log.debug("Ley: %s", ley)
                     except Exception as e:
-                        print(f"   ⚠ Error extrayendo detalles: {str(e)}")
+                        log.debug("Error extrayendo detalles: %s", e)
                     
                     if tiene_deuda:
                         covid_info = {
@@ -1196,29 +1406,31 @@ class SUNATScraper:
                             'fecha_actualizacion': fecha_actualizacion,
                             'ley': ley
                         }
-                        print(f"\n✓ Información del Programa COVID-19 extraída")
+                        log.info("Información del Programa COVID-19 extraída")
                         return covid_info
                     else:
-                        print("ℹ No se encontró información del Programa COVID-19")
+                        log.info("No se encontró información del Programa COVID-19")
                         return None
                         
                 except NoSuchElementException:
-                    print("✗ No se encontró información del Programa COVID-19")
+                    log.info("No se encontró información del Programa COVID-19")
                     return None
                 except Exception as e:
-                    print(f"Error al extraer Programa COVID-19: {str(e)}")
-                    import traceback
-                    traceback.print_exc()
+                    log.warning("Error al extraer Programa COVID-19: %s", e)
+                    marcar_error_seccion()
+                    log.debug("Traza del error", exc_info=True)
                     return None
                     
             except Exception as e:
-                print(f"Error esperando la página del Programa COVID-19: {str(e)}")
+                log.warning("Error esperando la página del Programa COVID-19: %s", e)
+                marcar_error_seccion()
                 return None
                 
         except Exception as e:
-            print(f"Error al consultar Programa COVID-19: {str(e)}")
-            import traceback
-            traceback.print_exc()
+            log.warning("Error al consultar Programa COVID-19: %s", e)
+            marcar_error_seccion()
+            artefactos.capturar(self.driver, 'programa_covid19', numero_ruc, fallo=True)
+            log.debug("Traza del error", exc_info=True)
             return None
 
     
@@ -1234,36 +1446,34 @@ class SUNATScraper:
             Lista de diccionarios con establecimientos anexos o None si no hay
         """
         try:
-            print("\n" + "="*60)
-            print("Consultando establecimientos anexos...")
-            print("="*60)
+            log.info("Consultando establecimientos anexos...")
+            
+            pagina_anterior = Esperas.marcar_pagina(self.driver)
+            limitador_sunat.esperar_turno()
             
             # Intentar hacer clic en el botón
             try:
                 # Esperar a que el botón esté presente en el DOM
-                wait = WebDriverWait(self.driver, 10)
+                wait = self.esperas.espera_contenido(self.driver)
                 boton = wait.until(
                     EC.presence_of_element_located((By.CLASS_NAME, "btnInfLocAnex"))
                 )
-                print("✓ Botón encontrado en la página")
+                log.debug("Botón encontrado en la página")
                 
                 # Hacer scroll hacia el botón para asegurar que sea visible
-                self.driver.execute_script("arguments[0].scrollIntoView({behavior: 'smooth', block: 'center'});", boton)
-                time.sleep(1)
+                self.driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", boton)
                 
                 # Intentar esperar a que sea clickeable
                 try:
                     boton = wait.until(EC.element_to_be_clickable((By.CLASS_NAME, "btnInfLocAnex")))
-                    print("✓ Haciendo clic en el botón...")
+                    log.debug("Haciendo clic en el botón...")
                     boton.click()
-                    time.sleep(3)
                 except TimeoutException:
-                    print("⚠ Botón no clickeable, usando JavaScript...")
+                    log.debug("Botón no clickeable, usando JavaScript...")
                     self.driver.execute_script("arguments[0].click();", boton)
-                    time.sleep(3)
                     
             except (NoSuchElementException, TimeoutException):
-                print("ℹ Botón no encontrado o no visible, intentando envío directo del formulario...")
+                log.debug("Botón no encontrado o no visible, intentando envío directo del formulario...")
                 
                 # Enviar formulario directamente con JavaScript
                 script = f"""
@@ -1291,16 +1501,27 @@ class SUNATScraper:
                 form.submit();
                 """
                 self.driver.execute_script(script)
-                time.sleep(3)
+            
+            self.esperas.esperar_seccion(
+                self.driver, 'establecimientos_anexos', pagina_anterior,
+                (By.CSS_SELECTOR, "table.table")
+            )
             
             # Esperar a que cargue la página
             try:
-                wait = WebDriverWait(self.driver, 10)
+                wait = self.esperas.espera_contenido(self.driver)
                 # Buscar por la tabla
                 wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, "table.table")))
-                time.sleep(2)
                 
-                print(f"\n📍 URL actual: {self.driver.current_url}")
+                log.debug("URL actual: %s", self.driver.current_url)
+                
+                if self.modo_extraccion == "snapshot":
+                    establecimientos = self._parsear_snapshot(parsers.parsear_establecimientos_anexos)
+                    if establecimientos:
+                        log.info("Extraídos %s establecimientos anexos", len(establecimientos))
+                    else:
+                        log.info("No se encontraron establecimientos anexos")
+                    return establecimientos
                 
                 # Buscar tabla de establecimientos
                 establecimientos = []
@@ -1311,13 +1532,13 @@ class SUNATScraper:
                     # Verificar encabezados
                     headers = tabla.find_elements(By.TAG_NAME, "th")
                     header_texts = [h.text.strip() for h in headers]
-                    print(f"\n   Encabezados encontrados: {header_texts}")
+                    log.debug("Encabezados encontrados: %s", header_texts)
                     
                     # Extraer filas del tbody
                     tbody = tabla.find_element(By.TAG_NAME, "tbody")
                     filas = tbody.find_elements(By.TAG_NAME, "tr")
                     
-                    print(f"   Filas encontradas: {len(filas)}")
+                    log.debug("Filas encontradas: %s", len(filas))
                     
                     for fila in filas:
                         celdas = fila.find_elements(By.TAG_NAME, "td")
@@ -1336,45 +1557,243 @@ class SUNATScraper:
                                     'actividad_economica': actividad
                                 }
                                 establecimientos.append(establecimiento)
-                                print(f"      {codigo}: {tipo} - {direccion[:50]}...")
+                                log.debug("%s: %s - %s...", codigo, tipo, direccion[:50])
                     
                     if len(establecimientos) > 0:
-                        print(f"\n✓ Extraídos {len(establecimientos)} establecimientos anexos")
+                        log.info("Extraídos %s establecimientos anexos", len(establecimientos))
                         return establecimientos
                     else:
-                        print("ℹ No se encontraron establecimientos anexos")
+                        log.info("No se encontraron establecimientos anexos")
                         return None
                         
                 except NoSuchElementException:
-                    print("✗ No se encontró tabla de establecimientos anexos")
+                    log.info("No se encontró tabla de establecimientos anexos")
                     return None
                 except Exception as e:
-                    print(f"Error al extraer establecimientos: {str(e)}")
-                    import traceback
-                    traceback.print_exc()
+                    log.warning("Error al extraer establecimientos: %s", e)
+                    marcar_error_seccion()
+                    log.debug("Traza del error", exc_info=True)
                     return None
                     
             except Exception as e:
-                print(f"Error esperando la página de establecimientos: {str(e)}")
+                log.warning("Error esperando la página de establecimientos: %s", e)
+                marcar_error_seccion()
                 return None
                 
         except Exception as e:
-            print(f"Error al consultar establecimientos anexos: {str(e)}")
-            import traceback
-            traceback.print_exc()
+            log.warning("Error al consultar establecimientos anexos: %s", e)
+            marcar_error_seccion()
+            artefactos.capturar(self.driver, 'establecimientos_anexos', numero_ruc, fallo=True)
+            log.debug("Traza del error", exc_info=True)
+            return None
+
+
+    def extraer_secciones_en_pestanas(self, numero_ruc, razon_social, secciones):
+        """
+        Carga varias secciones de la ficha RUC a la vez, cada una en su propia pestaña.
+
+        Desde la ficha (misma sesión y cookies) se envía un formulario a jcrS00Alias
+        por sección con target a una pestaña distinta; el navegador carga todas en
+        paralelo y luego se parsea el page_source de cada una. El tiempo total se
+        acerca al de la sección más lenta en lugar de la suma de todas.
+
+        Args:
+            numero_ruc: Número de RUC
+            razon_social: Razón social de la empresa
+            secciones: Claves de ACCIONES_SECCION a extraer
+
+        Returns:
+            Diccionario sección -> datos (o None), o None si no se pudieron abrir las pestañas
+        """
+        principal = self.driver.current_window_handle
+        pestanas = {}
+
+        log.info("Consultando %s secciones en paralelo...", len(secciones))
+        try:
+            for seccion in secciones:
+                handle = self.abrir_pestana()
+                self.driver.execute_script("window.name = arguments[0];", f"seccion_{seccion}")
+                pestanas[seccion] = (handle, Esperas.marcar_pagina(self.driver))
+
+            self.driver.switch_to.window(principal)
+            for seccion in secciones:
+                accion, _ = self.ACCIONES_SECCION[seccion]
+                limitador_sunat.esperar_turno()
+                self.driver.execute_script(
+                    """
+                    var form = document.createElement('form');
+                    form.method = 'POST';
+                    form.action = '/cl-ti-itmrconsruc/jcrS00Alias';
+                    form.target = arguments[3];
+
+                    var inputs = {
+                        'accion': arguments[0],
+                        'contexto': 'ti-it',
+                        'modo': '1',
+                        'nroRuc': arguments[1],
+                        'desRuc': arguments[2]
+                    };
+
+                    for (var key in inputs) {
+                        var input = document.createElement('input');
+                        input.type = 'hidden';
+                        input.name = key;
+                        input.value = inputs[key];
+                        form.appendChild(input);
+                    }
+
+                    document.body.appendChild(form);
+                    form.submit();
+                    form.remove();
+                    """,
+                    accion, numero_ruc, razon_social, f"seccion_{seccion}"
+                )
+
+            resultados = {}
+            for seccion, (handle, pagina_anterior) in pestanas.items():
+                _, localizador = self.ACCIONES_SECCION[seccion]
+                self.driver.switch_to.window(handle)
+                if not self.esperas.esperar_seccion(self.driver, seccion, pagina_anterior, localizador):
+                    raise TimeoutException(f"La pestaña de {seccion} no terminó de cargar")
+                resultados[seccion] = self._parsear_snapshot(parsers.PARSERS[seccion])
+                artefactos.capturar(self.driver, seccion, numero_ruc)
+                log.info("%s: %s", seccion, 'con datos' if resultados[seccion] else 'sin datos')
+
+            return resultados
+
+        except Exception as e:
+            log.warning("Error al consultar secciones en pestañas: %s. Se consultarán una por una", e)
+            artefactos.capturar(self.driver, 'secciones_en_pestanas', numero_ruc, fallo=True)
+            return None
+
+        finally:
+            for handle, _ in pestanas.values():
+                try:
+                    self.cerrar_pestana(handle)
+                except Exception:
+                    pass
+            try:
+                self.driver.switch_to.window(principal)
+            except Exception:
+                pass
+
+    def consultar_ruc_completo(self, numero_ruc, incluir_trabajadores=False, incluir_representantes=False,
+                               incluir_historico=False, incluir_deuda_coactiva=False,
+                               incluir_reactiva_peru=False, incluir_programa_covid19=False,
+                               incluir_establecimientos=False):
+        """
+        Consulta los datos básicos de un RUC y las secciones adicionales solicitadas
+        usando el driver de esta instancia.
+
+        Args:
+            numero_ruc: Número de RUC a consultar
+            incluir_trabajadores: Si True, incluye datos de trabajadores
+            incluir_representantes: Si True, incluye datos de representantes
+            incluir_historico: Si True, incluye información histórica
+            incluir_deuda_coactiva: Si True, incluye deuda coactiva
+            incluir_reactiva_peru: Si True, incluye Reactiva Perú
+            incluir_programa_covid19: Si True, incluye Programa COVID-19
+            incluir_establecimientos: Si True, incluye establecimientos anexos
+
+        Returns:
+            Diccionario con los datos del RUC o None si no se encontraron
+        """
+        # Ocupa un lugar de la concurrencia global hacia SUNAT durante toda la consulta
+        with contexto_consulta(numero_ruc), limitador_sunat.consulta():
+            return medir_consulta(
+                'selenium',
+                self._consultar_ruc_completo,
+                numero_ruc,
+                incluir_trabajadores=incluir_trabajadores,
+                incluir_representantes=incluir_representantes,
+                incluir_historico=incluir_historico,
+                incluir_deuda_coactiva=incluir_deuda_coactiva,
+                incluir_reactiva_peru=incluir_reactiva_peru,
+                incluir_programa_covid19=incluir_programa_covid19,
+                incluir_establecimientos=incluir_establecimientos
+            )
+
+    def _consultar_ruc_completo(self, numero_ruc, incluir_trabajadores=False, incluir_representantes=False,
+                                incluir_historico=False, incluir_deuda_coactiva=False,
+                                incluir_reactiva_peru=False, incluir_programa_covid19=False,
+                                incluir_establecimientos=False):
+        resultado = self.consultar_ruc(numero_ruc)
+
+        if not resultado:
             return None
 
+        razon_social = resultado.get('razon_social', '')
+
+        if self.secciones_en_pestanas and self.modo_extraccion == "snapshot" and razon_social:
+            solicitadas = [
+                seccion for seccion, incluir in [
+                    ('cantidad_trabajadores', incluir_trabajadores),
+                    ('representantes_legales', incluir_representantes),
+                    ('informacion_historica', incluir_historico),
+                    ('deuda_coactiva', incluir_deuda_coactiva),
+                    ('reactiva_peru', incluir_reactiva_peru),
+                    ('programa_covid19', incluir_programa_covid19),
+                    ('establecimientos_anexos', incluir_establecimientos),
+                ] if incluir
+            ]
+            if len(solicitadas) > 1:
+                with tramo('secciones_en_pestanas'):
+                    datos_secciones = self.extraer_secciones_en_pestanas(numero_ruc, razon_social, solicitadas)
+                if datos_secciones is not None:
+                    for seccion, datos in datos_secciones.items():
+                        registrar_seccion(seccion, datos)
+                    resultado.update({s: datos for s, datos in datos_secciones.items() if datos})
+                    return resultado
+
+        if incluir_trabajadores and razon_social:
+            datos_trab = medir_seccion('cantidad_trabajadores', self.extraer_cantidad_trabajadores, numero_ruc, razon_social)
+            if datos_trab:
+                resultado['cantidad_trabajadores'] = datos_trab
+
+        if incluir_representantes and razon_social:
+            datos_repr = medir_seccion('representantes_legales', self.extraer_representantes_legales, numero_ruc, razon_social)
+            if datos_repr:
+                resultado['representantes_legales'] = datos_repr
+
+        if incluir_historico and razon_social:
+            datos_hist = medir_seccion('informacion_historica', self.extraer_informacion_historica, numero_ruc, razon_social)
+            if datos_hist:
+                resultado['informacion_historica'] = datos_hist
+
+        if incluir_deuda_coactiva and razon_social:
+            datos_deuda = medir_seccion('deuda_coactiva', self.extraer_deuda_coactiva, numero_ruc, razon_social)
+            if datos_deuda:
+                resultado['deuda_coactiva'] = datos_deuda
+
+        if incluir_reactiva_peru and razon_social:
+            datos_reactiva = medir_seccion('reactiva_peru', self.extraer_reactiva_peru, numero_ruc, razon_social)
+            if datos_reactiva:
+                resultado['reactiva_peru'] = datos_reactiva
+
+        if incluir_programa_covid19 and razon_social:
+            datos_covid = medir_seccion('programa_covid19', self.extraer_programa_covid19, numero_ruc, razon_social)
+            if datos_covid:
+                resultado['programa_covid19'] = datos_covid
+
+        if incluir_establecimientos and razon_social:
+            datos_establecimientos = medir_seccion('establecimientos_anexos', self.extraer_establecimientos_anexos, numero_ruc, razon_social)
+            if datos_establecimientos:
+                resultado['establecimientos_anexos'] = datos_establecimientos
+
+        return resultado
+
 
     @staticmethod
-    def _worker_procesar_ruc(ruc, incluir_trabajadores=False, incluir_representantes=False, 
+    def _worker_procesar_ruc(scraper, ruc, incluir_trabajadores=False, incluir_representantes=False, 
                               incluir_historico=False, incluir_deuda_coactiva=False,
                               incluir_reactiva_peru=False, incluir_programa_covid19=False,
                               incluir_establecimientos=False):
         """
         Worker estático para procesar un RUC individualmente en un thread separado.
-        Cada worker crea su propia instancia de SUNATScraper y WebDriver.
+        Usa el scraper persistente del thread; no cierra su driver.
         
         Args:
+            scraper: Instancia de SUNATScraper con el driver iniciado
             ruc: Número de RUC a consultar
             incluir_trabajadores: Si True, incluye datos de trabajadores
             incluir_representantes: Si True, incluye datos de representantes
@@ -1385,74 +1804,43 @@ class SUNATScraper:
             incluir_establecimientos: Si True, incluye establecimientos anexos
             
         Returns:
-            Dict con resultado del procesamiento (success, data, error)
+            Dict con resultado del procesamiento (success, data, error). Los fallos
+            incluyen id_consulta y los eventos recientes de la consulta.
         """
-        scraper = None
+        # Validar formato del RUC
+        if not ruc.isdigit() or len(ruc) != 11:
+            return {
+                'ruc': ruc,
+                'success': False,
+                'error': 'El RUC debe tener exactamente 11 dígitos numéricos',
+                'fecha_consulta': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            }
+
+        contexto = ContextoConsulta(ruc)
         try:
-            # Validar formato del RUC
-            if not ruc.isdigit() or len(ruc) != 11:
-                return {
-                    'ruc': ruc,
-                    'success': False,
-                    'error': 'El RUC debe tener exactamente 11 dígitos numéricos',
-                    'fecha_consulta': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                }
-            
-            # Crear instancia de scraper para este thread
-            scraper = SUNATScraper()
-            scraper.setup_driver()
-            
-            # Consultar datos básicos del RUC
-            resultado = scraper.consultar_ruc(ruc)
+            with contexto_activo(contexto):
+                resultado = scraper.consultar_ruc_completo(
+                    ruc,
+                    incluir_trabajadores=incluir_trabajadores,
+                    incluir_representantes=incluir_representantes,
+                    incluir_historico=incluir_historico,
+                    incluir_deuda_coactiva=incluir_deuda_coactiva,
+                    incluir_reactiva_peru=incluir_reactiva_peru,
+                    incluir_programa_covid19=incluir_programa_covid19,
+                    incluir_establecimientos=incluir_establecimientos
+                )
             
             if not resultado:
                 return {
                     'ruc': ruc,
                     'success': False,
                     'error': 'No se encontraron datos para este RUC',
-                    'fecha_consulta': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                    'fecha_consulta': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                    'id_consulta': contexto.id,
+                    'eventos': contexto.recientes()
                 }
             
-            # Obtener la razón social para las consultas adicionales
-            razon_social = resultado.get('razon_social', '')
             resultado['success'] = True
-            
-            # Extraer información adicional según los parámetros
-            if incluir_trabajadores and razon_social:
-                datos_trab = scraper.extraer_cantidad_trabajadores(ruc, razon_social)
-                if datos_trab:
-                    resultado['cantidad_trabajadores'] = datos_trab
-            
-            if incluir_representantes and razon_social:
-                datos_repr = scraper.extraer_representantes_legales(ruc, razon_social)
-                if datos_repr:
-                    resultado['representantes_legales'] = datos_repr
-            
-            if incluir_historico and razon_social:
-                datos_hist = scraper.extraer_informacion_historica(ruc, razon_social)
-                if datos_hist:
-                    resultado['informacion_historica'] = datos_hist
-            
-            if incluir_deuda_coactiva and razon_social:
-                datos_deuda = scraper.extraer_deuda_coactiva(ruc, razon_social)
-                if datos_deuda:
-                    resultado['deuda_coactiva'] = datos_deuda
-            
-            if incluir_reactiva_peru and razon_social:
-                datos_reactiva = scraper.extraer_reactiva_peru(ruc, razon_social)
-                if datos_reactiva:
-                    resultado['reactiva_peru'] = datos_reactiva
-            
-            if incluir_programa_covid19 and razon_social:
-                datos_covid = scraper.extraer_programa_covid19(ruc, razon_social)
-                if datos_covid:
-                    resultado['programa_covid19'] = datos_covid
-            
-            if incluir_establecimientos and razon_social:
-                datos_establecimientos = scraper.extraer_establecimientos_anexos(ruc, razon_social)
-                if datos_establecimientos:
-                    resultado['establecimientos_anexos'] = datos_establecimientos
-            
             return resultado
             
         except Exception as e:
@@ -1460,15 +1848,10 @@ class SUNATScraper:
                 'ruc': ruc,
                 'success': False,
                 'error': str(e),
-                'fecha_consulta': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                'fecha_consulta': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                'id_consulta': contexto.id,
+                'eventos': contexto.recientes()
             }
-        finally:
-            # Asegurar que el driver se cierre
-            if scraper and scraper.driver:
-                try:
-                    scraper.driver.quit()
-                except:
-                    pass
 
 
     def consultar_multiples_rucs_paralelo(self, lista_rucs, max_workers=3, 
@@ -1478,7 +1861,9 @@ class SUNATScraper:
                                           incluir_establecimientos=False):
         """
         Consulta múltiples RUCs en paralelo usando ThreadPoolExecutor.
-        Cada RUC se procesa en un thread independiente con su propio driver.
+        Cada thread mantiene su propio driver durante todo el lote y lo reutiliza
+        para todos los RUCs que procesa. Los drivers se cierran al terminar el lote
+        o se reemplazan si dejan de responder.
         
         Args:
             lista_rucs: Lista de números de RUC a consultar
@@ -1497,64 +1882,101 @@ class SUNATScraper:
         total = len(lista_rucs)
         resultados = []
         
-        print(f"\n{'='*60}")
-        print(f"Consultando {total} RUC(s) en PARALELO (max {max_workers} workers)...")
-        print(f"{'='*60}\n")
+        # Un scraper por thread, reutilizado en todo el lote
+        local = threading.local()
+        scrapers_activos = []
+        lock_scrapers = threading.Lock()
         
-        with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            # Enviar todas las tareas al pool de threads
-            futures = {
-                executor.submit(
-                    SUNATScraper._worker_procesar_ruc,
-                    ruc,
-                    incluir_trabajadores,
-                    incluir_representantes,
-                    incluir_historico,
-                    incluir_deuda_coactiva,
-                    incluir_reactiva_peru,
-                    incluir_programa_covid19,
-                    incluir_establecimientos
-                ): ruc 
-                for ruc in lista_rucs
-            }
+        def procesar(ruc):
+            scraper = getattr(local, 'scraper', None)
+            if scraper is None:
+                # Los workers usan la misma configuración (y clase) que este scraper
+                scraper = type(self)(
+                    modo_extraccion=self.modo_extraccion,
+                    esperas=self.esperas,
+                    secciones_en_pestanas=self.secciones_en_pestanas,
+                    bloqueo=self.bloqueo,
+                    base_url=self.base_url
+                )
+                scraper.setup_driver()
+                local.scraper = scraper
+                with lock_scrapers:
+                    scrapers_activos.append(scraper)
+            
+            resultado = SUNATScraper._worker_procesar_ruc(
+                scraper,
+                ruc,
+                incluir_trabajadores,
+                incluir_representantes,
+                incluir_historico,
+                incluir_deuda_coactiva,
+                incluir_reactiva_peru,
+                incluir_programa_covid19,
+                incluir_establecimientos
+            )
             
-            # Procesar resultados a medida que se completan
-            completados = 0
-            for future in as_completed(futures):
-                ruc = futures[future]
-                completados += 1
-                
+            # Reemplazar el driver del thread si dejó de responder
+            if not scraper.driver_activo():
+                log.warning("Driver caído tras RUC %s, se iniciará uno nuevo", ruc)
+                local.scraper = None
+                with lock_scrapers:
+                    scrapers_activos.remove(scraper)
                 try:
-                    resultado = future.result(timeout=120)  # 2 minutos timeout por RUC
-                    resultados.append(resultado)
+                    scraper.driver.quit()
+                except:
+                    pass
+            
+            return resultado
+        
+        log.info("Consultando %s RUC(s) en PARALELO (max %s workers)...", total, max_workers)
+        
+        try:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                # Enviar todas las tareas al pool de threads
+                futures = {executor.submit(procesar, ruc): ruc for ruc in lista_rucs}
+                
+                # Procesar resultados a medida que se completan
+                completados = 0
+                for future in as_completed(futures):
+                    ruc = futures[future]
+                    completados += 1
                     
-                    if resultado.get('success', False):
-                        print(f"[{completados}/{total}] ✓ RUC {ruc}: Completado exitosamente")
-                    else:
-                        error_msg = resultado.get('error', 'Error desconocido')
-                        print(f"[{completados}/{total}] ✗ RUC {ruc}: {error_msg}")
+                    try:
+                        resultado = future.result(timeout=120)  # 2 minutos timeout por RUC
+                        resultados.append(resultado)
                         
-                except TimeoutError:
-                    print(f"[{completados}/{total}] ⏱ RUC {ruc}: Timeout (>120s)")
-                    resultados.append({
-                        'ruc': ruc,
-                        'success': False,
-                        'error': 'Timeout: el procesamiento tomó más de 120 segundos',
-                        'fecha_consulta': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                    })
-                except Exception as e:
-                    print(f"[{completados}/{total}] ✗ RUC {ruc}: Excepción - {str(e)}")
-                    resultados.append({
-                        'ruc': ruc,
-                        'success': False,
-                        'error': f'Excepción en thread: {str(e)}',
-                        'fecha_consulta': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                    })
+                        if resultado.get('success', False):
+                            log.info("[%s/%s] ✓ RUC %s: Completado exitosamente", completados, total, ruc)
+                        else:
+                            error_msg = resultado.get('error', 'Error desconocido')
+                            log.warning("[%s/%s] ✗ RUC %s: %s", completados, total, ruc, error_msg)
+                            
+                    except TimeoutError:
+                        log.warning("[%s/%s] ⏱ RUC %s: Timeout (>120s)", completados, total, ruc)
+                        resultados.append({
+                            'ruc': ruc,
+                            'success': False,
+                            'error': 'Timeout: el procesamiento tomó más de 120 segundos',
+                            'fecha_consulta': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                        })
+                    except Exception as e:
+                        log.warning("[%s/%s] ✗ RUC %s: Excepción - %s", completados, total, ruc, e)
+                        resultados.append({
+                            'ruc': ruc,
+                            'success': False,
+                            'error': f'Excepción en thread: {str(e)}',
+                            'fecha_consulta': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                        })
+        finally:
+            # Cerrar los drivers de los workers al terminar el lote
+            for scraper in scrapers_activos:
+                try:
+                    scraper.driver.quit()
+                except:
+                    pass
         
-        print(f"\n{'='*60}")
         exitosos = sum(1 for r in resultados if r.get('success', False))
-        print(f"Consultas completadas: {exitosos}/{total} exitosas")
-        print(f"{'='*60}\n")
+        log.info("Consultas completadas: %s/%s exitosas", exitosos, total)
         
         return resultados
 
@@ -1599,13 +2021,11 @@ class SUNATScraper:
         resultados = []
         total = len(lista_rucs)
         
-        print(f"\n{'='*60}")
-        print(f"Consultando {total} RUC(s)...")
-        print(f"{'='*60}\n")
+        log.info("Consultando %s RUC(s)...", total)
         
         for idx, ruc in enumerate(lista_rucs, 1):
             try:
-                print(f"[{idx}/{total}] Consultando RUC: {ruc}")
+                log.info("[%s/%s] Consultando RUC: %s", idx, total, ruc)
                 
                 # Validar formato del RUC
                 if not ruc.isdigit() or len(ruc) != 11:
@@ -1616,58 +2036,23 @@ class SUNATScraper:
                         'fecha_consulta': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
                     }
                     resultados.append(resultado)
-                    print(f"  RUC inválido: {ruc}")
+                    log.warning("RUC inválido: %s", ruc)
                     continue
                 
-                # Consultar RUC
-                resultado = self.consultar_ruc(ruc)
+                # Consultar RUC (el limitador global espacía las solicitudes a SUNAT)
+                resultado = self.consultar_ruc_completo(
+                    ruc,
+                    incluir_trabajadores=incluir_trabajadores,
+                    incluir_representantes=incluir_representantes,
+                    incluir_historico=incluir_historico,
+                    incluir_deuda_coactiva=incluir_deuda_coactiva,
+                    incluir_reactiva_peru=incluir_reactiva_peru,
+                    incluir_programa_covid19=incluir_programa_covid19,
+                    incluir_establecimientos=incluir_establecimientos
+                )
                 
                 if resultado:
                     resultado['success'] = True
-                    razon_social = resultado.get('razon_social', '')
-                    
-                    # Extraer trabajadores si se solicitó
-                    if incluir_trabajadores and razon_social:
-                        datos_trab = self.extraer_cantidad_trabajadores(ruc, razon_social)
-                        if datos_trab:
-                            resultado['cantidad_trabajadores'] = datos_trab
-                    
-                    # Extraer representantes si se solicitó
-                    if incluir_representantes and razon_social:
-                        datos_repr = self.extraer_representantes_legales(ruc, razon_social)
-                        if datos_repr:
-                            resultado['representantes_legales'] = datos_repr
-                    
-                    # Extraer información histórica si se solicitó
-                    if incluir_historico and razon_social:
-                        datos_hist = self.extraer_informacion_historica(ruc, razon_social)
-                        if datos_hist:
-                            resultado['informacion_historica'] = datos_hist
-                    
-                    # Extraer deuda coactiva si se solicitó
-                    if incluir_deuda_coactiva and razon_social:
-                        datos_deuda = self.extraer_deuda_coactiva(ruc, razon_social)
-                        if datos_deuda:
-                            resultado['deuda_coactiva'] = datos_deuda
-                    
-                    # Extraer Reactiva Perú si se solicitó
-                    if incluir_reactiva_peru and razon_social:
-                        datos_reactiva = self.extraer_reactiva_peru(ruc, razon_social)
-                        if datos_reactiva:
-                            resultado['reactiva_peru'] = datos_reactiva
-                    
-                    # Extraer Programa COVID-19 si se solicitó
-                    if incluir_programa_covid19 and razon_social:
-                        datos_covid = self.extraer_programa_covid19(ruc, razon_social)
-                        if datos_covid:
-                            resultado['programa_covid19'] = datos_covid
-                    
-                    # Extraer establecimientos anexos si se solicitó
-                    if incluir_establecimientos and razon_social:
-                        datos_establecimientos = self.extraer_establecimientos_anexos(ruc, razon_social)
-                        if datos_establecimientos:
-                            resultado['establecimientos_anexos'] = datos_establecimientos
-                    
                     resultados.append(resultado)
                 else:
                     resultado = {
@@ -1677,13 +2062,9 @@ class SUNATScraper:
                         'fecha_consulta': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
                     }
                     resultados.append(resultado)
-                
-                # Pequeño delay entre consultas para evitar bloqueos
-                if idx < total:
-                    time.sleep(1)
                     
             except Exception as e:
-                print(f"  Error al consultar RUC {ruc}: {str(e)}")
+                log.warning("Error al consultar RUC %s: %s", ruc, e)
                 resultado = {
                     'ruc': ruc,
                     'error': str(e),
@@ -1692,15 +2073,23 @@ class SUNATScraper:
                 }
                 resultados.append(resultado)
         
-        print(f"\n{'='*60}")
         exitosos = sum(1 for r in resultados if r.get('success', False))
-        print(f"Consultas completadas: {exitosos}/{total} exitosas")
-        print(f"{'='*60}\n")
+        log.info("Consultas completadas: %s/%s exitosas", exitosos, total)
         
         return resultados
             
+    def driver_activo(self):
+        """Verifica que el driver esté iniciado y siga respondiendo"""
+        if not self.driver:
+            return False
+        try:
+            self.driver.current_url
+            return True
+        except Exception:
+            return False
+
     def close(self):
         """Cierra el navegador"""
         if self.driver:
             self.driver.quit()
-            print("Navegador cerrado")
+            log.info("Navegador cerrado")
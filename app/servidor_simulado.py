@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+Servidor local que simula la consulta RUC de SUNAT
+
+Sirve FrameCriterioBusquedaWeb.jsp y jcrS00Alias (todas las variantes de
+'accion') desde páginas HTML grabadas en fixtures/, con latencia y tasa de
+errores configurables. Permite medir el scraper, el cliente HTTP y el motor
+de pestañas sin enviar solicitudes a SUNAT:
+
+    python servidor_simulado.py --puerto 8900 --latencia 0.3 --tasa-errores 0.02
+    SUNAT_BASE_URL=http://127.0.0.1:8900/cl-ti-itmrconsruc uvicorn api:app
+
+En las páginas, {{ruc}} y {{razon_social}} se reemplazan por los datos del
+RUC consultado. Los RUC que no empiezan con 10, 15, 16, 17 ni 20 responden
+la página de RUC no válido.
+"""
+
+import html
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+
+RUTA_BASE = "/cl-ti-itmrconsruc"
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+# Valor de 'accion' -> archivo de fixtures/
+PAGINAS = {
+    'consPorRuc': 'consPorRuc.html',
+    'getCantTrab': 'getCantTrab.html',
+    'getRepLeg': 'getRepLeg.html',
+    'getinfHis': 'getinfHis.html',
+    'getInfoDC': 'getInfoDC.html',
+    'getReactivaPeru': 'getReactivaPeru.html',
+    'getPGarantiaCOVID19': 'getPGarantiaCOVID19.html',
+    'getLocAnex': 'getLocAnex.html',
+}
+FORMULARIO = 'FrameCriterioBusquedaWeb.jsp'
+NO_ENCONTRADO = 'no_encontrado.html'
+
+PREFIJOS_VALIDOS = ('10', '15', '16', '17', '20')
+
+
+def razon_social_simulada(numero_ruc):
+    return f"EMPRESA SIMULADA {numero_ruc} S.A.C."
+
+
+class _Manejador(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Cabeceras y cuerpo van en escrituras separadas; sin esto cada respuesta espera el ACK retardado
+    disable_nagle_algorithm = True
+
+    def log_message(self, formato, *args):
+        pass
+
+    def _responder(self, estado, cuerpo):
+        self.send_response(estado)
+        self.send_header('Content-Type', 'text/html')
+        self.send_header('Content-Length', str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def _atender(self, accion, campos):
+        simulador = self.server.simulador
+        estado, cuerpo = simulador.responder(accion, campos)
+        self._responder(estado, cuerpo)
+
+    def do_GET(self):
+        ruta = urlsplit(self.path).path
+        if ruta != f"{RUTA_BASE}/{FORMULARIO}":
+            self._responder(404, b"No encontrado")
+            return
+        self._atender('formulario', {})
+
+    def do_POST(self):
+        ruta = urlsplit(self.path).path
+        longitud = int(self.headers.get('Content-Length') or 0)
+        datos = self.rfile.read(longitud).decode('latin-1')
+        if ruta != f"{RUTA_BASE}/jcrS00Alias":
+            self._responder(404, b"No encontrado")
+            return
+        campos = {clave: valores[0] for clave, valores in parse_qs(datos, keep_blank_values=True).items()}
+        self._atender(campos.get('accion', ''), campos)
+
+
+class ServidorSimulado:
+    """Servidor HTTP en un thread propio que responde como la consulta RUC de SUNAT"""
+
+    def __init__(self, host="127.0.0.1", puerto=0, fixtures=None, latencia=0.0, variacion=0.5,
+                 tasa_errores=0.0, semilla=None):
+        """
+        Args:
+            host: Dirección de escucha
+            puerto: Puerto de escucha (0 = uno libre)
+            fixtures: Directorio con las páginas grabadas (default: fixtures/)
+            latencia: Segundos promedio que tarda cada respuesta
+            variacion: Fracción de variación aleatoria de la latencia (0.5 = ±50%)
+            tasa_errores: Fracción de respuestas 503 (0 a 1)
+            semilla: Semilla de la latencia y los errores, para corridas reproducibles
+        """
+        self.fixtures = fixtures or FIXTURES
+        self.latencia = latencia
+        self.variacion = variacion
+        self.tasa_errores = tasa_errores
+
+        self._paginas = self._cargar(self.fixtures)
+        self._azar = random.Random(semilla)
+        self._lock = threading.Lock()
+        self._contadores = {}
+
+        self._servidor = ThreadingHTTPServer((host, puerto), _Manejador)
+        self._servidor.daemon_threads = True
+        self._servidor.simulador = self
+        self._thread = None
+
+    @staticmethod
+    def _cargar(directorio):
+        paginas = {}
+        for nombre in list(PAGINAS.values()) + [FORMULARIO, NO_ENCONTRADO]:
+            with open(os.path.join(directorio, nombre), 'rb') as f:
+                paginas[nombre] = f.read()
+        return paginas
+
+    @property
+    def puerto(self):
+        return self._servidor.server_address[1]
+
+    @property
+    def base_url(self):
+        """URL para SUNAT_BASE_URL / base_url de los motores"""
+        host = self._servidor.server_address[0]
+        return f"http://{host}:{self.puerto}{RUTA_BASE}"
+
+    def _esperar(self):
+        if self.latencia <= 0:
+            return
+        with self._lock:
+            factor = self._azar.uniform(1 - self.variacion, 1 + self.variacion)
+        time.sleep(max(0.0, self.latencia * factor))
+
+    def _contar(self, clave):
+        with self._lock:
+            self._contadores[clave] = self._contadores.get(clave, 0) + 1
+
+    def responder(self, accion, campos):
+        """
+        Arma la respuesta a una solicitud.
+
+        Returns:
+            Tupla (código HTTP, cuerpo en bytes)
+        """
+        self._esperar()
+
+        with self._lock:
+            error = self._azar.random() < self.tasa_errores
+        if error:
+            self._contar('errores')
+            return 503, b"<html><body>Servicio no disponible</body></html>"
+
+        self._contar(accion or 'sin_accion')
+
+        if accion == 'formulario':
+            return 200, self._paginas[FORMULARIO]
+        if accion not in PAGINAS:
+            return 400, b"<html><body>Accion no valida</body></html>"
+
+        numero_ruc = campos.get('nroRuc', '')
+        if not numero_ruc.startswith(PREFIJOS_VALIDOS) or len(numero_ruc) != 11:
+            return 200, self._paginas[NO_ENCONTRADO].replace(b'{{ruc}}', html.escape(numero_ruc).encode())
+
+        razon_social = campos.get('desRuc') or razon_social_simulada(numero_ruc)
+        return 200, (
+            self._paginas[PAGINAS[accion]]
+            .replace(b'{{ruc}}', numero_ruc.encode())
+            .replace(b'{{razon_social}}', html.escape(razon_social).encode('utf-8'))
+        )
+
+    def estadisticas(self):
+        """Solicitudes atendidas por 'accion' y errores inyectados"""
+        with self._lock:
+            return dict(self._contadores)
+
+    def iniciar(self):
+        self._thread = threading.Thread(target=self._servidor.serve_forever, name="servidor-simulado", daemon=True)
+        self._thread.start()
+        return self
+
+    def detener(self):
+        self._servidor.shutdown()
+        self._servidor.server_close()
+
+
+def grabar(numero_ruc, destino):
+    """
+    Graba las páginas reales de un RUC como fixtures (envía 9 solicitudes a SUNAT).
+
+    El número de RUC y la razón social se reemplazan por {{ruc}} y {{razon_social}}.
+    """
+    import parsers
+    from cliente_http import SUNATClienteHTTP
+
+    os.makedirs(destino, exist_ok=True)
+    cliente = SUNATClienteHTTP()
+    sesion = cliente._sesion()
+
+    paginas = {FORMULARIO: cliente._get(sesion, cliente.url).content}
+    ficha = cliente._post(cliente._formulario_busqueda(numero_ruc))
+    datos = parsers.parsear_datos_basicos(ficha)
+    if not datos or not datos.get('razon_social'):
+        raise ValueError(f"SUNAT no retornó la ficha del RUC {numero_ruc}")
+    razon_social = datos['razon_social']
+    paginas[PAGINAS['consPorRuc']] = ficha
+
+    for accion, archivo in PAGINAS.items():
+        if accion != 'consPorRuc':
+            paginas[archivo] = cliente._post(cliente._formulario_seccion(accion, numero_ruc, razon_social))
+    cliente.close()
+
+    reemplazos = [(numero_ruc, '{{ruc}}')]
+    for texto in {razon_social, html.escape(razon_social)}:
+        reemplazos.append((texto, '{{razon_social}}'))
+
+    for archivo, contenido in paginas.items():
+        for original, marcador in reemplazos:
+            for codificacion in ('utf-8', 'latin-1'):
+                try:
+                    contenido = contenido.replace(original.encode(codificacion), marcador.encode())
+                except UnicodeEncodeError:
+                    pass
+        with open(os.path.join(destino, archivo), 'wb') as f:
+            f.write(contenido)
+        print(f"✓ {archivo} ({len(contenido)} bytes)")
+
+    if not os.path.exists(os.path.join(destino, NO_ENCONTRADO)):
+        with open(os.path.join(FIXTURES, NO_ENCONTRADO), 'rb') as origen, \
+                open(os.path.join(destino, NO_ENCONTRADO), 'wb') as f:
+            f.write(origen.read())
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Servidor local que simula la consulta RUC de SUNAT')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--puerto', type=int, default=8900)
+    parser.add_argument('--fixtures', default=None, help='Directorio de páginas grabadas (default: fixtures/)')
+    parser.add_argument('--latencia', type=float, default=0.0, help='Segundos promedio por respuesta')
+    parser.add_argument('--variacion', type=float, default=0.5, help='Variación de la latencia (0.5 = ±50%%)')
+    parser.add_argument('--tasa-errores', type=float, default=0.0, help='Fracción de respuestas 503')
+    parser.add_argument('--semilla', type=int, default=None)
+    parser.add_argument('--grabar', metavar='RUC', help='Graba las páginas reales de este RUC en --fixtures y termina')
+    args = parser.parse_args()
+
+    if args.grabar:
+        grabar(args.grabar, args.fixtures or FIXTURES)
+    else:
+        servidor = ServidorSimulado(
+            host=args.host,
+            puerto=args.puerto,
+            fixtures=args.fixtures,
+            latencia=args.latencia,
+            variacion=args.variacion,
+            tasa_errores=args.tasa_errores,
+            semilla=args.semilla
+        )
+        print(f"✓ Servidor simulado en {servidor.base_url}")
+        print(f"  SUNAT_BASE_URL={servidor.base_url}")
+        try:
+            servidor._servidor.serve_forever()
+        except KeyboardInterrupt:
+            print(f"\nSolicitudes atendidas: {servidor.estadisticas()}")
+            servidor.detener()